@@ -0,0 +1,189 @@
+"""
+Benchmarks of the image source method.
+
+The benchmarks follow the conventions of `airspeed velocity <https://asv.readthedocs.io>`_. Methods starting with
+
+* ``time_`` are timed,
+* ``peakmem_`` record the peak memory,
+* ``track_`` record the returned value.
+
+Combinations of parameters for which the amount of mirror sources exceeds a budget are skipped.
+"""
+import time
+import numpy as np
+from geometry import Point
+from ism import Model, ShoeboxModel, Mirror, amount_of_sources
+from ism.ism import ism
+from ism._ism import is_shadowed, is_shadowed_parallel, test_effectiveness, test_effectiveness_many
+
+from .rooms import prism, shoebox, positions, BANDS
+
+WALLS = [6, 10, 26, 100]
+"""Amount of walls. A room with six walls is a shoebox, the other rooms are irregular prisms."""
+
+ORDERS = [1, 2, 3, 4, 5, 6, 7, 8]
+
+RECEIVERS = [1, 100, 10000, 100000]
+
+SOURCES = 200000
+"""Largest amount of potential mirror sources that is generated."""
+
+EVALUATIONS = 2000000
+"""Largest amount of mirror source and receiver combinations that is evaluated."""
+
+
+def _skip(n_walls, order, n_receivers=1):
+    if amount_of_sources(order, n_walls) > SOURCES or amount_of_sources(order, n_walls) * n_receivers > EVALUATIONS:
+        raise NotImplementedError("Exceeds budget.")
+
+
+def _room(n_walls, n_receivers):
+    walls = prism(n_walls)
+    points = positions(walls, n_receivers + 1)
+    source = Point(*points[0])
+    receivers = [Point(*point) for point in points[1:]]
+    return walls, source, receivers
+
+
+class Generation:
+    """Generation of mirror sources with :func:`ism.ism.ism`.
+    """
+    params = [WALLS, ORDERS]
+    param_names = ['walls', 'order']
+
+    def setup(self, n_walls, order):
+        _skip(n_walls, order)
+        self.walls, self.source, self.receivers = _room(n_walls, 1)
+
+    def _generate(self, n_walls, order):
+        return list(ism(self.walls, self.source, self.receivers[0], max_order=order))
+
+    def time_ism(self, n_walls, order):
+        self._generate(n_walls, order)
+
+    def peakmem_ism(self, n_walls, order):
+        self._generate(n_walls, order)
+
+    def track_mirrors_per_second(self, n_walls, order):
+        start = time.perf_counter()
+        mirrors = self._generate(n_walls, order)
+        return len(mirrors) / (time.perf_counter() - start)
+    track_mirrors_per_second.unit = 'mirrors/s'
+
+    def track_fraction_of_amount_of_sources(self, n_walls, order):
+        """Fraction of the theoretical amount of mirror sources, see :func:`ism.amount_of_sources`, that is generated.
+        """
+        return len(self._generate(n_walls, order)) / amount_of_sources(order, n_walls)
+    track_fraction_of_amount_of_sources.unit = 'fraction'
+
+
+class Determine:
+    """Effectiveness and strength with :meth:`ism.Model._determine`.
+    """
+    params = [WALLS, ORDERS, RECEIVERS]
+    param_names = ['walls', 'order', 'receivers']
+
+    def setup(self, n_walls, order, n_receivers):
+        _skip(n_walls, order, n_receivers)
+        walls, source, receivers = _room(n_walls, n_receivers)
+        self.model = Model(walls, [source], receivers, max_order=order)
+        self.mirrors = list(self.model.mirrors())
+
+    def _determine(self):
+        for mirror in self.model._determine(iter(self.mirrors)):
+            pass
+
+    def time_determine(self, n_walls, order, n_receivers):
+        self._determine()
+
+    def peakmem_determine(self, n_walls, order, n_receivers):
+        self._determine()
+
+    def track_mirrors_per_second(self, n_walls, order, n_receivers):
+        start = time.perf_counter()
+        self._determine()
+        return len(self.mirrors) / (time.perf_counter() - start)
+    track_mirrors_per_second.unit = 'mirrors/s'
+
+
+class Kernels:
+    """The compiled kernels for a single mirror source.
+    """
+    params = [WALLS, RECEIVERS]
+    param_names = ['walls', 'receivers']
+
+    def setup(self, n_walls, n_receivers):
+        if n_walls * n_receivers > EVALUATIONS:
+            raise NotImplementedError("Exceeds budget.")
+        self.walls, self.source, self.receivers = _room(n_walls, n_receivers)
+        self.receiver_positions = np.array([tuple(receiver) for receiver in self.receivers])
+        wall = self.walls[0]
+        self.wall = wall
+        self.mirror = self.source.mirror_with(wall.cached_plane())
+        self.unity = np.ones(BANDS, dtype='complex128')
+        self.unity_many = np.ones((n_receivers, BANDS), dtype='complex128')
+
+    def time_is_shadowed(self, n_walls, n_receivers):
+        for receiver in self.receivers:
+            is_shadowed(self.source, receiver, self.walls)
+
+    def time_is_shadowed_parallel(self, n_walls, n_receivers):
+        is_shadowed_parallel(self.source, self.receiver_positions, self.walls)
+
+    def time_test_effectiveness(self, n_walls, n_receivers):
+        for receiver in self.receivers:
+            test_effectiveness(self.walls, self.source, receiver, self.mirror, self.wall, self.unity)
+
+    def time_test_effectiveness_many(self, n_walls, n_receivers):
+        test_effectiveness_many(self.walls, self.source, self.receiver_positions, self.mirror, self.wall, self.unity_many)
+
+
+class Strongest:
+    """Selection of the strongest mirror sources with :meth:`ism.Model._strongest`.
+    """
+    params = [[1000, 100000], [1, 100, 1000], ['mirror', 'receiver']]
+    param_names = ['mirrors', 'receivers', 'rank']
+
+    # The selection releases the arrays of the mirror sources it drops, so every run needs new mirror sources.
+    number = 1
+    warmup_time = 0.0
+
+    def setup(self, n_mirrors, n_receivers, rank):
+        if n_mirrors * n_receivers > EVALUATIONS:
+            raise NotImplementedError("Exceeds budget.")
+        state = np.random.RandomState(0)
+        self.mirrors = list()
+        for i in range(n_mirrors):
+            mirror = Mirror(Point(0.0, 0.0, 0.0), None, None, 0)
+            mirror.strength = state.randn(n_receivers, BANDS) + 1j * state.randn(n_receivers, BANDS)
+            self.mirrors.append(mirror)
+
+    def time_strongest(self, n_mirrors, n_receivers, rank):
+        list(Model._strongest(iter(self.mirrors), 100, rank=rank))
+
+    def peakmem_strongest(self, n_mirrors, n_receivers, rank):
+        list(Model._strongest(iter(self.mirrors), 100, rank=rank))
+
+
+class Shoebox:
+    """Closed form mirror sources of a shoebox with :class:`ism.ShoeboxModel`.
+    """
+    params = [[2, 4, 8, 10, 20], [1, 100]]
+    param_names = ['order', 'receivers']
+
+    def setup(self, order, n_receivers):
+        walls = shoebox()
+        points = positions(walls, n_receivers + 1)
+        self.model = ShoeboxModel(walls, [Point(*points[0])], [Point(*point) for point in points[1:]], max_order=order)
+        self.receiver_positions = points[1:]
+
+    def _determine(self, order):
+        box = self.model.shoebox
+        source = self.model.source[0]
+        return box.evaluate(box.tree(source, order), source, self.receiver_positions)
+
+    def time_determine(self, order, n_receivers):
+        self._determine(order)
+
+    def peakmem_determine(self, order, n_receivers):
+        self._determine(order)
@@ -0,0 +1,75 @@
+"""
+Rooms used by the benchmarks.
+
+All walls have their normal pointing into the room, see :func:`ism._geometry.newell_normal`.
+"""
+import numpy as np
+from geometry import Point
+from ism import Wall
+
+BANDS = 8
+"""Amount of frequency bands of the impedance.
+"""
+
+
+def impedance(state):
+    """Random impedance of a wall.
+    """
+    return 5.0 + 20.0 * state.rand(BANDS) + 1j * state.randn(BANDS)
+
+
+def shoebox(lx=5.0, ly=4.0, lz=3.0, seed=0):
+    """Shoebox room with six walls.
+    """
+    state = np.random.RandomState(seed)
+    P = Point
+    corners = [ [P(0.0, 0.0, 0.0), P(lx, 0.0, 0.0), P(lx, ly, 0.0), P(0.0, ly, 0.0)],
+                [P(0.0, 0.0, 0.0), P(0.0, ly, 0.0), P(0.0, ly, lz), P(0.0, 0.0, lz)],
+                [P(0.0, 0.0, 0.0), P(0.0, 0.0, lz), P(lx, 0.0, lz), P(lx, 0.0, 0.0)],
+                [P(0.0, 0.0, lz), P(0.0, ly, lz), P(lx, ly, lz), P(lx, 0.0, lz)],
+                [P(lx, 0.0, 0.0), P(lx, 0.0, lz), P(lx, ly, lz), P(lx, ly, 0.0)],
+                [P(0.0, ly, 0.0), P(lx, ly, 0.0), P(lx, ly, lz), P(0.0, ly, lz)],
+              ]
+    return [Wall(points, Point(*np.mean([tuple(p) for p in points], axis=0)), impedance(state)) for points in corners]
+
+
+def prism(n_walls, radius=5.0, height=3.0, seed=0):
+    """Irregular room shaped as a prism with a convex floor plan.
+
+    :param n_walls: Amount of walls, including floor and ceiling.
+
+    The corners of the floor plan lie on a circle at random angles.
+    """
+    if n_walls == 6:
+        return shoebox(seed=seed)
+    state = np.random.RandomState(seed)
+    n_sides = n_walls - 2
+    angles = np.sort(2.0 * np.pi * (np.arange(n_sides) + 0.8 * state.rand(n_sides)) / n_sides)
+    x = radius * np.cos(angles)
+    y = radius * np.sin(angles)
+    bottom = [Point(x[i], y[i], 0.0) for i in range(n_sides)]
+    top = [Point(x[i], y[i], height) for i in range(n_sides)]
+
+    polygons = [bottom, top[::-1]]
+    for i in range(n_sides):
+        j = (i + 1) % n_sides
+        polygons.append([bottom[i], top[i], top[j], bottom[j]])
+    return [Wall(points, Point(*np.mean([tuple(p) for p in points], axis=0)), impedance(state)) for points in polygons]
+
+
+def positions(walls, amount, seed=1):
+    """Random positions inside a room.
+
+    The positions lie inside the bounding box of the room, shrunk until every position lies on the interior side of all walls.
+    """
+    state = np.random.RandomState(seed)
+    vertices = np.concatenate([np.asarray(wall.vertices) for wall in walls])
+    low, high = vertices.min(axis=0), vertices.max(axis=0)
+    center = (low + high) / 2.0
+    planes = np.array([np.asarray(wall.plane_coefficients) for wall in walls])
+    scale = 0.5
+    while True:
+        points = center + scale * (state.rand(amount, 3) - 0.5) * (high - low)
+        if (points.dot(planes[:, :3].T) + planes[:, 3] > 0.0).all():
+            return points
+        scale /= 2.0
@@ -1,2 +1,4 @@
-from .ism import amount_of_sources, Model, plot_walls
+from .ism import amount_of_sources, Model, ShoeboxModel, plot_walls
 from ._ism import Wall, Mirror
+from ._tree import MirrorTree
+from ._table import MirrorTable
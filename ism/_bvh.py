@@ -0,0 +1,215 @@
+"""
+Bounding volume hierarchy over the walls.
+
+Testing whether a line of sight is blocked requires a segment-polygon test against every wall. The hierarchy
+groups the walls in nested axis-aligned boxes so that a segment is only tested against the walls in the boxes it crosses.
+All queries are batched: many segments traverse the hierarchy at once.
+"""
+
+import numpy as np
+from ._geometry import WallArrays, signed_distance, in_polygon
+from ._paths import reflection_points
+
+
+class BVH(object):
+    """Bounding volume hierarchy over the walls.
+
+    The nodes are stored as arrays. Node 0 is the root. A leaf refers to a range in :attr:`index`.
+    """
+
+    def __init__(self, arrays, lower, upper, left, right, first, count, index):
+
+        self.arrays = arrays
+        """Walls. See :class:`ism._geometry.WallArrays`.
+        """
+
+        self.lower = lower
+        """Lower corner of the box of each node. Array of shape (N, 3).
+        """
+
+        self.upper = upper
+        """Upper corner of the box of each node. Array of shape (N, 3).
+        """
+
+        self.left = left
+        """Index of the left child of each node, or -1 for a leaf. Array of shape (N,).
+        """
+
+        self.right = right
+        """Index of the right child of each node, or -1 for a leaf. Array of shape (N,).
+        """
+
+        self.first = first
+        """First position in :attr:`index` of the walls of a leaf. Array of shape (N,).
+        """
+
+        self.count = count
+        """Amount of walls of a leaf. Array of shape (N,).
+        """
+
+        self.index = index
+        """Wall indices sorted by leaf. Array of shape (W,).
+        """
+
+    def __len__(self):
+        return len(self.left)
+
+    @classmethod
+    def from_walls(cls, walls, leaf_size=4):
+        """Build the hierarchy.
+
+        :param walls: List of walls.
+        :param leaf_size: Largest amount of walls in a leaf.
+
+        Nodes are split at the median of the centers of their walls along the axis with the largest extent.
+        """
+        arrays = WallArrays.from_walls(walls)
+        wall_lower = arrays.vertices.min(axis=1)
+        wall_upper = arrays.vertices.max(axis=1)
+        centers = (wall_lower + wall_upper) / 2.0
+
+        index = np.arange(len(arrays), dtype='int64')
+        lower, upper, left, right, first, count = [], [], [], [], [], []
+
+        # Every item on the stack is a node to create, the range of walls it holds and the node that refers to it.
+        stack = [(0, len(index), -1, None)]
+        while stack:
+            start, stop, parent, side = stack.pop()
+            node = len(left)
+            if parent >= 0:
+                (left if side == 0 else right)[parent] = node
+            members = index[start:stop]
+            lower.append(wall_lower[members].min(axis=0))
+            upper.append(wall_upper[members].max(axis=0))
+            left.append(-1)
+            right.append(-1)
+            first.append(start)
+            count.append(stop - start)
+            if stop - start > leaf_size:
+                extent = centers[members].max(axis=0) - centers[members].min(axis=0)
+                axis = int(np.argmax(extent))
+                index[start:stop] = members[np.argsort(centers[members, axis], kind='stable')]
+                middle = (start + stop) // 2
+                count[node] = 0
+                stack.append((middle, stop, node, 1))
+                stack.append((start, middle, node, 0))
+
+        return cls(arrays, np.array(lower), np.array(upper), np.array(left, dtype='int64'), np.array(right, dtype='int64'),
+                   np.array(first, dtype='int64'), np.array(count, dtype='int64'), index)
+
+    def candidates(self, starts, ends):
+        """Walls whose box is crossed by segments.
+
+        :param starts: Start points of the segments. Array of shape (S, 3).
+        :param ends: End points of the segments. Array of shape (S, 3).
+
+        :returns: Index of the segment and index of the wall of every candidate pair.
+        """
+        if not len(starts):
+            return np.zeros(0, dtype='int64'), np.zeros(0, dtype='int64')
+        direction = ends - starts
+        segment = np.arange(len(starts), dtype='int64')
+        node = np.zeros(len(starts), dtype='int64')
+        found_segment, found_wall = [], []
+
+        while len(segment):
+            hit = _crosses_box(starts[segment], direction[segment], self.lower[node], self.upper[node])
+            segment, node = segment[hit], node[hit]
+
+            leaf = self.left[node] < 0
+            amount = self.count[node[leaf]]
+            leaf_segment = np.repeat(segment[leaf], amount)
+            offsets = np.arange(amount.sum()) - np.repeat(np.cumsum(amount) - amount, amount)
+            found_segment.append(leaf_segment)
+            found_wall.append(self.index[np.repeat(self.first[node[leaf]], amount) + offsets])
+
+            inner = ~leaf
+            segment = np.concatenate([segment[inner], segment[inner]])
+            node = np.concatenate([self.left[node[inner]], self.right[node[inner]]])
+
+        return np.concatenate(found_segment), np.concatenate(found_wall)
+
+    def intersects(self, starts, ends, exclude=None):
+        """Test whether segments cross any wall.
+
+        :param starts: Start points of the segments. Array of shape (S, 3).
+        :param ends: End points of the segments. Array of shape (S, 3).
+        :param exclude: Wall indices to ignore for each segment, e.g. the walls the segment starts or ends on. Array of shape (S, E).
+
+        :returns: Boolean array of shape (S,).
+
+        A segment crosses a wall when its end points lie strictly on opposite sides of the plane and the crossing lies inside the polygon.
+        """
+        starts = np.asarray(starts, dtype='float64').reshape(-1, 3)
+        ends = np.asarray(ends, dtype='float64').reshape(-1, 3)
+        segment, wall = self.candidates(starts, ends)
+        if exclude is not None:
+            keep = ~np.any(np.asarray(exclude)[segment] == wall[:, None], axis=-1)
+            segment, wall = segment[keep], wall[keep]
+
+        arrays = self.arrays
+        normals = arrays.normals[wall]
+        offsets = arrays.offsets[wall]
+        a = signed_distance(starts[segment], normals, offsets)
+        b = signed_distance(ends[segment], normals, offsets)
+        crossing = a * b < 0.0
+        segment, wall, a, b = segment[crossing], wall[crossing], a[crossing], b[crossing]
+
+        t = a / (a - b)
+        points = starts[segment] + t[:, None] * (ends[segment] - starts[segment])
+        inside = in_polygon(points, arrays.vertices[wall], arrays.normals[wall])
+
+        result = np.zeros(len(starts), dtype='bool')
+        result[segment[inside]] = True
+        return result
+
+    def occluded(self, source, receivers, positions, walls):
+        """Test whether the path of a mirror source is blocked by any wall.
+
+        :param source: Position of the source. Array of shape (3,).
+        :param receivers: Receiver positions. Array of shape (R, 3).
+        :param positions: Positions of the mirror source and its mothers, starting with the mirror source and excluding the source. Array of shape (K, 3).
+        :param walls: Index of the generating wall of each of the mirror sources in ``positions``. Array of shape (K,).
+
+        :returns: Boolean array of shape (R,).
+
+        The path is backtracked from the receiver through the chain of mothers. Every reflection point is the crossing of the
+        line between a mirror source and the previous reflection point with the generating wall. All legs of the path
+        at all receiver positions are tested in one query, ignoring the walls a leg starts or ends on.
+        """
+        receivers = np.asarray(receivers, dtype='float64').reshape(-1, 3)
+        n_receivers = len(receivers)
+        walls = np.asarray(walls, dtype='int64').reshape(1, -1)
+        points, _ = reflection_points(receivers, np.asarray(positions, dtype='float64').reshape(1, -1, 3), walls, self.arrays)
+        points = points[0]
+
+        # Leg k ends at reflection point k-1, or at the receiver, and starts at reflection point k, or at the source.
+        ends = np.concatenate([receivers[None], points])
+        starts = np.concatenate([points, np.broadcast_to(np.asarray(source, dtype='float64'), (1, n_receivers, 3))])
+        bounding = np.concatenate([[-1], walls[0], [-1]])
+        exclude = np.repeat(np.stack([bounding[1:], bounding[:-1]], axis=-1), n_receivers, axis=0)
+
+        blocked = self.intersects(starts.reshape(-1, 3), ends.reshape(-1, 3), exclude)
+        return blocked.reshape(-1, n_receivers).any(axis=0)
+
+
+def _crosses_box(starts, direction, lower, upper):
+    """Slab test of segments against axis-aligned boxes.
+
+    :param starts: Start points. Array of shape (S, 3).
+    :param direction: End point minus start point. Array of shape (S, 3).
+    :param lower: Lower corners. Array of shape (S, 3).
+    :param upper: Upper corners. Array of shape (S, 3).
+    """
+    parallel = direction == 0.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inverse = 1.0 / np.where(parallel, 1.0, direction)
+    t1 = (lower - starts) * inverse
+    t2 = (upper - starts) * inverse
+    near = np.where(parallel, -np.inf, np.minimum(t1, t2))
+    far = np.where(parallel, np.inf, np.maximum(t1, t2))
+    outside = parallel & ((starts < lower) | (starts > upper))
+    near = near.max(axis=-1)
+    far = far.min(axis=-1)
+    return (far >= np.maximum(near, 0.0)) & (near <= 1.0) & ~outside.any(axis=-1)
+
@@ -0,0 +1,202 @@
+"""
+Vectorized geometry on NumPy arrays.
+
+The functions in this module are the array counterparts of the methods of :class:`geometry.Point`
+and :class:`geometry.Plane` that are used by the image source method. They operate on
+many points at once so that a whole order of mirror sources can be handled in one go.
+"""
+
+import numpy as np
+
+
+class WallArrays(object):
+    """Walls stored as contiguous arrays.
+
+    Polygons with fewer vertices than the largest polygon are padded by repeating their last vertex.
+    The degenerate edges this introduces have no influence on :func:`in_field_angle`.
+    """
+
+    def __init__(self, vertices, n_vertices, normals, offsets, centers):
+
+        self.vertices = vertices
+        """Vertices of the polygons. Array of shape (W, P, 3).
+        """
+
+        self.n_vertices = n_vertices
+        """Amount of vertices of each polygon. Array of shape (W,).
+        """
+
+        self.normals = normals
+        """Unit normals of the planes. Array of shape (W, 3).
+        """
+
+        self.offsets = offsets
+        """Offset :math:`d` of the plane :math:`n \\cdot x + d = 0`. Array of shape (W,).
+        """
+
+        self.centers = centers
+        """Centers of the walls. Array of shape (W, 3).
+        """
+
+    def __len__(self):
+        return len(self.normals)
+
+    @classmethod
+    def from_walls(cls, walls):
+        """Create from a list of :class:`ism.Wall`.
+
+        :param walls: List of walls.
+
+        The geometry cached by the walls is used.
+        """
+        n_vertices = np.array([len(wall.vertices) for wall in walls], dtype='int64')
+
+        vertices = np.empty((len(walls), n_vertices.max(), 3), dtype='float64')
+        for i, wall in enumerate(walls):
+            vertices[i, :n_vertices[i]] = wall.vertices
+            vertices[i, n_vertices[i]:] = wall.vertices[-1]
+
+        coefficients = np.array([wall.plane_coefficients for wall in walls], dtype='float64').reshape(-1, 4)
+        normals = np.ascontiguousarray(coefficients[:, :3])
+        offsets = np.ascontiguousarray(coefficients[:, 3])
+        centers = np.array([tuple(wall.center) for wall in walls], dtype='float64').reshape(-1, 3)
+
+        return cls(vertices, n_vertices, normals, offsets, centers)
+
+
+def newell_normal(polygon):
+    """Unit normal of a planar polygon using Newell's method.
+
+    :param polygon: Vertices. Array of shape (P, 3).
+
+    The orientation follows the right-hand rule with respect to the order of the vertices.
+    """
+    following = np.roll(polygon, -1, axis=0)
+    normal = np.cross(polygon, following).sum(axis=0)
+    return normal / np.linalg.norm(normal)
+
+
+def signed_distance(points, normals, offsets):
+    """Signed distance of points to planes.
+
+    :param points: Points. Array of shape (..., 3).
+    :param normals: Unit normals. Array of shape (..., 3).
+    :param offsets: Offsets. Array of shape (...).
+
+    A positive distance means the point is on the interior side of the plane.
+    """
+    return np.einsum('...k,...k->...', points, normals) + offsets
+
+
+def mirror_points(points, normals, offsets):
+    """Mirror points with planes.
+
+    :param points: Points. Array of shape (..., 3).
+    :param normals: Unit normals. Array of shape (..., 3).
+    :param offsets: Offsets. Array of shape (...).
+
+    This is the array version of :meth:`geometry.Point.mirror_with`.
+    """
+    return points - 2.0 * signed_distance(points, normals, offsets)[..., None] * normals
+
+
+def reflection_matrices(normals, offsets):
+    """Homogeneous transformation matrices of the reflections with planes.
+
+    :param normals: Unit normals. Array of shape (..., 3).
+    :param offsets: Offsets. Array of shape (...).
+
+    :returns: Array of shape (..., 4, 4).
+
+    Applying the matrix to :math:`(x, 1)` gives the point mirrored with :func:`mirror_points`. A chain of reflections is the matrix product.
+    """
+    normals = np.asarray(normals, dtype='float64')
+    offsets = np.asarray(offsets, dtype='float64')
+    matrices = np.zeros(offsets.shape + (4, 4))
+    matrices[..., :3, :3] = np.eye(3) - 2.0 * normals[..., :, None] * normals[..., None, :]
+    matrices[..., :3, 3] = -2.0 * offsets[..., None] * normals
+    matrices[..., 3, 3] = 1.0
+    return matrices
+
+
+def in_field_angle(points, apex, vertices, normals, offsets):
+    """Test whether points lie in the field angle of an apex and a polygon.
+
+    :param points: Points to test. Array of shape (..., 3).
+    :param apex: Apex of the field angle, typically a (mirror) source. Array of shape (..., 3).
+    :param vertices: Vertices of the polygon. Array of shape (..., P, 3).
+    :param normals: Unit normals of the plane of the polygon. Array of shape (..., 3).
+    :param offsets: Offsets of the plane of the polygon. Array of shape (...).
+
+    :rtype: Boolean array of shape (...).
+
+    This is the array version of :meth:`geometry.Point.in_field_angle`. The field angle is the pyramid with its top at the apex
+    and its sides passing through the edges of the polygon. A point is in the field angle when it lies on the inner side of every side.
+    An apex that lies in the plane of the polygon has no field angle.
+    """
+    side = signed_distance(apex, normals, offsets)
+    a = vertices - apex[..., None, :]
+    sides = np.cross(a, np.roll(a, -1, axis=-2))
+    s = np.einsum('...pk,...k->...p', sides, points - apex)
+    return np.all(s * side[..., None] <= 0.0, axis=-1) & (side != 0.0)
+
+
+def field_angle_planes(apex, vertices, normals, offsets):
+    """Planes bounding the field angle of an apex and a polygon.
+
+    :param apex: Apex of the field angle. Array of shape (..., 3).
+    :param vertices: Vertices of the polygon. Array of shape (..., P, 3).
+    :param normals: Unit normals of the plane of the polygon. Array of shape (..., 3).
+    :param offsets: Offsets of the plane of the polygon. Array of shape (...).
+
+    :returns: Unit normals (..., P, 3) and offsets (..., P) of the sides of the field angle.
+
+    The normals point inwards, so a point lies in the field angle when its signed distance to every side is non-negative.
+    The sides of degenerate edges have an infinite offset and never bound the field angle.
+    An apex that lies in the plane of the polygon has no field angle, which is expressed as an offset of minus infinity.
+    """
+    side = signed_distance(apex, normals, offsets)
+    a = vertices - apex[..., None, :]
+    sides = np.cross(a, np.roll(a, -1, axis=-2)) * -np.sign(side)[..., None, None]
+    norm = np.linalg.norm(sides, axis=-1, keepdims=True)
+    degenerate = norm[..., 0] == 0.0
+    sides = np.divide(sides, norm, out=np.zeros_like(sides), where=norm > 0.0)
+    side_offsets = -np.einsum('...pk,...k->...p', sides, apex)
+    side_offsets[degenerate] = np.inf
+    side_offsets[side == 0.0] = -np.inf
+    return sides, side_offsets
+
+
+def visibility(points, normals, offsets, side_normals, side_offsets):
+    """Visibility of points through a polygon and the distance to the boundary of the visible region.
+
+    :param points: Points to test. Array of shape (..., 3).
+    :param normals: Unit normals of the plane of the polygon. Array of shape (..., 3).
+    :param offsets: Offsets of the plane of the polygon. Array of shape (...).
+    :param side_normals: Unit normals of the sides of the field angle. Array of shape (..., P, 3).
+    :param side_offsets: Offsets of the sides of the field angle. Array of shape (..., P).
+
+    :returns: Visibility (...) and margin (...).
+
+    A point is visible when it lies on the interior side of the polygon and in the field angle, see :func:`field_angle_planes`.
+    The margin is the distance to the nearest bounding plane. A point that moves less than the margin keeps its visibility.
+    """
+    distance = signed_distance(points, normals, offsets)
+    sides = np.einsum('...pk,...k->...p', side_normals, points) + side_offsets
+    visible = (distance > 0.0) & np.all(sides >= 0.0, axis=-1)
+    margin = np.minimum(np.abs(distance), np.abs(sides).min(axis=-1))
+    return visible, margin
+
+
+def in_polygon(points, vertices, normals):
+    """Test whether points in the plane of convex polygons lie inside the polygons.
+
+    :param points: Points. Array of shape (..., 3).
+    :param vertices: Vertices of the polygons. Array of shape (..., P, 3).
+    :param normals: Unit normals of the polygons. Array of shape (..., 3).
+
+    Points on the boundary are inside.
+    """
+    edges = np.roll(vertices, -1, axis=-2) - vertices
+    s = np.einsum('...pk,...k->...p', np.cross(edges, points[..., None, :] - vertices), normals)
+    return np.all(s >= 0.0, axis=-1)
@@ -14,6 +14,26 @@ cdef class Wall(Polygon):
     """
     Impedance
     """
+    cdef public object reflection_table
+    """
+    Tabulated reflection coefficient. See :meth:`tabulate`.
+    """
+    cdef public object frequencies
+    """
+    Frequencies of the impedance, or None when the impedance is on the frequency grid of the model. See :class:`ism._material.Materials`.
+    """
+    cdef readonly double[::1] plane_coefficients
+    cdef readonly double[::1] unit_normal
+    cdef readonly double[::1] centroid
+    cdef readonly double[:, ::1] vertices
+    cdef readonly double[:, ::1] edges
+    cdef Plane _plane
+    cdef Py_hash_t _hash
+    
+    cdef _cache(self, list points)
+    cpdef update_cache(self)
+    cpdef Plane cached_plane(self)
+    cpdef Wall mirror(self)
     
 cdef class Mirror(object):
     cdef public Point position
@@ -1,5 +1,14 @@
 
+# distutils: extra_compile_args = -fopenmp
+# distutils: extra_link_args = -fopenmp
+
 import numpy as np
+cimport cython
+from cython.parallel cimport prange
+from libc.math cimport sqrt
+from ._geometry import newell_normal, signed_distance, in_field_angle, WallArrays
+from ._reflection import reflection_coefficient, ReflectionTable
+from ._material import Materials
 
 cdef class Wall(Polygon):
     """
@@ -8,6 +17,75 @@ cdef class Wall(Polygon):
     """
     def __cinit__(self, *args, **kwargs):
         self.impedance = args[2]
+        self._cache(list(args[0]))
+    
+    cdef _cache(self, list points):
+        """Store the geometry that is needed by the ISM kernels.
+        """
+        vertices = np.array([tuple(point) for point in points], dtype='float64')
+        normal = newell_normal(vertices)
+        
+        self.vertices = vertices
+        """Vertices. Array of shape (P, 3).
+        """
+        self.edges = np.roll(vertices, -1, axis=0) - vertices
+        """Edge vectors from each vertex to the next. Array of shape (P, 3).
+        """
+        self.unit_normal = normal
+        """Unit normal of the plane.
+        """
+        self.centroid = vertices.mean(axis=0)
+        """Centroid of the vertices.
+        """
+        self.plane_coefficients = np.append(normal, -normal.dot(vertices[0]))
+        """Coefficients :math:`a, b, c, d` of the plane :math:`ax + by + cz + d = 0`.
+        """
+        self._plane = None
+        # Adding zero turns -0.0 into 0.0, which compare equal.
+        self._hash = hash((vertices + 0.0).tobytes())
+    
+    cpdef update_cache(self):
+        """Update the cached geometry.
+        
+        The cache is created when the wall is constructed. Call this method after modifying :attr:`points`.
+        """
+        self._cache(list(self.points))
+    
+    cpdef Plane cached_plane(self):
+        """Plane of the wall.
+        
+        Like :meth:`plane` but the plane is created only once.
+        """
+        if self._plane is None:
+            self._plane = self.plane()
+        return self._plane
+
+    def tabulate(self, bins=ReflectionTable.BINS, tolerance=ReflectionTable.TOLERANCE):
+        """Tabulate the reflection coefficient over the angle of incidence.
+        
+        :param bins: Amount of bins of the cosine of the angle of incidence.
+        :param tolerance: Largest acceptable interpolation error. In bins where it is exceeded the exact reflection coefficient is used.
+        
+        :returns: Instance of :class:`ism._reflection.ReflectionTable`, which is also stored as :attr:`reflection_table`.
+        
+        Call this method again after modifying :attr:`impedance`.
+        """
+        self.reflection_table = ReflectionTable.from_impedance(self.impedance, bins, tolerance)
+        return self.reflection_table
+    
+    def reflection(self, cos_angle, bands=None):
+        """Reflection coefficient.
+        
+        :param cos_angle: Cosine of the angle of incidence. Array of shape (...).
+        :param bands: Index of the frequency bands to compute. By default all bands.
+        
+        :returns: Reflection coefficient. Array of shape (..., F), or (..., B) with ``bands``.
+        
+        The table created with :meth:`tabulate` is used when available. Otherwise the exact value is computed.
+        """
+        if self.reflection_table is None:
+            return reflection_coefficient(self.impedance if bands is None else self.impedance[bands], cos_angle)
+        return self.reflection_table(cos_angle, bands)
 
     def __richcmp__(self, other, int op):
         
@@ -17,13 +95,24 @@ cdef class Wall(Polygon):
         if not isinstance(other, Wall):
             return False
         
-        equal = True if (self.points==other.points and self.center==other.center and np.all(self.impedance==other.impedance)) else False
+        # Walls with different vertices have a different hash with near certainty, so the full comparison is rarely needed.
+        if self is other:
+            equal = True
+        elif self._hash != (<Wall>other)._hash:
+            equal = False
+        else:
+            equal = True if (self.points==other.points and self.center==other.center and np.all(self.impedance==other.impedance)) else False
         
         if (op==2 and equal==True) or (op==3 and equal==False): # a == b
             return True
         else:
             return False
 
+    def __hash__(self):
+        """Hash of the vertices. It is updated by :meth:`update_cache`.
+        """
+        return self._hash
+
     def __repr__(self):
         return "Wall({})".format(str(self))
         
@@ -35,8 +124,14 @@ cdef class Wall(Polygon):
 
     cpdef Wall mirror(self):
         """Mirror the wall.
+        
+        The mirrored wall has its own cache with a flipped normal. It shares the
+        frequencies and the reflection table, which depend on the impedance only.
         """
-        return Wall(self.points[::-1], self.center, self.impedance)
+        wall = Wall(self.points[::-1], self.center, self.impedance)
+        wall.frequencies = self.frequencies
+        wall.reflection_table = self.reflection_table
+        return wall
 
 
 cdef class Mirror(object):
@@ -56,7 +151,7 @@ cdef class Mirror(object):
     #cdef public np.ndarray strength
 
 
-    def __init__(self, Point position, Mirror mother, Wall wall, int order):
+    def __init__(self, Point position, Mirror mother, Wall wall, int order, int wall_index=-1):
         """
         Constructor
         """
@@ -75,6 +170,11 @@ cdef class Mirror(object):
         """
         Generating wall. (So that's the wall it's mirrored at, right?)
         """
+        
+        self.wall_index = wall_index
+        """
+        Index of the generating wall in the list of walls. The zeroth order source has -1.
+        """
         self.order = order
         """
         Order.
@@ -101,7 +201,7 @@ cdef class Mirror(object):
     def __str__(self):
         return "({},{})".format(self.order, self.position)
     
-    
+
 cpdef int is_shadowed(Point source, Point receiver, list walls):
     """
     Test whether the receiver is shadowed by any of the walls.
@@ -119,8 +219,8 @@ cpdef int is_shadowed(Point source, Point receiver, list walls):
         #logging.debug("Wall {}".format(wall.plane()))
         #print(source.on_interior_side_of(wall.plane()))
         #print("angle"+str(receiver.in_field_angle(source, wall, Plane.from_normal_and_point(wall.plane().normal(), receiver))))
-        if source.on_interior_side_of(wall.plane()) == +1:# and receiver.on_interior_side_of(wall.plane()) == -1):#and not (receiver.on_interior_side_of(wall.plane()) == +1):
-            if receiver.in_field_angle(source, wall, Plane.from_normal_and_point(wall.plane().normal(), receiver)):
+        if source.on_interior_side_of(wall.cached_plane()) == +1:# and receiver.on_interior_side_of(wall.plane()) == -1):#and not (receiver.on_interior_side_of(wall.plane()) == +1):
+            if receiver.in_field_angle(source, wall, Plane.from_normal_and_point(wall.cached_plane().normal(), receiver)):
                 #intersection = wall.plane().intersection(source, receiver)
                 #if ((intersection-source).norm() < (receiver-source).norm())  \
                 #and ((intersection-receiver).norm() < (receiver-source).norm()) :    # Wall is actually in between source and receiver.
@@ -147,7 +247,7 @@ cpdef test_effectiveness(list walls, Point source_position, Point receiver_posit
         return effective, strength, distance
     
     else:
-        if receiver_position.on_interior_side_of(mirror_wall.plane()) == +1 and receiver_position.in_field_angle(mirror_position, mirror_wall, Plane.from_normal_and_point(mirror_wall.plane().normal(), receiver_position)):
+        if receiver_position.on_interior_side_of(mirror_wall.cached_plane()) == +1 and receiver_position.in_field_angle(mirror_position, mirror_wall, Plane.from_normal_and_point(mirror_wall.cached_plane().normal(), receiver_position)):
             effective = 1
         else:
             effective = 0
@@ -180,21 +280,240 @@ cpdef test_effectiveness(list walls, Point source_position, Point receiver_posit
                 #effective = 0
         
         # Determine strength of source
-        cos_angle = mirror_wall.plane().normal().cosines_with(source_position.cosines_with(receiver_position))   # Cosine of the angle between the line of sight and the wall normal.
+        cos_angle = mirror_wall.cached_plane().normal().cosines_with(source_position.cosines_with(receiver_position))   # Cosine of the angle between the line of sight and the wall normal.
         
         # Reflection coefficient - Plane wave
-        try:
-            refl = (mirror_wall.impedance*cos_angle - 1.0) / (mirror_wall.impedance*cos_angle + 1.0)    # Reflection coefficient
-        except ZeroDivisionError:   # If angle of incidence is 90 degrees, then cos_angle is 0.0. With hard reflection this results in a division by zero.
-            refl = 1.0
+        refl = mirror_wall.reflection(cos_angle)
         
         strength = mother_strength * refl   # Amplitude strength due to current and past reflections
         
-        return effective, strength, distance  
+        return effective, strength, distance
+
+
+def reflection_magnitude(list walls, Point source_position, np.ndarray receiver_positions, materials=None):
+    """
+    Largest magnitude of the reflection coefficient of each wall at each receiver position.
+    
+    :param receiver_positions: Receiver positions. Array of shape (R, 3).
+    :param materials: Impedance of the walls. See :class:`ism._material.Materials`. By default it is collected from the walls.
+    
+    :returns: Magnitude of the reflection coefficient, maximized over the frequency bands. Array of shape (W, R).
+    
+    The angle of incidence that is used by :func:`test_effectiveness` depends only on the wall and the receiver position.
+    The strength of a mirror source is therefore bounded by the product of these values along its chain of walls.
+    The coefficients follow from :meth:`ism._material.Materials.reflection`, like the strength, so the bound also holds
+    for impedance that is resampled onto a common frequency grid.
+    """
+    line_of_sight = receiver_positions - np.array(tuple(source_position), dtype='float64')
+    line_of_sight /= np.linalg.norm(line_of_sight, axis=-1)[:, None]
+    
+    if materials is None:
+        materials = Materials.from_walls(walls)
+    normals = np.array([np.asarray(wall.unit_normal) for wall in walls], dtype='float64').reshape(-1, 3)
+    return np.abs(materials.reflection(np.dot(normals, line_of_sight.T))).max(axis=-1)
+
+
+def test_effectiveness_many(list walls, Point source_position, np.ndarray receiver_positions, Point mirror_position, Wall mirror_wall, np.ndarray mother_strength, bands=None, reflection=None):
+    """
+    Test the effectiveness of a mirror at many receiver locations.
+    
+    :param receiver_positions: Receiver positions. Array of shape (R, 3).
+    :param mother_strength: Strength of the mother source at the receiver positions. Array of shape (R, F), or (R, B) with ``bands``.
+    :param bands: Index of the frequency bands of the strength. By default all bands.
+    :param reflection: Reflection coefficient of ``mirror_wall`` at the receiver positions in the bands of the strength, e.g. from
+                       :meth:`ism._material.Materials.reflection`. Array of shape (R, F). By default it is computed.
+    
+    :returns: Effectiveness (R,), strength (R, F) and distance (R,). The strength has the data type of ``mother_strength``.
+    
+    This is the vectorized version of :func:`test_effectiveness`.
+    """
+    
+    mirror = np.array(tuple(mirror_position), dtype='float64')
+    distance = np.linalg.norm(receiver_positions - mirror, axis=-1)
+    
+    if not mirror_wall: # Zeroth order source
+        effective = np.ones(len(receiver_positions), dtype='bool')
+        strength = np.ones_like(mother_strength)
+        return effective, strength, distance
+    
+    vertices = np.asarray(mirror_wall.vertices)
+    normal = np.asarray(mirror_wall.unit_normal)
+    offset = mirror_wall.plane_coefficients[3]
+    
+    effective = (signed_distance(receiver_positions, normal, offset) > 0.0) & in_field_angle(receiver_positions, mirror, vertices, normal, offset)
+    
+    if reflection is None:
+        # Cosine of the angle between the line of sight and the wall normal.
+        line_of_sight = receiver_positions - np.array(tuple(source_position), dtype='float64')
+        cos_angle = line_of_sight.dot(normal) / np.linalg.norm(line_of_sight, axis=-1)
+        reflection = mirror_wall.reflection(cos_angle, bands)
+    
+    strength = (mother_strength * reflection).astype(mother_strength.dtype, copy=False)   # Amplitude strength due to current and past reflections
+    
+    return effective, strength, distance
+
+
+@cython.boundscheck(False)
+cdef inline double _signed_distance(double[::1] plane, double x, double y, double z) noexcept nogil:
+    """Signed distance of a point to a plane given by its coefficients.
+    """
+    return plane[0]*x + plane[1]*y + plane[2]*z + plane[3]
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef bint _in_field_angle(double x, double y, double z, double sx, double sy, double sz, double[:, ::1] vertices, double[::1] plane) noexcept nogil:
+    """Test whether a point is in the field angle of an apex and a polygon.
+    
+    See :func:`ism._geometry.in_field_angle`.
+    """
+    cdef double side = _signed_distance(plane, sx, sy, sz)
+    if side == 0.0:
+        return False
+    
+    cdef Py_ssize_t n = vertices.shape[0]
+    cdef Py_ssize_t k, l
+    cdef double ax, ay, az, bx, by, bz
+    cdef double qx = x - sx
+    cdef double qy = y - sy
+    cdef double qz = z - sz
+    
+    for k in range(n):
+        l = k + 1 if k + 1 < n else 0
+        ax = vertices[k, 0] - sx
+        ay = vertices[k, 1] - sy
+        az = vertices[k, 2] - sz
+        bx = vertices[l, 0] - sx
+        by = vertices[l, 1] - sy
+        bz = vertices[l, 2] - sz
+        if ((ay*bz - az*by)*qx + (az*bx - ax*bz)*qy + (ax*by - ay*bx)*qz) * side > 0.0:
+            return False
+    return True
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef bint _is_shadowed(double sx, double sy, double sz, double x, double y, double z, double[:, :, ::1] vertices, double[:, ::1] planes) noexcept nogil:
+    """Test whether a receiver is shadowed by any of the walls. See :func:`is_shadowed`.
+    """
+    cdef Py_ssize_t w
+    for w in range(planes.shape[0]):
+        if _signed_distance(planes[w], sx, sy, sz) > 0.0 and _in_field_angle(x, y, z, sx, sy, sz, vertices[w], planes[w]):
+            return True
+    return False
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def is_shadowed_parallel(Point source, double[:, ::1] receiver_positions, list walls, int num_threads=1):
+    """
+    Test whether receivers are shadowed by any of the walls.
+    
+    :param receiver_positions: Receiver positions. Array of shape (R, 3).
+    :param num_threads: Amount of threads.
+    
+    :returns: Shadowed (R,).
+    
+    This is the parallel version of :func:`is_shadowed`. The receiver positions are divided over the threads.
+    Each receiver position is handled by the same kernel, so the result does not depend on the amount of threads.
+    """
+    arrays = WallArrays.from_walls(walls)
+    cdef double[:, :, ::1] vertices = arrays.vertices
+    cdef double[:, ::1] planes = np.ascontiguousarray(np.column_stack((arrays.normals, arrays.offsets)))
+    
+    cdef Py_ssize_t n = receiver_positions.shape[0]
+    shadowed = np.empty(n, dtype='int32')
+    cdef int[::1] result = shadowed
+    cdef double sx = source.x, sy = source.y, sz = source.z
+    cdef Py_ssize_t t
+    
+    for t in prange(n, nogil=True, num_threads=num_threads, schedule='static'):
+        result[t] = _is_shadowed(sx, sy, sz, receiver_positions[t, 0], receiver_positions[t, 1], receiver_positions[t, 2], vertices, planes)
+    
+    return shadowed
 
-        
-        
 
+ctypedef fused complex_t:
+    float complex
+    double complex
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def test_effectiveness_parallel(list walls, Point source_position, double[:, ::1] receiver_positions, Point mirror_position, Wall mirror_wall, complex_t[:, ::1] mother_strength, int num_threads=1, reflection=None):
+    """
+    Test the effectiveness of a mirror at many receiver locations using multiple threads.
+    
+    :param receiver_positions: Receiver positions. Array of shape (R, 3).
+    :param mother_strength: Strength of the mother source at the receiver positions, in single or double precision. Array of shape (R, F).
+    :param num_threads: Amount of threads.
+    :param reflection: Reflection coefficient of ``mirror_wall`` at the receiver positions in the bands of the strength, e.g. from
+                       :meth:`ism._material.Materials.reflection`. Array of shape (R, F). By default it is computed with :meth:`Wall.reflection`.
+    
+    :returns: Effectiveness (R,), strength (R, F) and distance (R,). The strength has the data type of ``mother_strength``.
+    
+    This is the parallel version of :func:`test_effectiveness_many`. The receiver positions are divided over the threads.
+    Each receiver position is handled by the same kernel, so the result does not depend on the amount of threads.
+    The reflection coefficients are computed before the threads start, so tabulated and resampled impedance are respected.
+    The strength is multiplied in double precision and stored in the precision of ``mother_strength``, so single precision
+    needs no conversions of whole arrays.
+    """
+    cdef Py_ssize_t n = receiver_positions.shape[0]
+    cdef Py_ssize_t f = mother_strength.shape[1]
+    cdef Py_ssize_t t, k
+    
+    if mother_strength.shape[0] != n:
+        raise ValueError("Strength of the mother source should be given at every receiver position.")
+    
+    effective = np.empty(n, dtype='int32')
+    distance = np.empty(n, dtype='float64')
+    strength = np.empty((n, f), dtype='complex64' if complex_t is floatcomplex else 'complex128')
+    
+    cdef int[::1] e = effective
+    cdef double[::1] d = distance
+    cdef complex_t[:, ::1] q = strength
+    
+    cdef double mx = mirror_position.x, my = mirror_position.y, mz = mirror_position.z
+    cdef double x, y, z, dx, dy, dz
+    
+    if not mirror_wall: # Zeroth order source
+        for t in prange(n, nogil=True, num_threads=num_threads, schedule='static'):
+            dx = receiver_positions[t, 0] - mx
+            dy = receiver_positions[t, 1] - my
+            dz = receiver_positions[t, 2] - mz
+            d[t] = sqrt(dx*dx + dy*dy + dz*dz)
+            e[t] = 1
+            for k in range(f):
+                q[t, k] = 1.0
+        return effective, strength, distance
+    
+    cdef double[:, ::1] vertices = mirror_wall.vertices
+    cdef double[::1] plane = mirror_wall.plane_coefficients
+    
+    if reflection is None:
+        # Cosine of the angle between the line of sight and the wall normal.
+        line_of_sight = np.asarray(receiver_positions) - np.array(tuple(source_position), dtype='float64')
+        cos_angle = line_of_sight.dot(np.asarray(mirror_wall.unit_normal)) / np.linalg.norm(line_of_sight, axis=-1)
+        reflection = mirror_wall.reflection(cos_angle)
+    cdef double complex[:, ::1] refl = np.ascontiguousarray(reflection, dtype='complex128')
+    if refl.shape[0] != n or refl.shape[1] != f:
+        raise ValueError("Reflection coefficient should have the shape of the strength.")
+    
+    for t in prange(n, nogil=True, num_threads=num_threads, schedule='static'):
+        x = receiver_positions[t, 0]
+        y = receiver_positions[t, 1]
+        z = receiver_positions[t, 2]
         
+        dx = x - mx
+        dy = y - my
+        dz = z - mz
+        d[t] = sqrt(dx*dx + dy*dy + dz*dz)
         
+        e[t] = _signed_distance(plane, x, y, z) > 0.0 and _in_field_angle(x, y, z, mx, my, mz, vertices, plane)
         
+        for k in range(f):
+            q[t, k] = <complex_t>(<double complex>mother_strength[t, k] * refl[t, k])
+    
+    return effective, strength, distance
+
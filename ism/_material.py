@@ -0,0 +1,115 @@
+"""
+Impedance of all walls on a common frequency grid.
+
+The strength of a mirror source is the product of the reflection coefficients of the walls along its chain. With the
+impedance of all walls stored in one matrix, the reflection coefficients of all walls at all receiver positions are
+computed at once, and the strength follows from gathering rows of that array by wall index and multiplying them.
+"""
+
+import numpy as np
+from ._reflection import reflection_coefficient
+
+
+class Materials(object):
+    """Impedance of the walls as one contiguous matrix.
+    """
+
+    def __init__(self, impedance, frequencies=None, tables=None):
+
+        self.impedance = impedance
+        """Normalized impedance of every wall. Array of shape (W, F).
+        """
+
+        self.frequencies = frequencies
+        """Frequencies of the columns of :attr:`impedance`, or ``None`` when unknown. Array of shape (F,).
+        """
+
+        self.tables = tables if tables is not None else [None] * len(impedance)
+        """Tabulated reflection coefficient of every wall, or ``None``. See :meth:`ism.Wall.tabulate`.
+        """
+
+    def __len__(self):
+        return len(self.impedance)
+
+    @property
+    def n_bands(self):
+        """Amount of frequency bands.
+        """
+        return self.impedance.shape[-1]
+
+    @classmethod
+    def from_walls(cls, walls, frequencies=None):
+        """Collect and validate the impedance of walls.
+
+        :param walls: List of walls.
+        :param frequencies: Common frequency grid. By default the grid of the first wall that has :attr:`ism.Wall.frequencies`.
+
+        The impedance of a wall with :attr:`ism.Wall.frequencies` is resampled onto the common grid by linear interpolation
+        of the real and imaginary parts. The impedance of the other walls has to be given on the common grid already.
+        A :class:`ValueError` is raised for an impedance that does not fit the grid or is not finite.
+
+        The reflection tables of walls that are not resampled are kept.
+        """
+        if frequencies is None:
+            frequencies = next((wall.frequencies for wall in walls if wall.frequencies is not None), None)
+        if frequencies is not None:
+            frequencies = np.asarray(frequencies, dtype='float64')
+            n_bands = len(frequencies)
+        else:
+            n_bands = len(walls[0].impedance) if walls else 0
+
+        impedance = np.empty((len(walls), n_bands), dtype='complex128')
+        tables = []
+        for i, wall in enumerate(walls):
+            values = np.asarray(wall.impedance)
+            if values.ndim != 1:
+                raise ValueError("Impedance of wall {} should be one-dimensional.".format(i))
+            if wall.frequencies is not None and frequencies is not None and not np.array_equal(wall.frequencies, frequencies):
+                grid = np.asarray(wall.frequencies, dtype='float64')
+                if grid.shape != values.shape:
+                    raise ValueError("Impedance and frequencies of wall {} differ in length.".format(i))
+                impedance[i] = np.interp(frequencies, grid, values.real) + 1j * np.interp(frequencies, grid, values.imag)
+                tables.append(None)
+            elif len(values) != n_bands:
+                raise ValueError("Impedance of wall {} has {} bands instead of {}.".format(i, len(values), n_bands))
+            else:
+                impedance[i] = values
+                tables.append(wall.reflection_table)
+        if not np.isfinite(impedance).all():
+            raise ValueError("Impedance should be finite.")
+        return cls(impedance, frequencies, tables)
+
+    def reflection(self, cos_angle, bands=None):
+        """Reflection coefficient of every wall.
+
+        :param cos_angle: Cosine of the angle of incidence at every wall. Array of shape (W, ...).
+        :param bands: Index of the frequency bands. By default all bands.
+
+        :returns: Array of shape (W, ..., F), or (W, ..., B) with ``bands``.
+
+        The walls without a table are computed in one vectorized call.
+        """
+        cos_angle = np.asarray(cos_angle, dtype='float64')
+        impedance = self.impedance if bands is None else self.impedance[:, bands]
+        impedance = impedance.reshape((len(self),) + (1,) * (cos_angle.ndim - 1) + impedance.shape[-1:])
+        refl = reflection_coefficient(impedance, cos_angle)
+        for wall, table in enumerate(self.tables):
+            if table is not None:
+                refl[wall] = table(cos_angle[wall], bands)
+        return refl
+
+    @staticmethod
+    def strength(reflection, walls):
+        """Strength of mirror sources from their wall sequences.
+
+        :param reflection: Reflection coefficient of every wall. See :meth:`reflection`. Array of shape (W, R, F).
+        :param walls: Index of the walls along the chain of every mirror source. Entries of -1 are skipped. Array of shape (M, K).
+
+        :returns: Array of shape (M, R, F).
+        """
+        walls = np.asarray(walls, dtype='int64').reshape(len(walls), -1)
+        strength = np.ones((len(walls),) + reflection.shape[1:], dtype=reflection.dtype)
+        for k in range(walls.shape[1]):
+            present = walls[:, k] >= 0
+            strength[present] *= reflection[walls[present, k]]
+        return strength
@@ -0,0 +1,74 @@
+"""
+Reflection paths of mirror sources.
+
+The path of a mirror source to a receiver is found by backtracking through its chain of mothers. The line from the
+mirror source to the receiver crosses the generating wall at the last reflection point. The line from the mother to that
+reflection point crosses the generating wall of the mother at the previous reflection point, and so on.
+A path is valid when every reflection point lies on its leg and inside its polygon.
+"""
+
+import numpy as np
+from ._geometry import signed_distance, in_polygon
+
+
+def chains(mother, wall, index):
+    """Chains of mothers of mirror sources stored as arrays.
+
+    :param mother: Index of the mother of every mirror source. Array of shape (N,).
+    :param wall: Index of the generating wall of every mirror source. Array of shape (N,).
+    :param index: Index of mirror sources of the same order. Array of shape (M,).
+
+    :returns: Index of the mirror source and its mothers, starting with the mirror source and excluding the source. Array of shape (M, K).
+    """
+    chain = [np.asarray(index, dtype='int64')]
+    while len(chain[-1]) and wall[chain[-1][0]] >= 0:
+        chain.append(mother[chain[-1]])
+    return np.stack(chain[:-1], axis=1) if len(chain) > 1 else np.empty((len(chain[0]), 0), dtype='int64')
+
+
+def reflection_points(receivers, positions, walls, arrays):
+    """Reflection points of the paths of mirror sources of the same order.
+
+    :param receivers: Receiver positions. Array of shape (R, 3).
+    :param positions: Positions of the mirror sources and their mothers, starting with the mirror source. Array of shape (M, K, 3).
+    :param walls: Index of the generating walls of the mirror sources in ``positions``. Array of shape (M, K).
+    :param arrays: Walls. See :class:`ism._geometry.WallArrays`.
+
+    :returns: Reflection points (M, K, R, 3) and their position on the legs (M, K, R).
+
+    The position on a leg is 0 at the mirror source and 1 at the next point of the path.
+    """
+    n_mirrors, depth = walls.shape
+    target = np.broadcast_to(receivers, (n_mirrors,) + receivers.shape)
+    points = np.empty((n_mirrors, depth) + receivers.shape, dtype='float64')
+    fraction = np.empty((n_mirrors, depth, len(receivers)), dtype='float64')
+    for k in range(depth):
+        position = positions[:, k, None, :]
+        normals = arrays.normals[walls[:, k], None, :]
+        offsets = arrays.offsets[walls[:, k], None]
+        a = signed_distance(position, normals, offsets)
+        b = signed_distance(target, normals, offsets)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = a / (a - b)
+        fraction[:, k] = t
+        points[:, k] = position + t[..., None] * (target - position)
+        target = points[:, k]
+    return points, fraction
+
+
+def validate(receivers, positions, walls, arrays):
+    """Test whether the paths of mirror sources of the same order are valid.
+
+    :param receivers: Receiver positions. Array of shape (R, 3).
+    :param positions: Positions of the mirror sources and their mothers, starting with the mirror source. Array of shape (M, K, 3).
+    :param walls: Index of the generating walls of the mirror sources in ``positions``. Array of shape (M, K).
+    :param arrays: Walls. See :class:`ism._geometry.WallArrays`.
+
+    :returns: Boolean array of shape (M, R).
+
+    All mirror sources and receiver positions are handled at once. See :func:`reflection_points`.
+    """
+    points, fraction = reflection_points(receivers, positions, walls, arrays)
+    on_leg = (fraction >= 0.0) & (fraction <= 1.0)
+    inside = in_polygon(points, arrays.vertices[walls][:, :, None], arrays.normals[walls][:, :, None])
+    return np.all(on_leg & inside, axis=1)
@@ -0,0 +1,121 @@
+"""
+Reflection coefficients of walls.
+
+Computing the plane wave reflection coefficient requires a complex division for every band. Because the coefficient
+depends only on the impedance of a wall and the angle of incidence, it can be tabulated once per wall over bins of the
+cosine of the angle of incidence. A lookup then costs an interpolation between two rows of the table.
+"""
+
+from collections import OrderedDict
+import numpy as np
+
+
+def reflection_coefficient(impedance, cos_angle):
+    """
+    Plane wave reflection coefficient.
+
+    :param impedance: Normalized impedance. Array of shape (F,).
+    :param cos_angle: Cosine of the angle of incidence. Array of shape (...).
+
+    :returns: Reflection coefficient. Array of shape (..., F).
+
+    If the angle of incidence is 90 degrees with a hard reflection the denominator is zero and the reflection coefficient is 1.
+    """
+    product = impedance * np.asarray(cos_angle)[..., None]
+    denominator = product + 1.0
+    singular = denominator == 0.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        refl = (product - 1.0) / np.where(singular, 1.0, denominator)
+    refl[singular] = 1.0
+    return refl
+
+
+class ReflectionTable(object):
+    """Reflection coefficient of an impedance tabulated over the cosine of the angle of incidence.
+
+    The cosine ranges from -1 to 1 and is divided in equally spaced bins. Values in between are linearly interpolated.
+    In bins where the interpolation error exceeds the tolerance, for example close to a pole of the reflection coefficient,
+    the exact values are computed instead.
+    """
+
+    BINS = 1024
+    """Default amount of bins.
+    """
+
+    TOLERANCE = 1e-4
+    """Default largest acceptable interpolation error.
+    """
+
+    MAX_TABLES = 256
+    """Largest amount of tables that is kept by :meth:`from_impedance`.
+    """
+
+    _tables = OrderedDict()
+
+    def __init__(self, impedance, bins=BINS, tolerance=TOLERANCE):
+
+        if bins < 2:
+            raise ValueError("A table requires at least two bins.")
+
+        self.impedance = np.asarray(impedance)
+        """Impedance. Array of shape (F,).
+        """
+
+        self.bins = bins
+        """Amount of bins.
+        """
+
+        grid = np.linspace(-1.0, 1.0, bins)
+        table = reflection_coefficient(self.impedance, grid)
+        middle = reflection_coefficient(self.impedance, (grid[1:] + grid[:-1]) / 2.0)
+
+        self.error = np.abs((table[1:] + table[:-1]) / 2.0 - middle).max(axis=-1, initial=0.0)
+        """Interpolation error of each bin, estimated at the center of the bin. Array of shape (bins-1,).
+        """
+
+        self.exact = self.error > tolerance if tolerance is not None else np.zeros(bins-1, dtype='bool')
+        """Whether the exact reflection coefficient is computed instead of the interpolated values. Array of shape (bins-1,).
+        """
+
+        self.table = table
+        """Reflection coefficient at the edges of the bins. Array of shape (bins, F).
+        """
+
+    def __call__(self, cos_angle, bands=None):
+        """Reflection coefficient.
+
+        :param cos_angle: Cosine of the angle of incidence. Array of shape (...).
+        :param bands: Index of the frequency bands to compute. By default all bands.
+
+        :returns: Reflection coefficient. Array of shape (..., F), or (..., B) with ``bands``.
+        """
+        table = self.table if bands is None else self.table[:, bands]
+        impedance = self.impedance if bands is None else self.impedance[bands]
+        cos_angle = np.asarray(cos_angle, dtype='float64')
+        position = (np.clip(cos_angle, -1.0, 1.0) + 1.0) * ((self.bins - 1) / 2.0)
+        index = np.minimum(position.astype('int64'), self.bins - 2)
+        fraction = (position - index)[..., None]
+        refl = table[index] * (1.0 - fraction) + table[index + 1] * fraction
+        exact = self.exact[index]
+        if exact.any():
+            refl[exact] = reflection_coefficient(impedance, cos_angle[exact])
+        return refl
+
+    @classmethod
+    def from_impedance(cls, impedance, bins=BINS, tolerance=TOLERANCE):
+        """Table for an impedance.
+
+        Tables are memoized, so walls with the same impedance share a table. At most :attr:`MAX_TABLES` tables are kept
+        and the least recently used table is dropped first.
+        """
+        impedance = np.asarray(impedance)
+        key = (impedance.tobytes(), impedance.dtype.str, bins, tolerance)
+        tables = cls._tables
+        if key in tables:
+            tables.move_to_end(key)
+            return tables[key]
+        table = cls(impedance, bins, tolerance)
+        tables[key] = table
+        if len(tables) > cls.MAX_TABLES:
+            tables.popitem(last=False)
+        return table
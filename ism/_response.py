@@ -0,0 +1,110 @@
+"""
+Synthesis of impulse responses from mirror sources.
+
+The contribution of every effective mirror source is placed at its fractional delay in a signal per frequency band.
+Each band signal is filtered with a band mask and the bands are summed, giving one impulse response per receiver position.
+The mirror sources are consumed in chunks and the filtered bands of a chunk are added to a single spectrum per receiver
+position, so the memory does not grow with the amount of bands.
+"""
+
+import numpy as np
+
+
+def band_masks(frequencies, fs, length):
+    """Masks selecting the frequency bands in the spectrum of a signal.
+
+    :param frequencies: Centre frequencies of the bands in increasing order. Array of shape (F,).
+    :param fs: Sample frequency.
+    :param length: Length of the signal in samples.
+
+    :returns: Masks. Array of shape (F, K) with :math:`K` the amount of bins of :func:`numpy.fft.rfft`.
+
+    The edges of the bands lie at the geometric mean of neighbouring centre frequencies, or the arithmetic mean when a centre frequency is zero.
+    The first band starts at zero and the last band ends at the Nyquist frequency, so that the masks add up to one.
+    """
+    frequencies = np.asarray(frequencies, dtype='float64')
+    if frequencies.ndim != 1 or np.any(np.diff(frequencies) <= 0.0):
+        raise ValueError("Centre frequencies should be a one-dimensional array in increasing order.")
+    lower, upper = frequencies[:-1], frequencies[1:]
+    edges = np.where(lower > 0.0, np.sqrt(np.abs(lower * upper)), (lower + upper) / 2.0)
+    bins = np.fft.rfftfreq(length, 1.0 / fs)
+    band = np.searchsorted(edges, bins, side='right')
+    return (band == np.arange(len(frequencies))[:, None]).astype('float64')
+
+
+def place(signals, delay, amplitude):
+    """Place impulses at a fractional delay using linear interpolation.
+
+    :param signals: Signals to add the impulses to. Array of shape (R, F, N).
+    :param delay: Delay in samples. Array of shape (M, R).
+    :param amplitude: Amplitude of the impulses. Array of shape (M, R, F).
+
+    Impulses that do not fit in the signals are discarded.
+    """
+    n_receivers, n_bands, length = signals.shape
+    index = np.floor(delay).astype('int64')
+    fraction = delay - index
+    receiver = np.broadcast_to(np.arange(n_receivers), delay.shape)
+    band = np.arange(n_bands)
+    for offset, weight in ((0, 1.0 - fraction), (1, fraction)):
+        sample = index + offset
+        inside = (sample >= 0) & (sample < length)
+        np.add.at(signals,
+                  (receiver[inside][:, None], band, sample[inside][:, None]),
+                  amplitude[inside] * weight[inside][:, None])
+
+
+def impulse_response(mirrors, n_receivers, n_bands, fs, length, c=343.0, frequencies=None, chunk_size=1024):
+    """Impulse responses of determined mirror sources.
+
+    :param mirrors: Iterable of mirror sources with known effectiveness, distance and strength. See :meth:`ism.Model.determine`.
+    :param n_receivers: Amount of receiver positions :math:`R`.
+    :param n_bands: Amount of frequency bands :math:`F` of the strength.
+    :param fs: Sample frequency.
+    :param length: Length of the impulse responses in samples :math:`N`.
+    :param c: Speed of sound.
+    :param frequencies: Centre frequencies of the bands. By default the bands are spread linearly from zero to the Nyquist frequency.
+    :param chunk_size: Amount of mirror sources that are placed at once.
+
+    :returns: Impulse responses. Array of shape (R, N).
+
+    The contribution of a mirror source at distance :math:`r` is its strength divided by :math:`r`, delayed by :math:`r/c`.
+    The mirror sources are consumed in chunks, so only one chunk is held in memory. The bands of a chunk are placed in a
+    signal of shape (R, N) one at a time and only its spectrum within the band is kept, so besides the chunk the memory is
+    that of two signals per receiver position. Every chunk takes a transform per band, so a larger ``chunk_size`` is faster.
+    """
+    if frequencies is None:
+        frequencies = np.linspace(0.0, fs / 2.0, n_bands)
+    if len(frequencies) != n_bands:
+        raise ValueError("Amount of centre frequencies should equal the amount of bands.")
+    masks = band_masks(frequencies, fs, length)
+    bands = np.flatnonzero(masks.any(axis=-1))
+
+    spectrum = np.zeros((n_receivers, masks.shape[-1]), dtype='complex128')
+    signals = np.empty((n_receivers, 1, length), dtype='complex128')
+    chunk = list()
+
+    def flush():
+        effective = np.array([mirror.effective for mirror in chunk], dtype='bool').reshape(-1, n_receivers)
+        distance = np.array([mirror.distance for mirror in chunk], dtype='float64').reshape(-1, n_receivers)
+        strength = np.array([mirror.strength for mirror in chunk], dtype='complex128').reshape(-1, n_receivers, n_bands)
+        effective &= distance > 0.0
+        with np.errstate(divide='ignore'):
+            spreading = np.where(effective, 1.0 / distance, 0.0)
+        delay = distance * fs / c
+        amplitude = strength * spreading[..., None]
+        for band in bands:
+            # The band signals are complex. Only the positive frequencies are kept and the negative frequencies follow from symmetry.
+            signals[...] = 0.0
+            place(signals, delay, amplitude[..., band:band+1])
+            spectrum[:] += np.fft.fft(signals[:, 0], axis=-1)[:, :masks.shape[-1]] * masks[band]
+        del chunk[:]
+
+    for mirror in mirrors:
+        chunk.append(mirror)
+        if len(chunk) == chunk_size:
+            flush()
+    if chunk:
+        flush()
+
+    return np.fft.irfft(spectrum, n=length, axis=-1)
@@ -0,0 +1,129 @@
+"""
+Streaming selection of the strongest mirror sources.
+"""
+
+import numpy as np
+
+
+class Strongest(object):
+    """Keep the strongest mirror sources of a stream.
+
+    Only the candidates that are currently among the strongest are kept. The arrays of a mirror source
+    that is dropped are released immediately, so the memory use does not depend on the length of the stream.
+    """
+
+    RANKS = ('mirror', 'receiver', 'band')
+    """Available rankings.
+
+    * ``mirror`` keeps the strongest mirror sources based on the largest strength at any receiver position and band.
+    * ``receiver`` keeps the strongest mirror sources at each receiver position.
+    * ``band`` keeps the strongest mirror sources in each frequency band.
+    """
+
+    def __init__(self, amount, rank='mirror', threshold=None):
+
+        if rank not in self.RANKS:
+            raise ValueError("Rank should be one of {}.".format(self.RANKS))
+
+        self.amount = amount
+        """Amount of mirror sources to keep per ranking.
+        """
+
+        self.rank = rank
+        """Ranking. See :attr:`RANKS`.
+        """
+
+        self.threshold = threshold
+        """Mirror sources with a strength below the threshold are never kept.
+        """
+
+        self._scores = None
+        """Scores of the kept mirror sources. Array of shape (S, amount).
+        """
+
+        self._slots = None
+        """Index in :attr:`_candidates` of the kept mirror sources. Array of shape (S, amount).
+        """
+
+        self._candidates = dict()
+        """Kept mirror sources with the amount of slots they occupy.
+        """
+
+        self._count = 0
+
+    def _score(self, mirror):
+        """Score of a mirror source. Array of shape (S,).
+        """
+        magnitude = np.abs(mirror.strength)
+        if self.rank == 'receiver':
+            score = magnitude.max(axis=-1)
+        elif self.rank == 'band':
+            score = magnitude.max(axis=0)
+        else:
+            score = magnitude.max(keepdims=True).ravel()
+        if self.threshold is not None:
+            score = np.where(score >= self.threshold, score, -np.inf)
+        return score
+
+    @staticmethod
+    def _evict(mirror):
+        mirror.effective = None
+        mirror.distance = None
+        mirror.strength = None
+
+    def push(self, mirror):
+        """Offer a mirror source.
+
+        :returns: Whether the mirror source is kept.
+        """
+        score = self._score(mirror)
+
+        if self._scores is None:
+            self._scores = np.full((len(score), self.amount), -np.inf)
+            self._slots = np.full((len(score), self.amount), -1, dtype='int64')
+
+        rows = np.arange(len(score))
+        worst = self._scores.argmin(axis=-1)
+        better = score > self._scores[rows, worst]
+
+        if not better.any():
+            self._evict(mirror)
+            return False
+
+        rows = rows[better]
+        columns = worst[better]
+        replaced = self._slots[rows, columns]
+
+        index = self._count
+        self._count += 1
+        self._scores[rows, columns] = score[rows]
+        self._slots[rows, columns] = index
+        self._candidates[index] = [mirror, len(rows)]
+
+        replaced, counts = np.unique(replaced[replaced >= 0], return_counts=True)
+        for old, count in zip(replaced, counts):
+            candidate = self._candidates[old]
+            candidate[1] -= count
+            if not candidate[1]:
+                del self._candidates[old]
+                self._evict(candidate[0])
+
+        return True
+
+    def extend(self, mirrors):
+        """Offer mirror sources.
+        """
+        for mirror in mirrors:
+            self.push(mirror)
+        return self
+
+    def result(self):
+        """Kept mirror sources, strongest first.
+        """
+        if self._scores is None:
+            return []
+        best = dict()
+        for score, index in zip(self._scores.ravel(), self._slots.ravel()):
+            if index >= 0:
+                best[index] = max(best.get(index, -np.inf), score)
+        return [self._candidates[index][0] for index in sorted(best, key=lambda index: (-best[index], index))]
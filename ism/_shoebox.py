@@ -0,0 +1,213 @@
+"""
+Closed form mirror sources of rectangular rooms.
+
+In a room with six axis-aligned walls the mirror sources form a lattice. Mirror source :math:`(i, j, k)` lies in the copy of
+the room that is shifted by :math:`(i, j, k)` times the size of the room and is reflected an odd amount of times along the
+axes with an odd index. Its order is :math:`|i| + |j| + |k|` and every mirror source has a valid path to every receiver in the room,
+so the positions, the amount of reflections at each wall and the strength follow directly from the indices.
+"""
+
+import numpy as np
+from ._geometry import WallArrays
+from ._material import Materials
+from ._table import MirrorTable
+from ._tree import MirrorTree
+
+
+class Shoebox(object):
+    """Rectangular room with axis-aligned walls.
+    """
+
+    def __init__(self, walls, lower, upper, index):
+
+        self.walls = walls
+        """Walls. List of :class:`ism.Wall`.
+        """
+
+        self.lower = lower
+        """Lower corner. Array of shape (3,).
+        """
+
+        self.upper = upper
+        """Upper corner. Array of shape (3,).
+        """
+
+        self.index = index
+        """Index of the wall at the lower and upper side of each axis. Array of shape (3, 2).
+        """
+
+    @property
+    def size(self):
+        """Size of the room along each axis. Array of shape (3,).
+        """
+        return self.upper - self.lower
+
+    @classmethod
+    def from_walls(cls, walls, tolerance=1e-9):
+        """Detect a rectangular room.
+
+        :param walls: List of walls.
+        :param tolerance: Relative tolerance of the coordinates.
+
+        :returns: Instance of :class:`Shoebox`, or ``None`` when the walls do not form an axis-aligned rectangular room
+                  with the normals pointing inwards.
+        """
+        if len(walls) != 6:
+            return None
+        arrays = WallArrays.from_walls(walls)
+        if (arrays.n_vertices != 4).any():
+            return None
+        lower = arrays.vertices.min(axis=(0, 1))
+        upper = arrays.vertices.max(axis=(0, 1))
+        tolerance = tolerance * np.max(upper - lower)
+        if (upper - lower <= tolerance).any():
+            return None
+
+        index = np.full((3, 2), -1, dtype='int64')
+        for i, normal in enumerate(arrays.normals):
+            axis = int(np.argmax(np.abs(normal)))
+            if abs(abs(normal[axis]) - 1.0) > tolerance:
+                return None
+            side = 0 if normal[axis] > 0.0 else 1
+            coordinate = (lower, upper)[side][axis]
+            others = [other for other in range(3) if other != axis]
+            vertices = arrays.vertices[i]
+            if np.abs(vertices[:, axis] - coordinate).max() > tolerance:
+                return None
+            if (np.abs(vertices[:, others].min(axis=0) - lower[others]).max() > tolerance or
+                np.abs(vertices[:, others].max(axis=0) - upper[others]).max() > tolerance):
+                return None
+            if index[axis, side] >= 0:
+                return None
+            index[axis, side] = i
+        return cls(walls, lower, upper, index)
+
+    def indices(self, positions):
+        """Lattice indices of mirror sources.
+
+        :param positions: Positions of the mirror sources. Array of shape (N, 3).
+
+        :returns: Array of shape (N, 3).
+        """
+        return np.floor((np.asarray(positions) - self.lower) / self.size).astype('int64')
+
+    def reflections(self, indices):
+        """Amount of reflections at each wall.
+
+        :param indices: Lattice indices. Array of shape (N, 3).
+
+        :returns: Array of shape (N, W).
+
+        Along an axis with a positive index the last reflection is at the upper wall, with a negative index at the lower wall.
+        """
+        upper = np.where(indices > 0, (indices + 1) // 2, -indices // 2)
+        lower = np.abs(indices) - upper
+        counts = np.zeros((len(indices), len(self.walls)), dtype='int64')
+        counts[:, self.index[:, 0]] = lower
+        counts[:, self.index[:, 1]] = upper
+        return counts
+
+    def tree(self, source_position, max_order=3, receiver_positions=None, max_distance=None, min_amplitude=None, materials=None):
+        """Mirror sources of a source position.
+
+        :param source_position: Position of the source.
+        :param max_order: Maximum order.
+        :param receiver_positions: Receiver positions. Required for the truncations.
+        :param max_distance: Drop mirror sources that are further away from all receiver positions, including their descendants.
+        :param min_amplitude: Drop mirror sources that are weaker at all receiver positions, including their descendants.
+        :param materials: Impedance of the walls. See :class:`ism._material.Materials`. By default it is collected from the walls.
+
+        :returns: Instance of :class:`ism.MirrorTree`.
+
+        The walls along the axes are reflected in the order x, y and z. The mother of a mirror source is the mirror source
+        without its last reflection, which is a lattice neighbour.
+        """
+        source = np.array(tuple(source_position), dtype='float64')
+        width = 2 * max_order + 1
+        grid = np.stack(np.meshgrid(*(np.arange(-max_order, max_order+1),)*3, indexing='ij'), axis=-1).reshape(-1, 3)
+        order = np.abs(grid).sum(axis=-1)
+        ranking = np.argsort(order, kind='stable')
+        ranking = ranking[order[ranking] <= max_order]
+        indices, order = grid[ranking], order[ranking]
+
+        even = indices % 2 == 0
+        positions = np.where(even, source + indices * self.size, 2.0 * self.lower + (indices + 1) * self.size - source)
+
+        # The last reflection is along the last axis with a nonzero index.
+        nonzero = indices != 0
+        axis = 2 - np.argmax(nonzero[:, ::-1], axis=-1)
+        rows = np.arange(len(indices))
+        last = indices[rows, axis]
+        parent = indices.copy()
+        parent[rows, axis] = -(last - np.sign(last))
+        lookup = np.empty(width**3, dtype='int64')
+        lookup[ranking] = np.arange(len(ranking))
+        mother = lookup[((parent + max_order) * [width**2, width, 1]).sum(axis=-1)]
+        wall = self.index[axis, (last > 0).astype('int64')]
+        mother[0] = wall[0] = -1
+
+        tree = MirrorTree(self.walls, positions, mother, wall, order)
+        if receiver_positions is None or (max_distance is None and min_amplitude is None):
+            return tree
+
+        receivers = np.array([tuple(point) for point in receiver_positions], dtype='float64').reshape(-1, 3)
+        keep = np.ones(len(tree), dtype='bool')
+        if max_distance is not None:
+            keep &= (np.linalg.norm(positions[:, None] - receivers[None], axis=-1) <= max_distance).any(axis=-1)
+        if min_amplitude is not None:
+            gain = np.abs(self.reflection(source, receivers, materials=materials)).max(axis=-1)
+            amplitude = np.exp(np.dot(self.reflections(indices), np.log(np.maximum(gain, np.finfo(float).tiny))))
+            keep &= (amplitude >= min_amplitude).any(axis=-1)
+        keep[0] = True
+        for current in range(1, max_order+1):
+            selection = tree.order_slice(current)
+            keep[selection] &= keep[mother[selection]]
+        return tree.subset(keep)
+
+    def reflection(self, source_position, receivers, bands=None, materials=None):
+        """Reflection coefficient of each wall at each receiver position.
+
+        :param bands: Index of the frequency bands. By default all bands.
+        :param materials: Impedance of the walls. See :class:`ism._material.Materials`. By default it is collected from the walls.
+
+        :returns: Array of shape (W, R, F), or (W, R, B) with ``bands``.
+
+        As in :func:`ism._ism.test_effectiveness` the angle of incidence follows from the line of sight between source and receiver.
+        """
+        arrays = WallArrays.from_walls(self.walls)
+        line_of_sight = receivers - np.asarray(source_position, dtype='float64')
+        line_of_sight /= np.linalg.norm(line_of_sight, axis=-1)[:, None]
+        if materials is None:
+            materials = Materials.from_walls(self.walls)
+        return materials.reflection(np.dot(arrays.normals, line_of_sight.T), bands)
+
+    def evaluate(self, tree, source_position, receivers, bands=None, dtype='complex128', materials=None):
+        """Effectiveness, distance and strength of the mirror sources of :meth:`tree`.
+
+        :param tree: Instance of :class:`ism.MirrorTree` created with :meth:`tree`.
+        :param source_position: Position of the source.
+        :param receivers: Receiver positions. Array of shape (R, 3).
+        :param bands: Index of the frequency bands for which the strength is computed. By default all bands.
+        :param dtype: Data type of the strength.
+        :param materials: Impedance of the walls. See :class:`ism._material.Materials`. By default it is collected from the walls.
+
+        :returns: Instance of :class:`ism.MirrorTable`.
+
+        All mirror sources are effective at receiver positions inside the room. The strength is the product of the
+        reflection coefficients of the walls, raised to the amount of reflections at each wall.
+        """
+        receivers = np.asarray(receivers, dtype='float64').reshape(-1, 3)
+        source = np.array(tuple(source_position), dtype='float64')
+        inside = ((receivers > self.lower) & (receivers < self.upper)).all(axis=-1)
+        effective = np.repeat(inside[None], len(tree), axis=0)
+        distance = np.linalg.norm(tree.positions[:, None, :] - receivers[None], axis=-1)
+
+        counts = self.reflections(self.indices(tree.positions))
+        refl = self.reflection(source, receivers, bands, materials).astype(dtype, copy=False)
+        strength = np.ones((len(tree), len(receivers), refl.shape[-1]), dtype=dtype)
+        for wall in range(len(self.walls)):
+            exponent = counts[:, wall]
+            for power in np.unique(exponent[exponent > 0]):
+                strength[exponent == power] *= refl[wall] ** power
+
+        return MirrorTable(tree, np.arange(len(tree)), effective, distance, strength)
@@ -0,0 +1,95 @@
+"""
+Statistics of the generation of mirror sources.
+"""
+
+import logging
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+
+class Statistics(object):
+    """Counters collected while generating mirror sources.
+
+    The counters are aggregated per order, so keeping them up to date costs no more than an increment per candidate.
+    With :attr:`trace` every decision is additionally logged at the ``DEBUG`` level to the logger of this module.
+    """
+
+    REASONS = ('generating_wall', 'wrong_side', 'field_angle', 'amplitude', 'distance')
+    """Reasons for dropping a candidate mirror source.
+
+    * ``generating_wall`` the wall is the generating wall of the mother.
+    * ``wrong_side`` the mother lies on the exterior side of the wall.
+    * ``field_angle`` the center of the wall is not visible from the mother through its generating wall.
+    * ``amplitude`` the strength is too weak at all receiver positions.
+    * ``distance`` the candidate is too far away from all receiver positions.
+    """
+
+    def __init__(self, trace=False):
+
+        self.generated = Counter()
+        """Amount of mirror sources that is kept per order.
+        """
+
+        self.pruned = Counter()
+        """Amount of candidates that is dropped per order and reason. Keys are tuples ``(order, reason)``.
+        """
+
+        self.trace = trace
+        """Whether to log every decision.
+        """
+
+    def __repr__(self):
+        return "Statistics(generated={}, pruned={})".format(sum(self.generated.values()), sum(self.pruned.values()))
+
+    def add(self, order, pruned, generated):
+        """Add the counts of an order.
+
+        :param order: Order.
+        :param pruned: Amount of candidates that is dropped per reason.
+        :param generated: Amount of mirror sources that is kept.
+        """
+        for reason, amount in pruned.items():
+            if amount:
+                self.pruned[order, reason] += amount
+        self.generated[order] += generated
+        if self.trace:
+            logger.debug("Order: %d - Kept: %d - Dropped: %s", order, generated, dict(pruned))
+
+    def update(self, other):
+        """Add the counts of another instance, e.g. of a subtree that was generated in another process.
+        """
+        self.generated.update(other.generated)
+        self.pruned.update(other.pruned)
+        return self
+
+    def log(self, order, mirror, wall, decision):
+        """Log a decision about a candidate. Only called when :attr:`trace` is enabled.
+        """
+        logger.debug("Order: %d - Mirror: %s - Wall: %s - %s", order, mirror, wall, decision)
+
+    def by_reason(self):
+        """Amount of candidates that is dropped per reason.
+
+        :rtype: :class:`collections.Counter`
+        """
+        counts = Counter()
+        for (order, reason), amount in self.pruned.items():
+            counts[reason] += amount
+        return counts
+
+    def by_order(self):
+        """Amount of candidates that is dropped per order.
+
+        :rtype: :class:`collections.Counter`
+        """
+        counts = Counter()
+        for (order, reason), amount in self.pruned.items():
+            counts[order] += amount
+        return counts
+
+    @property
+    def candidates(self):
+        """Total amount of candidates that was considered.
+        """
+        return sum(self.generated.values()) + sum(self.pruned.values())
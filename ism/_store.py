@@ -0,0 +1,110 @@
+"""
+Column oriented storage of mirror trees and determined mirror sources.
+
+Every column is stored as a separate ``.npy`` file in a directory, so it can be loaded with :func:`numpy.load`
+using ``mmap_mode``. Loading then only maps the files and the pages are shared between processes.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import shutil
+import numpy as np
+
+TREE_COLUMNS = ('positions', 'mother', 'wall', 'order')
+"""Columns of a :class:`ism.MirrorTree`."""
+
+TABLE_COLUMNS = ('index', 'effective', 'distance', 'strength')
+"""Columns of a :class:`ism.MirrorTable` in addition to the columns of its tree."""
+
+FORMAT = 1
+"""Version of the storage format."""
+
+
+def key(walls, source_position, max_order, receiver_positions=None, max_distance=None, min_amplitude=None, generator=None, frequencies=None):
+    """Hash of the input of the generation of a mirror tree.
+
+    :param walls: List of walls.
+    :param source_position: Position of the source.
+    :param max_order: Maximum order.
+    :param receiver_positions: Receiver positions. Only part of the hash when a truncation is used.
+    :param max_distance: Maximum distance between a mirror source and the receiver.
+    :param min_amplitude: Minimum amplitude of the strength of a mirror source.
+    :param generator: Name of what generates the tree, e.g. the class of the model. Generators that give different trees for the same input need different names.
+    :param frequencies: Common frequency grid of the impedance. See :class:`ism._material.Materials`.
+
+    :returns: Hexadecimal string.
+
+    The frequencies and the reflection tables of the walls are included, because they change the amplitude truncation.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([FORMAT, generator, max_order, max_distance, min_amplitude]).encode())
+    digest.update(np.array(tuple(source_position), dtype='float64').tobytes())
+    for wall in walls:
+        digest.update(np.ascontiguousarray(wall.vertices, dtype='float64').tobytes())
+        digest.update(np.asarray(wall.impedance, dtype='complex128').tobytes())
+        _update(digest, wall.frequencies, 'float64')
+        table = wall.reflection_table
+        if table is None:
+            digest.update(b'-')
+        else:
+            digest.update(json.dumps(table.bins).encode())
+            digest.update(np.ascontiguousarray(table.table, dtype='complex128').tobytes())
+            digest.update(np.ascontiguousarray(table.exact, dtype='bool').tobytes())
+    _update(digest, frequencies, 'float64')
+    if max_distance is not None or min_amplitude is not None:
+        digest.update(np.array([tuple(point) for point in receiver_positions], dtype='float64').tobytes())
+    return digest.hexdigest()
+
+
+def _update(digest, values, dtype):
+    """Add an optional array to a hash. ``None`` differs from any array, including an empty one.
+    """
+    if values is None:
+        digest.update(b'-')
+    else:
+        values = np.ascontiguousarray(values, dtype=dtype)
+        digest.update(json.dumps(values.shape).encode())
+        digest.update(values.tobytes())
+
+
+def save(path, columns, metadata=None):
+    """Save columns to a directory.
+
+    :param path: Directory. Replaced when it exists.
+    :param columns: Dictionary mapping names to arrays.
+    :param metadata: Dictionary with additional information that can be serialized as JSON.
+
+    The columns are written to a temporary directory which is renamed when complete, so a directory is either complete or absent.
+    """
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    temporary = tempfile.mkdtemp(dir=parent)
+    try:
+        for name, column in columns.items():
+            np.save(os.path.join(temporary, name + '.npy'), np.ascontiguousarray(column))
+        with open(os.path.join(temporary, 'metadata.json'), 'w') as f:
+            json.dump(dict(metadata or {}, format=FORMAT, columns=list(columns)), f)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.rename(temporary, path)
+    except BaseException:
+        shutil.rmtree(temporary, ignore_errors=True)
+        raise
+
+
+def load(path, mmap_mode='r'):
+    """Load columns from a directory.
+
+    :param path: Directory.
+    :param mmap_mode: Memory map mode. See :func:`numpy.load`. With ``None`` the columns are read into memory.
+
+    :returns: Dictionary with the columns and dictionary with the metadata.
+    """
+    with open(os.path.join(path, 'metadata.json')) as f:
+        metadata = json.load(f)
+    if metadata.get('format') != FORMAT:
+        raise ValueError("Unsupported storage format {}.".format(metadata.get('format')))
+    columns = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode) for name in metadata['columns']}
+    return columns, metadata
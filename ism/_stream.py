@@ -0,0 +1,119 @@
+"""
+Mirror sources for a stream of receiver positions.
+
+In an interactive application the receiver positions arrive one update at a time, faster than the mirror sources can be
+determined. The updates are consumed as they arrive while the mirror sources of the most recent update are determined in an
+executor, so the event loop stays responsive. Updates that arrive while a frame is being determined are stale once a newer
+update is available and are dropped, which bounds the latency of every frame to about the time of determining two frames.
+"""
+
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Frame(object):
+    """Mirror sources determined for one receiver update.
+    """
+
+    def __init__(self, index, receiver, table, dropped, latency):
+
+        self.index = index
+        """Index of the update in the stream of receiver updates.
+        """
+
+        self.receiver = receiver
+        """Receiver positions of the update.
+        """
+
+        self.table = table
+        """Determined mirror sources. See :meth:`ism.Model.determine`.
+        """
+
+        self.dropped = dropped
+        """Amount of stale updates dropped since the previous frame.
+        """
+
+        self.latency = latency
+        """Time in seconds between the arrival of the update and the frame.
+        """
+
+
+async def stream(model, receiver_updates, executor=None, **kwargs):
+    """Determine the mirror sources for a stream of receiver positions.
+
+    :param model: Instance of :class:`ism.Model`.
+    :param receiver_updates: Asynchronous or ordinary iterable yielding receiver positions. List of points or array of shape (R, 3).
+    :param executor: Executor the mirror sources are determined in. By default a single thread.
+    :param kwargs: Keyword arguments passed to :meth:`ism.Model.determine`.
+
+    :returns: Asynchronous generator yielding a :class:`Frame` for every update that is not dropped.
+
+    Only one frame is determined at a time. Of the updates that arrive in the meantime only the last one is kept.
+    An ordinary iterable arrives at once, so only its last update gives a frame.
+    The frames are determined with ``table`` and use the cached :meth:`ism.Model.mirror_tree`, which is generated again only
+    when the source or the walls change. The model is modified in the executor, so it should not be used elsewhere while streaming.
+    """
+    loop = asyncio.get_running_loop()
+    shutdown = executor is None
+    if shutdown:
+        executor = ThreadPoolExecutor(max_workers=1)
+
+    pending = []
+    state = dict(done=False, dropped=0, error=None)
+    arrived = asyncio.Event()
+
+    async def consume():
+        try:
+            if hasattr(receiver_updates, '__aiter__'):
+                updates = receiver_updates
+            else:
+                updates = _aiter(receiver_updates)
+            index = 0
+            async for receiver in updates:
+                if pending:
+                    pending.pop()
+                    state['dropped'] += 1
+                pending.append((index, receiver, time.monotonic()))
+                index += 1
+                arrived.set()
+        except Exception as error:
+            state['error'] = error
+        finally:
+            state['done'] = True
+            arrived.set()
+
+    consumer = loop.create_task(consume())
+    try:
+        while True:
+            if not pending:
+                if state['error'] is not None:
+                    raise state['error']
+                if state['done']:
+                    break
+                arrived.clear()
+                await arrived.wait()
+                continue
+            index, receiver, start = pending.pop()
+            dropped, state['dropped'] = state['dropped'], 0
+            table = await loop.run_in_executor(executor, functools.partial(_determine, model, receiver, **kwargs))
+            yield Frame(index, receiver, table, dropped, time.monotonic() - start)
+    finally:
+        consumer.cancel()
+        if shutdown:
+            executor.shutdown(wait=False)
+
+
+def _determine(model, receiver, **kwargs):
+    """Determine the mirror sources at new receiver positions.
+    """
+    model.receiver = receiver
+    return model.determine(table=True, **kwargs)
+
+
+async def _aiter(iterable):
+    """Asynchronous iterator over an ordinary iterable.
+    """
+    for item in iterable:
+        yield item
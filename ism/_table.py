@@ -0,0 +1,171 @@
+"""
+Mirror sources and their effectiveness, strength and distance stored as columns.
+"""
+
+import numpy as np
+from ._selection import Strongest
+from ._tree import MirrorTree
+from . import _store
+
+
+class MirrorTable(object):
+    """Determined mirror sources stored as columns.
+
+    The geometry of the mirror sources is stored in a :class:`ism.MirrorTree`. The table refers to rows of the tree
+    and holds the effectiveness, distance and strength at every receiver position in contiguous arrays.
+
+    Indexing with an integer gives a :class:`ism.Mirror`, which is created on demand. Indexing with a slice,
+    an array of indices or a boolean mask gives a new table.
+    """
+
+    def __init__(self, tree, index, effective, distance, strength):
+
+        self.tree = tree
+        """Mirror tree holding the geometry. See :class:`ism.MirrorTree`.
+        """
+
+        self.index = index
+        """Index of the mirror sources in :attr:`tree`. Array of shape (N,).
+        """
+
+        self.effective = effective
+        """Effectiveness. Array of shape (N, R).
+        """
+
+        self.distance = distance
+        """Distance between mirror source and receiver. Array of shape (N, R).
+        """
+
+        self.strength = strength
+        """Strength. Array of shape (N, R, F).
+        """
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return self.mirror(key)
+        return MirrorTable(self.tree, self.index[key], self.effective[key], self.distance[key], self.strength[key])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.mirror(i)
+
+    @classmethod
+    def from_evaluation(cls, evaluation):
+        """Create from an :class:`ism._tree.Evaluation`.
+
+        The arrays of the evaluation are shared.
+        """
+        tree = evaluation.tree
+        return cls(tree, np.arange(len(tree)), evaluation.effective, evaluation.distance, evaluation.strength)
+
+    def save(self, path, key=None):
+        """Save the table and its tree as columns that can be memory mapped.
+
+        :param path: Directory.
+        :param key: Key identifying the input. See :func:`ism._store.key`.
+        """
+        columns = {name: getattr(self.tree, name) for name in _store.TREE_COLUMNS}
+        columns.update({name: getattr(self, name) for name in _store.TABLE_COLUMNS})
+        _store.save(path, columns, dict(key=key))
+
+    @classmethod
+    def load(cls, path, walls, key=None, mmap_mode='r'):
+        """Load a table saved with :meth:`save`.
+
+        :param path: Directory.
+        :param walls: List of walls the mirror sources were generated with.
+        :param key: Expected key. A :class:`ValueError` is raised when the stored key differs.
+        :param mmap_mode: Memory map mode. See :func:`numpy.load`.
+        """
+        columns, metadata = _store.load(path, mmap_mode=mmap_mode)
+        if key is not None and metadata.get('key') != key:
+            raise ValueError("Stored table was determined with different input.")
+        tree = MirrorTree(walls, *(columns[name] for name in _store.TREE_COLUMNS))
+        return cls(tree, *(columns[name] for name in _store.TABLE_COLUMNS))
+
+    @property
+    def positions(self):
+        """Positions of the mirror sources. Array of shape (N, 3).
+        """
+        return self.tree.positions[self.index]
+
+    @property
+    def order(self):
+        """Order of the mirror sources. Array of shape (N,).
+        """
+        return self.tree.order[self.index]
+
+    @property
+    def wall(self):
+        """Index of the generating wall. The zeroth order source has -1. Array of shape (N,).
+        """
+        return self.tree.wall[self.index]
+
+    @property
+    def mother(self):
+        """Index in :attr:`tree` of the mother source. The zeroth order source has -1. Array of shape (N,).
+        """
+        return self.tree.mother[self.index]
+
+    def mirror(self, i):
+        """Mirror source ``i`` as :class:`ism.Mirror`.
+
+        The effectiveness, distance and strength are views of the columns. The mothers are created as well
+        but carry only their geometry.
+        """
+        mirror = self.tree.mirror(int(self.index[i]))
+        mirror.effective = self.effective[i]
+        mirror.distance = self.distance[i]
+        mirror.strength = self.strength[i]
+        return mirror
+
+    def where(self, effective=None, order=None):
+        """Select mirror sources.
+
+        :param effective: When true, keep the mirror sources that are effective at any receiver position. When false, keep the others.
+        :param order: Keep the mirror sources of this order.
+
+        :returns: Table with the selected mirror sources.
+        """
+        mask = np.ones(len(self), dtype='bool')
+        if effective is not None:
+            mask &= self.effective.any(axis=-1) == bool(effective)
+        if order is not None:
+            mask &= self.order == order
+        return self[mask]
+
+    def strongest(self, amount, rank='mirror', threshold=None):
+        """Strongest mirror sources.
+
+        :param amount: Amount of mirror sources to keep per ranking.
+        :param rank: Ranking. See :attr:`ism._selection.Strongest.RANKS`.
+        :param threshold: Mirror sources with a strength below the threshold are dropped.
+
+        :returns: Table with the selected mirror sources, strongest first.
+
+        This is the columnar version of :class:`ism._selection.Strongest`.
+        """
+        magnitude = np.abs(self.strength)
+        if rank == 'mirror':
+            scores = magnitude.reshape(len(self), -1).max(axis=-1)[:, None]
+        elif rank == 'receiver':
+            scores = magnitude.max(axis=-1)
+        elif rank == 'band':
+            scores = magnitude.max(axis=-2)
+        else:
+            raise ValueError("Rank should be one of {}.".format(Strongest.RANKS))
+
+        # The ranking is stable, so with equal scores the mirror source that comes first is kept.
+        ranking = np.argsort(-scores, axis=0, kind='stable')[:amount]
+        best = np.full(len(self), -np.inf)
+        for column in range(scores.shape[-1]):
+            candidates = ranking[:, column]
+            if threshold is not None:
+                candidates = candidates[scores[candidates, column] >= threshold]
+            best[candidates] = np.maximum(best[candidates], scores[candidates, column])
+
+        selection = np.flatnonzero(best > -np.inf)
+        return self[selection[np.argsort(-best[selection], kind='stable')]]
@@ -0,0 +1,149 @@
+"""
+Sequences of generating walls, independent of the source position.
+
+A mirror source is the source mirrored with a sequence of walls. Which sequences exist depends on the room only, while the
+positions follow from the source position. The sequences are enumerated once and stored as a tree together with the
+composed reflection matrix of every sequence, so the mirror sources of any source position follow from one batched
+matrix-vector product.
+"""
+
+import numpy as np
+from ._geometry import WallArrays, signed_distance, reflection_matrices
+
+
+class Topology(object):
+    """Sequences of generating walls stored as a tree of arrays.
+
+    The sequences are sorted by order like the mirror sources of a :class:`ism.MirrorTree`. Index 0 is the empty sequence of the source.
+    """
+
+    def __init__(self, walls, mother, wall, order, matrices):
+
+        self.walls = walls
+        """Walls. List of :class:`ism.Wall`.
+        """
+
+        self.mother = mother
+        """Index of the sequence without the last wall. The empty sequence has -1. Array of shape (N,).
+        """
+
+        self.wall = wall
+        """Index of the last wall of the sequence. The empty sequence has -1. Array of shape (N,).
+        """
+
+        self.order = order
+        """Length of the sequence. Array of shape (N,).
+        """
+
+        self.matrices = matrices
+        """Composed reflection matrix of every sequence. See :func:`ism._geometry.reflection_matrices`. Array of shape (N, 4, 4).
+        """
+
+    def __len__(self):
+        return len(self.order)
+
+    @property
+    def max_order(self):
+        """Length of the longest sequence.
+        """
+        return int(self.order[-1])
+
+    def order_slice(self, order):
+        """Slice with the sequences of length ``order``.
+        """
+        start, stop = np.searchsorted(self.order, [order, order+1])
+        return slice(int(start), int(stop))
+
+    @classmethod
+    def from_walls(cls, walls, max_order=3, region=None):
+        """Enumerate the sequences of a room.
+
+        :param walls: List of walls.
+        :param max_order: Longest sequence.
+        :param region: Vertices of the convex region the source positions lie in. Array of shape (V, 3). By default the vertices of the walls.
+
+        A wall cannot follow itself. A sequence is dropped together with its extensions when the mirrored region lies
+        entirely on the exterior side of its last wall, because the mother is then on the wrong side for every source in the region.
+        """
+        arrays = WallArrays.from_walls(walls)
+        reflections = reflection_matrices(arrays.normals, arrays.offsets)
+        if region is None:
+            region = np.unique(np.concatenate([np.asarray(wall.vertices, dtype='float64') for wall in walls]), axis=0)
+        region = np.asarray(region, dtype='float64')
+        n_walls = len(arrays)
+
+        mother, wall, matrices = [np.array([-1])], [np.array([-1])], [np.eye(4)[None]]
+        first = 0
+        for order in range(1, max_order+1):
+            previous = np.arange(first, first + len(wall[-1]))
+            first += len(wall[-1])
+            parent = np.repeat(previous, n_walls)
+            candidate = np.tile(np.arange(n_walls), len(previous))
+            parent_wall = np.repeat(wall[-1], n_walls)
+            parent_matrices = np.repeat(matrices[-1], n_walls, axis=0)
+
+            keep = candidate != parent_wall
+            mirrored = transform(parent_matrices[keep], region)
+            distance = signed_distance(mirrored, arrays.normals[candidate[keep], None], arrays.offsets[candidate[keep], None])
+            keep[keep] = (distance >= 0.0).any(axis=-1)
+
+            mother.append(parent[keep])
+            wall.append(candidate[keep])
+            matrices.append(np.matmul(reflections[candidate[keep]], parent_matrices[keep]))
+
+        order = np.repeat(np.arange(max_order+1), [len(level) for level in wall])
+        return cls(walls, np.concatenate(mother), np.concatenate(wall), order, np.concatenate(matrices))
+
+    @classmethod
+    def from_tree(cls, tree):
+        """Sequences of the mirror sources of a :class:`ism.MirrorTree`.
+        """
+        arrays = WallArrays.from_walls(tree.walls)
+        reflections = reflection_matrices(arrays.normals, arrays.offsets)
+        mother = np.asarray(tree.mother)
+        wall = np.asarray(tree.wall)
+        matrices = np.empty((len(wall), 4, 4))
+        matrices[0] = np.eye(4)
+        for order in range(1, tree.max_order+1):
+            selection = tree.order_slice(order)
+            matrices[selection] = np.matmul(reflections[wall[selection]], matrices[mother[selection]])
+        return cls(tree.walls, mother, wall, np.asarray(tree.order), matrices)
+
+    def positions(self, source_position):
+        """Positions of the mirror sources of a source position.
+
+        :param source_position: Position of the source.
+
+        :returns: Array of shape (N, 3).
+        """
+        return transform(self.matrices, np.array(tuple(source_position), dtype='float64'))
+
+    def interior(self, positions):
+        """Test whether the mothers along every sequence lie on the interior side of the next wall.
+
+        :param positions: Positions of the mirror sources. See :meth:`positions`.
+
+        :returns: Boolean array of shape (N,).
+        """
+        arrays = WallArrays.from_walls(self.walls)
+        valid = np.ones(len(self), dtype='bool')
+        valid[1:] = signed_distance(positions[self.mother[1:]], arrays.normals[self.wall[1:]], arrays.offsets[self.wall[1:]]) >= 0.0
+        for order in range(2, self.max_order+1):
+            selection = self.order_slice(order)
+            valid[selection] &= valid[self.mother[selection]]
+        return valid
+
+
+def transform(matrices, points):
+    """Apply homogeneous transformation matrices to points.
+
+    :param matrices: Array of shape (N, 4, 4).
+    :param points: Array of shape (3,) or (V, 3).
+
+    :returns: Array of shape (N, 3) or (N, V, 3).
+    """
+    rotation = matrices[:, :3, :3]
+    translation = matrices[:, :3, 3]
+    if points.ndim == 1:
+        return np.einsum('nij,j->ni', rotation, points) + translation
+    return np.einsum('nij,vj->nvi', rotation, points) + translation[:, None]
@@ -0,0 +1,575 @@
+"""
+Mirror tree stored as a struct of arrays.
+
+Instead of creating a :class:`ism.Mirror` object for every mirror source, the whole tree
+is stored in a couple of contiguous arrays. All mirror sources of an order are mirrored
+against all walls in one batched operation.
+"""
+
+import numpy as np
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from geometry import Point
+from ._ism import Mirror, reflection_magnitude
+from ._stats import Statistics
+from ._paths import chains, validate
+from ._topology import Topology
+from ._material import Materials
+from ._visibility import VisibilityRegions, VisibilityGrid
+from . import _store
+from ._geometry import WallArrays, signed_distance, mirror_points, in_field_angle
+
+
+class MirrorTree(object):
+    """Mirror sources stored as a struct of arrays.
+
+    Mirror sources are stored sorted by order. The zeroth order source has index 0.
+    """
+
+    def __init__(self, walls, positions, mother, wall, order):
+
+        self.walls = walls
+        """Walls. List of :class:`ism.Wall`.
+        """
+
+        self.positions = positions
+        """Positions of the mirror sources. Array of shape (N, 3).
+        """
+
+        self.mother = mother
+        """Index of the mother source. The zeroth order source has -1. Array of shape (N,).
+        """
+
+        self.wall = wall
+        """Index of the generating wall. The zeroth order source has -1. Array of shape (N,).
+        """
+
+        self.order = order
+        """Order of the mirror sources. Array of shape (N,).
+        """
+
+    def __len__(self):
+        return len(self.order)
+
+    @property
+    def max_order(self):
+        """Highest order in the tree.
+        """
+        return int(self.order[-1])
+
+    def order_slice(self, order):
+        """Slice with the mirror sources of order ``order``.
+        """
+        start, stop = np.searchsorted(self.order, [order, order+1])
+        return slice(int(start), int(stop))
+
+    def mirror(self, index):
+        """Mirror source ``index`` as :class:`ism.Mirror`.
+
+        The mothers are created as well.
+        """
+        chain = []
+        while index >= 0:
+            chain.append(index)
+            index = self.mother[index]
+        mirror = None
+        for index in reversed(chain):
+            mirror = self._view(index, mirror)
+        return mirror
+
+    def mirrors(self):
+        """Mirror sources as :class:`ism.Mirror`.
+
+        :returns: Generator yielding mirror sources sorted by order.
+
+        Views are created on demand. Only the views of the previous order are kept in order to link the mothers.
+        """
+        previous = {}
+        for order in range(self.max_order+1):
+            current = {}
+            for index in range(*self.order_slice(order).indices(len(self))):
+                mirror = self._view(index, previous.get(self.mother[index]))
+                current[index] = mirror
+                yield mirror
+            previous = current
+
+    def remirror(self, source_position):
+        """Tree with the same topology for another source position.
+
+        :param source_position: Position of the source.
+
+        The wall sequences are kept and only the positions are mirrored again. See :meth:`from_topology`.
+        Because reflections preserve distances, a mirror source moves exactly as far as the source.
+        """
+        return self.from_topology(Topology.from_tree(self), source_position)
+
+    @classmethod
+    def from_topology(cls, topology, source_position):
+        """Mirror sources of a source position following wall sequences.
+
+        :param topology: Wall sequences. See :class:`ism._topology.Topology`.
+        :param source_position: Position of the source.
+
+        The positions follow from the composed reflection matrices of the sequences in one pass.
+        Mirror sources whose mother lies on the wrong side of the generating wall are dropped together with their descendants.
+        """
+        positions = topology.positions(source_position)
+        tree = cls(topology.walls, positions, topology.mother, topology.wall, topology.order)
+        return tree.subset(topology.interior(positions))
+
+    def subset(self, mask):
+        """Tree with the selected mirror sources.
+
+        :param mask: Boolean array of shape (N,). The mothers of selected mirror sources have to be selected as well.
+        """
+        index = np.flatnonzero(mask)
+        renumbered = np.full(len(self), -1, dtype='int64')
+        renumbered[index] = np.arange(len(index))
+        mother = self.mother[index]
+        mother = np.where(mother >= 0, renumbered[mother], -1)
+        return MirrorTree(self.walls, self.positions[index], mother, self.wall[index], self.order[index])
+
+    def save(self, path, key=None):
+        """Save the tree as columns that can be memory mapped.
+
+        :param path: Directory.
+        :param key: Key identifying the input of the generation. See :func:`ism._store.key`.
+        """
+        _store.save(path, {name: getattr(self, name) for name in _store.TREE_COLUMNS}, dict(key=key))
+
+    @classmethod
+    def load(cls, path, walls, key=None, mmap_mode='r'):
+        """Load a tree saved with :meth:`save`.
+
+        :param path: Directory.
+        :param walls: List of walls the tree was generated with.
+        :param key: Expected key. A :class:`ValueError` is raised when the stored key differs.
+        :param mmap_mode: Memory map mode. See :func:`numpy.load`.
+        """
+        columns, metadata = _store.load(path, mmap_mode=mmap_mode)
+        if key is not None and metadata.get('key') != key:
+            raise ValueError("Stored tree was generated with different input.")
+        return cls(walls, *(columns[name] for name in _store.TREE_COLUMNS))
+
+    def validate(self, receiver_positions, chunk_size=4096):
+        """Test whether the reflection paths of the mirror sources are valid.
+
+        :param receiver_positions: Receiver positions. Array of shape (R, 3).
+        :param chunk_size: Amount of mirror sources that are validated at once.
+
+        :returns: Boolean array of shape (N, R).
+
+        The mirror sources of an order are validated at once. See :func:`ism._paths.validate`.
+        """
+        receivers = np.asarray(receiver_positions, dtype='float64').reshape(-1, 3)
+        arrays = WallArrays.from_walls(self.walls)
+        valid = np.ones((len(self), len(receivers)), dtype='bool')
+        for order in range(1, self.max_order+1):
+            selection = self.order_slice(order)
+            for start in range(selection.start, selection.stop, chunk_size):
+                index = np.arange(start, min(start+chunk_size, selection.stop))
+                chain = chains(self.mother, self.wall, index)
+                valid[index] = validate(receivers, self.positions[chain], self.wall[chain], arrays)
+        return valid
+
+    def _view(self, index, mother):
+        wall_index = int(self.wall[index])
+        wall = self.walls[wall_index] if wall_index >= 0 else None
+        return Mirror(Point(*self.positions[index]), mother, wall, int(self.order[index]), wall_index)
+
+    @classmethod
+    def generate(cls, walls, source_position, max_order=3, receiver_positions=None, max_distance=None, min_amplitude=None, stats=None, chunk_size=4096, workers=None, split_order=1, materials=None):
+        """Generate the mirror tree.
+
+        :param walls: List of walls.
+        :param source_position: Position of the source.
+        :param max_order: Maximum order to determine image sources for.
+        :param receiver_positions: List of receiver positions. Required for the distance and amplitude truncations.
+        :param max_distance: Maximum distance between a mirror source and the receiver.
+        :param min_amplitude: Minimum amplitude of the strength of a mirror source.
+        :param stats: Optional :class:`ism._stats.Statistics` that is updated with the amount of mirror sources that is kept and dropped.
+        :param chunk_size: Amount of mirror sources that are mirrored at once. Limits the size of temporary arrays.
+        :param workers: Amount of worker processes. By default the tree is generated in the current process.
+        :param split_order: Order of the mirror sources whose subtrees are distributed over the worker processes.
+        :param materials: Impedance of the walls, used for the amplitude truncation. See :class:`ism._material.Materials`. By default it is collected from the walls.
+
+        The same truncations as :func:`ism.ism.ism` are applied.
+
+        Every mirror source is the root of an independent subtree. With ``workers`` the orders up to ``split_order`` are
+        generated in the current process, after which the subtrees of the mirror sources of order ``split_order`` are
+        generated by a pool of processes. The workers return arrays which are merged in the same order as the serial generation would give.
+        """
+        arrays = WallArrays.from_walls(walls)
+
+        if stats is None:
+            stats = Statistics()
+
+        receivers = None
+        if max_distance is not None or min_amplitude is not None:
+            if not receiver_positions:
+                raise ValueError("Receiver positions are required for the distance and amplitude truncations.")
+            receivers = np.array([tuple(point) for point in receiver_positions], dtype='float64')
+
+        gain = None
+        amplitude = None
+        if min_amplitude is not None:
+            gain = reflection_magnitude(walls, source_position, receivers, materials)
+            amplitude = np.ones((1, len(receivers)))
+
+        settings = dict(arrays=arrays, max_order=max_order, receivers=receivers, max_distance=max_distance,
+                        gain=gain, min_amplitude=min_amplitude, chunk_size=chunk_size)
+
+        source = np.array([tuple(source_position)], dtype='float64')
+        last_order = min(split_order, max_order) if workers else max_order
+        levels = expand(source, np.array([-1], dtype='int64'), amplitude, 1, last_order, stats=stats, **settings)
+
+        if workers and last_order < max_order and len(levels) == last_order:
+            frontier_positions, _, frontier_wall, frontier_amplitude = levels[-1]
+            roots = [(frontier_positions[i:i+1],
+                      frontier_wall[i:i+1],
+                      frontier_amplitude[i:i+1] if frontier_amplitude is not None else None) for i in range(len(frontier_wall))]
+            with ProcessPoolExecutor(max_workers=workers, initializer=_initialize_worker, initargs=(settings, last_order+1)) as executor:
+                subtrees = list(executor.map(_expand_subtree, roots))
+            for _, counts in subtrees:
+                stats.update(counts)
+            levels.extend(_merge([subtree for subtree, _ in subtrees], max_order-last_order))
+
+        sizes = [1] + [len(level[2]) for level in levels]
+        starts = np.cumsum([0] + sizes[:-1])
+
+        positions = np.concatenate([source] + [level[0] for level in levels])
+        mother = np.concatenate([np.array([-1], dtype='int64')] + [level[1] + starts[o] for o, level in enumerate(levels)])
+        wall = np.concatenate([np.array([-1], dtype='int64')] + [level[2] for level in levels])
+        order = np.repeat(np.arange(len(sizes), dtype='int32'), sizes)
+
+        return cls(walls, positions, mother, wall, order)
+
+
+class Evaluation(object):
+    """Effectiveness, strength and distance of the mirror sources of a :class:`MirrorTree` at receiver positions.
+
+    The evaluation is updated incrementally when the receivers move. For every mirror source and receiver position
+    the distance to the boundary of the region in which the mirror source is effective is stored. When a receiver moves
+    less than that distance the effectiveness cannot have changed and is not tested again.
+
+    With ``grid``, the amount of cells along each axis of a :class:`ism._visibility.VisibilityGrid` over the walls, the first update
+    tests only the mirror sources that are candidates of the cell of a receiver position.
+
+    Without ``incremental`` the visibility regions and the margins are not kept and every update tests all pairs of mirror sources
+    and receiver positions, a chunk of mirror sources at a time. This suits an evaluation that is updated only once.
+    """
+
+    def __init__(self, tree, source_position, bands=None, dtype='complex128', materials=None, grid=None, incremental=True, chunk_size=4096):
+
+        self.tree = tree
+        """Mirror tree.
+        """
+
+        self.source = np.array(tuple(source_position), dtype='float64')
+        """Position of the source.
+        """
+
+        arrays = WallArrays.from_walls(tree.walls)
+        self._arrays = arrays
+
+        self.materials = materials if materials is not None else Materials.from_walls(tree.walls)
+        """Impedance of the walls. See :class:`ism._material.Materials`.
+        """
+
+        self.bands = np.arange(self.materials.n_bands)[bands if bands is not None else slice(None)]
+        """Index of the frequency bands of :attr:`strength`. Array of shape (B,).
+        """
+
+        self.dtype = np.dtype(dtype)
+        """Data type of :attr:`strength`, e.g. ``complex64`` to halve the memory.
+        """
+
+        self.incremental = incremental
+        """Keep the visibility regions and the margins so that the next update tests only the pairs whose effectiveness could have changed.
+        """
+
+        self.chunk_size = chunk_size
+        """Amount of mirror sources that is tested at once.
+        """
+
+        if grid is not None and not incremental:
+            raise ValueError("A grid requires an incremental evaluation.")
+
+        self.regions = VisibilityRegions.from_tree(tree) if incremental else None
+        """Visibility regions of the mirror sources, or ``None`` without :attr:`incremental`. See :class:`ism._visibility.VisibilityRegions`.
+        """
+
+        self.grid = None
+        """Grid over the walls with the candidate regions of every cell, or ``None``. See :class:`ism._visibility.VisibilityGrid`.
+        """
+        if grid is not None:
+            lower = arrays.vertices.min(axis=(0, 1))
+            upper = arrays.vertices.max(axis=(0, 1))
+            self.grid = VisibilityGrid.from_regions(self.regions, lower, upper, grid)
+
+        self.receivers = None
+        """Receiver positions of the last update. Array of shape (R, 3).
+        """
+
+        self.effective = None
+        """Effectiveness. Array of shape (N, R).
+        """
+
+        self.margin = None
+        """Distance a receiver can move before the effectiveness has to be tested again, or ``None`` without :attr:`incremental`. Array of shape (N, R).
+        """
+
+        self.strength = None
+        """Strength in the bands :attr:`bands`. Array of shape (N, R, B).
+        """
+
+        self.distance = None
+        """Distance between mirror source and receiver. Array of shape (N, R).
+        """
+
+        self.tested = 0
+        """Amount of effectiveness tests that were done during the last update.
+        """
+
+    def update(self, receivers, strength=True):
+        """Update the receiver positions.
+
+        :param receivers: Receiver positions. Array of shape (R, 3).
+        :param strength: Compute :attr:`strength`. Without it the strength can be computed per chunk of bands with :meth:`chunks`.
+        """
+        receivers = np.asarray(receivers, dtype='float64').reshape(-1, 3)
+        n_mirrors = len(self.tree)
+
+        if not self.incremental:
+            self.effective = np.ones((n_mirrors, len(receivers)), dtype='bool')
+            index = np.flatnonzero(np.asarray(self.tree.wall) >= 0)
+            for start in range(0, len(index), self.chunk_size):
+                regions = VisibilityRegions.from_tree(self.tree, index[start:start+self.chunk_size])
+                self.effective[regions.index] = regions.visibility_all(receivers)[0]
+            self.tested = len(index) * len(receivers)
+        elif (self.receivers is None or self.receivers.shape != receivers.shape) and self.grid is None:
+            self.effective = np.ones((n_mirrors, len(receivers)), dtype='bool')
+            self.margin = np.full((n_mirrors, len(receivers)), np.inf)
+            for start in range(0, len(self.regions), self.chunk_size):
+                rows = slice(start, start+self.chunk_size)
+                mirror = self.regions.index[rows]
+                self.effective[mirror], self.margin[mirror] = self.regions.visibility_all(receivers, rows)
+            self.tested = len(self.regions) * len(receivers)
+        else:
+            if self.receivers is None or self.receivers.shape != receivers.shape:
+                # Mirror sources that are no candidate of the cell of a receiver are not effective as long as it stays in the cell.
+                self.effective = np.ones((n_mirrors, len(receivers)), dtype='bool')
+                self.margin = np.full((n_mirrors, len(receivers)), np.inf)
+                self.effective[self.regions.index] = False
+                self.margin[self.regions.index] = self.grid.margin(receivers)
+                row, receiver = self.grid.pairs(receivers)
+            else:
+                moved = np.linalg.norm(receivers - self.receivers, axis=-1)
+                self.margin -= moved
+                row, receiver = np.nonzero(self.margin[self.regions.index] <= 0.0)
+
+            visible, margin = self.regions.visibility(receivers[receiver], row)
+            mirror = self.regions.index[row]
+            self.effective[mirror, receiver] = visible
+            self.margin[mirror, receiver] = margin
+            self.tested = len(mirror)
+
+        self.receivers = receivers
+        self.distance = np.empty((n_mirrors, len(receivers)), dtype='float64')
+        for start in range(0, n_mirrors, self.chunk_size):
+            s = slice(start, start+self.chunk_size)
+            self.distance[s] = np.linalg.norm(self.tree.positions[s, None, :] - receivers[None], axis=-1)
+
+        # Angle of incidence at each wall for each receiver position, see :func:`ism._ism.test_effectiveness`.
+        line_of_sight = receivers - self.source
+        line_of_sight /= np.linalg.norm(line_of_sight, axis=-1)[:, None]
+        self._cos_angle = np.dot(self._arrays.normals, line_of_sight.T)
+
+        self.strength = self.strength_of(self.bands) if strength else None
+
+        return self
+
+    def strength_of(self, bands, index=None):
+        """Strength in frequency bands at the receiver positions of the last update.
+
+        :param bands: Index of the frequency bands. Array of shape (B,).
+        :param index: Index of the mirror sources. By default all mirror sources.
+
+        :returns: Array of shape (N, R, B) with data type :attr:`dtype`.
+        """
+        refl = self.materials.reflection(self._cos_angle, bands).astype(self.dtype, copy=False)
+        strength = np.ones((len(self.tree), refl.shape[1], len(bands)), dtype=self.dtype)
+        for order in range(1, self.tree.max_order+1):
+            s = self.tree.order_slice(order)
+            strength[s] = strength[self.tree.mother[s]] * refl[self.tree.wall[s]]
+        return strength if index is None else strength[index]
+
+    def chunks(self, chunk_size, index=None):
+        """Strength computed for a chunk of frequency bands at a time.
+
+        :param chunk_size: Amount of bands per chunk.
+        :param index: Index of the mirror sources. By default all mirror sources.
+
+        :returns: Generator yielding the band indices (B,) and the strength (N, R, B) of every chunk of :attr:`bands`.
+
+        The effectiveness is not recomputed, so the memory for the strength is bounded by the chunk size.
+        """
+        for start in range(0, len(self.bands), chunk_size):
+            bands = self.bands[start:start+chunk_size]
+            yield bands, self.strength_of(bands, index)
+
+
+def expand(positions, wall, amplitude, first_order, last_order, arrays, max_order, receivers=None, max_distance=None, gain=None, min_amplitude=None, chunk_size=4096, stats=None):
+    """Expand mirror sources order by order.
+
+    :param positions: Positions of the mirror sources of order ``first_order-1``. Array of shape (M, 3).
+    :param wall: Index of their generating walls. Array of shape (M,).
+    :param amplitude: Upper bound of their amplitude. Array of shape (M, R). Required for the amplitude truncation.
+    :param first_order: First order to determine image sources for.
+    :param last_order: Last order to determine image sources for.
+    :param max_order: Maximum order of the whole tree. Determines the bound that is used for the amplitude truncation.
+    :param stats: Optional :class:`ism._stats.Statistics` that is updated with the amount of mirror sources that is kept and dropped.
+
+    See :func:`grow` for the other parameters.
+
+    :returns: List with for each order a tuple with positions, index of the mother in the previous order, index of the generating wall and upper bound of the amplitude.
+
+    The list is shorter when no mirror sources are left.
+    """
+    if gain is not None:
+        growth = np.maximum(1.0, gain.max(axis=0))
+
+    if stats is None:
+        stats = Statistics()
+
+    levels = []
+    for o in range(first_order, last_order+1):
+        pruned = Counter()
+        threshold = min_amplitude / growth**(max_order-o) if min_amplitude is not None else None
+        new = [grow(arrays,
+                    positions[i:i+chunk_size],
+                    wall[i:i+chunk_size],
+                    receivers=receivers,
+                    max_distance=max_distance,
+                    amplitude=amplitude[i:i+chunk_size] if amplitude is not None else None,
+                    gain=gain,
+                    threshold=threshold,
+                    pruned=pruned) for i in range(0, len(wall), chunk_size)]
+        if not new:
+            break
+        positions = np.concatenate([n[0] for n in new])
+        mother = np.concatenate([n[1] + i*chunk_size for i, n in enumerate(new)])
+        wall = np.concatenate([n[2] for n in new])
+        amplitude = np.concatenate([n[3] for n in new]) if amplitude is not None else None
+        stats.add(o, pruned, len(wall))
+        levels.append((positions, mother, wall, amplitude))
+
+    return levels
+
+
+_worker = None
+"""Settings of a worker process. See :func:`_initialize_worker`."""
+
+def _initialize_worker(settings, first_order):
+    global _worker
+    _worker = (settings, first_order)
+
+def _expand_subtree(root):
+    """Expand the subtree of a single mirror source in a worker process.
+    """
+    settings, first_order = _worker
+    positions, wall, amplitude = root
+    stats = Statistics()
+    levels = expand(positions, wall, amplitude, first_order, settings['max_order'], stats=stats, **settings)
+    return levels, stats
+
+def _merge(subtrees, n_orders):
+    """Merge the levels of subtrees that were expanded from consecutive mirror sources.
+    """
+    levels = []
+    previous = [1] * len(subtrees)
+    for k in range(n_orders):
+        parts = [subtree[k] if len(subtree) > k else None for subtree in subtrees]
+        offsets = np.cumsum([0] + previous[:-1])
+        present = [(offset, part) for offset, part in zip(offsets, parts) if part is not None]
+        if not present:
+            break
+        positions = np.concatenate([part[0] for _, part in present])
+        mother = np.concatenate([part[1] + offset for offset, part in present])
+        wall = np.concatenate([part[2] for _, part in present])
+        amplitude = np.concatenate([part[3] for _, part in present]) if present[0][1][3] is not None else None
+        if not len(wall):
+            break
+        levels.append((positions, mother, wall, amplitude))
+        previous = [len(part[2]) if part is not None else 0 for part in parts]
+    return levels
+
+
+def grow(arrays, positions, wall, receivers=None, max_distance=None, amplitude=None, gain=None, threshold=None, pruned=None):
+    """Mirror sources against all walls.
+
+    :param arrays: Walls. Instance of :class:`ism._geometry.WallArrays`.
+    :param positions: Positions of the mirror sources. Array of shape (M, 3).
+    :param wall: Index of the generating walls. Array of shape (M,).
+    :param receivers: Receiver positions. Array of shape (R, 3). Required for the distance truncation.
+    :param max_distance: Maximum distance between a mirror source and the receiver.
+    :param amplitude: Upper bound of the amplitude of the mirror sources. Array of shape (M, R).
+    :param gain: Upper bound of the magnitude of the reflection coefficients. Array of shape (W, R).
+    :param threshold: Amplitude below which a new mirror source is dropped. Array of shape (R,).
+    :param pruned: Optional :class:`collections.Counter` that is updated with the amount of candidates each truncation rule dropped.
+
+    :returns: Positions, index of the mother in ``positions``, index of the generating wall and upper bound of the amplitude of the new mirror sources.
+
+    A candidate is dropped when the wall is the generating wall, when the mirror source is on the wrong side of the wall,
+    or when the center of the wall cannot be seen from the mirror source through its generating wall.
+    When the amplitude or distance truncation is used, a candidate is also dropped when it is too weak or too far away at all receiver positions.
+    """
+    if pruned is None:
+        pruned = Counter()
+
+    n_walls = len(arrays)
+    candidate_mother = np.repeat(np.arange(len(wall)), n_walls)
+    candidate_wall = np.tile(np.arange(n_walls), len(wall))
+
+    valid = candidate_wall != wall[candidate_mother]
+    pruned['generating_wall'] += int(np.count_nonzero(~valid))
+
+    distance = signed_distance(positions[:, None, :], arrays.normals[None], arrays.offsets[None]).ravel()
+    pruned['wrong_side'] += int(np.count_nonzero(valid & (distance < 0.0)))
+    valid &= distance >= 0.0
+
+    has_wall = wall[candidate_mother] >= 0
+    check = valid & has_wall
+    generating = wall[candidate_mother[check]]
+    visible = in_field_angle(arrays.centers[candidate_wall[check]],
+                             positions[candidate_mother[check]],
+                             arrays.vertices[generating],
+                             arrays.normals[generating],
+                             arrays.offsets[generating])
+    pruned['field_angle'] += int(np.count_nonzero(~visible))
+    valid[check] = visible
+
+    candidate_mother = candidate_mother[valid]
+    candidate_wall = candidate_wall[valid]
+
+    new_amplitude = None
+    if amplitude is not None:
+        new_amplitude = amplitude[candidate_mother] * gain[candidate_wall]
+        strong = np.any(new_amplitude >= threshold, axis=-1)
+        pruned['amplitude'] += int(np.count_nonzero(~strong))
+        candidate_mother = candidate_mother[strong]
+        candidate_wall = candidate_wall[strong]
+        new_amplitude = new_amplitude[strong]
+
+    new_positions = mirror_points(positions[candidate_mother], arrays.normals[candidate_wall], arrays.offsets[candidate_wall])
+
+    if max_distance is not None:
+        near = np.any(np.linalg.norm(new_positions[:, None, :] - receivers[None], axis=-1) <= max_distance, axis=-1)
+        pruned['distance'] += int(np.count_nonzero(~near))
+        candidate_mother = candidate_mother[near]
+        candidate_wall = candidate_wall[near]
+        new_positions = new_positions[near]
+        if new_amplitude is not None:
+            new_amplitude = new_amplitude[near]
+
+    return new_positions, candidate_mother, candidate_wall, new_amplitude
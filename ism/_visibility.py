@@ -0,0 +1,240 @@
+"""
+Visibility regions of mirror sources.
+
+A mirror source is effective at the receiver positions that see it through its generating wall. This region is the field angle
+of the mirror source and the wall, cut off by the plane of the wall, and is bounded by a couple of planes that depend only on the
+mirror source. The planes are computed once and stored as arrays, so testing receiver positions is a vectorized half-space test.
+
+A grid over the room lists for every cell the mirror sources whose region may overlap the cell. Only those candidates have to
+be tested for a receiver position in the cell, so the cost of a receiver position depends on the amount of mirror sources
+visible near it instead of on the total.
+"""
+
+import numpy as np
+from ._geometry import WallArrays, field_angle_planes, visibility
+
+
+class VisibilityRegions(object):
+    """Bounding planes of the visibility regions of mirror sources.
+
+    All planes have unit normals pointing into the region. The zeroth order source has no region, because it is visible everywhere.
+    """
+
+    def __init__(self, index, normals, offsets, side_normals, side_offsets):
+
+        self.index = index
+        """Index of the mirror sources in the tree. Array of shape (N,).
+        """
+
+        self.normals = normals
+        """Unit normals of the generating walls. Array of shape (N, 3).
+        """
+
+        self.offsets = offsets
+        """Offsets of the generating walls. Array of shape (N,).
+        """
+
+        self.side_normals = side_normals
+        """Unit normals of the sides of the field angles. See :func:`ism._geometry.field_angle_planes`. Array of shape (N, P, 3).
+        """
+
+        self.side_offsets = side_offsets
+        """Offsets of the sides of the field angles. Array of shape (N, P).
+        """
+
+    def __len__(self):
+        return len(self.index)
+
+    @classmethod
+    def from_tree(cls, tree, index=None):
+        """Visibility regions of the mirror sources of a :class:`ism.MirrorTree`.
+
+        :param index: Index of the mirror sources, excluding the zeroth order source. By default all mirror sources.
+        """
+        arrays = WallArrays.from_walls(tree.walls)
+        if index is None:
+            index = np.flatnonzero(np.asarray(tree.wall) >= 0)
+        index = np.asarray(index, dtype='int64')
+        wall = np.asarray(tree.wall)[index]
+        normals = arrays.normals[wall]
+        offsets = arrays.offsets[wall]
+        side_normals, side_offsets = field_angle_planes(np.asarray(tree.positions)[index], arrays.vertices[wall], normals, offsets)
+        return cls(index, normals, offsets, side_normals, side_offsets)
+
+    def visibility(self, points, rows):
+        """Visibility of points and the distance to the boundary of the regions.
+
+        :param points: Points. Array of shape (K, 3).
+        :param rows: Index of the region of every point. Array of shape (K,).
+
+        :returns: Visibility (K,) and margin (K,). See :func:`ism._geometry.visibility`.
+        """
+        return visibility(points, self.normals[rows], self.offsets[rows], self.side_normals[rows], self.side_offsets[rows])
+
+    def visibility_all(self, points, rows=slice(None)):
+        """Visibility of all points in regions and the distance to the boundary of the regions.
+
+        :param points: Points. Array of shape (R, 3).
+        :param rows: Index of the regions. By default all regions.
+
+        :returns: Visibility (N, R) and margin (N, R). See :func:`ism._geometry.visibility`.
+
+        Every region is tested against every point, so pass a chunk of regions to bound the memory.
+        """
+        points = np.asarray(points, dtype='float64').reshape(-1, 3)
+        return visibility(points[None], self.normals[rows, None], self.offsets[rows, None],
+                          self.side_normals[rows, None], self.side_offsets[rows, None])
+
+    def contains(self, points, chunk_size=4096):
+        """Test whether points lie in the regions.
+
+        :param points: Points. Array of shape (R, 3).
+        :param chunk_size: Amount of regions that are tested at once.
+
+        :returns: Boolean array of shape (N, R).
+        """
+        points = np.asarray(points, dtype='float64').reshape(-1, 3)
+        inside = np.empty((len(self), len(points)), dtype='bool')
+        for start in range(0, len(self), chunk_size):
+            s = slice(start, start+chunk_size)
+            distance = np.dot(self.normals[s], points.T) + self.offsets[s, None]
+            sides = np.einsum('npk,rk->npr', self.side_normals[s], points) + self.side_offsets[s, :, None]
+            inside[s] = (distance > 0.0) & np.all(sides >= 0.0, axis=1)
+        return inside
+
+    def overlaps(self, centers, half_size, rows=slice(None)):
+        """Test whether boxes may overlap the regions.
+
+        :param centers: Centers of the boxes. Array of shape (C, 3).
+        :param half_size: Half of the size of the boxes along each axis. Array of shape (3,).
+        :param rows: Index of the regions. By default all regions.
+
+        :returns: Boolean array of shape (N, C).
+
+        A box overlaps a half-space when its corner furthest along the normal lies in it. The test is conservative,
+        because a box can overlap every bounding half-space of a region without overlapping the region.
+        """
+        reach = np.dot(np.abs(self.normals[rows]), half_size)
+        overlap = np.dot(self.normals[rows], centers.T) + (self.offsets[rows] + reach)[:, None] >= 0.0
+        reach = np.dot(np.abs(self.side_normals[rows]), half_size)
+        sides = np.einsum('npk,ck->npc', self.side_normals[rows], centers) + (self.side_offsets[rows] + reach)[..., None]
+        return overlap & np.all(sides >= 0.0, axis=1)
+
+
+class VisibilityGrid(object):
+    """Uniform grid listing the candidate visibility regions of every cell.
+
+    The candidates of cell ``c`` are ``candidates[start[c]:start[c+1]]``.
+    """
+
+    def __init__(self, lower, upper, shape, start, candidates, n_regions):
+
+        self.lower = lower
+        """Lower corner of the grid. Array of shape (3,).
+        """
+
+        self.upper = upper
+        """Upper corner of the grid. Array of shape (3,).
+        """
+
+        self.shape = shape
+        """Amount of cells along each axis.
+        """
+
+        self.start = start
+        """Start of the candidates of every cell in :attr:`candidates`. Array of shape (C+1,).
+        """
+
+        self.candidates = candidates
+        """Index of the regions that may overlap each cell, grouped by cell. Array of shape (K,).
+        """
+
+        self.n_regions = n_regions
+        """Amount of regions.
+        """
+
+    @property
+    def cell_size(self):
+        """Size of a cell along each axis. Array of shape (3,).
+        """
+        return (self.upper - self.lower) / self.shape
+
+    @classmethod
+    def from_regions(cls, regions, lower, upper, shape=(8, 8, 8), chunk_size=4096):
+        """Create a grid over a box.
+
+        :param regions: Instance of :class:`VisibilityRegions`.
+        :param lower: Lower corner of the box, typically of the room. Array of shape (3,).
+        :param upper: Upper corner of the box.
+        :param shape: Amount of cells along each axis.
+        :param chunk_size: Amount of regions that are tested at once.
+        """
+        lower = np.asarray(lower, dtype='float64')
+        upper = np.asarray(upper, dtype='float64')
+        shape = tuple(int(n) for n in shape)
+        if len(shape) != 3 or min(shape) < 1:
+            raise ValueError("Shape should hold a positive amount of cells along each axis.")
+        if (upper <= lower).any():
+            raise ValueError("Upper corner should lie above the lower corner.")
+        size = (upper - lower) / shape
+        cells = np.stack(np.meshgrid(*(np.arange(n) for n in shape), indexing='ij'), axis=-1).reshape(-1, 3)
+        centers = lower + (cells + 0.5) * size
+
+        rows, columns = [], []
+        for start in range(0, len(regions), chunk_size):
+            region, cell = np.nonzero(regions.overlaps(centers, 0.5 * size, slice(start, start+chunk_size)))
+            rows.append(region + start)
+            columns.append(cell)
+        rows = np.concatenate(rows) if rows else np.zeros(0, dtype='int64')
+        columns = np.concatenate(columns) if columns else np.zeros(0, dtype='int64')
+
+        order = np.argsort(columns, kind='stable')
+        first = np.searchsorted(columns[order], np.arange(len(centers)+1))
+        return cls(lower, upper, shape, first, rows[order], len(regions))
+
+    def cells(self, points):
+        """Index of the cell of every point, or -1 for points outside the grid.
+
+        :param points: Points. Array of shape (R, 3).
+
+        :returns: Array of shape (R,).
+        """
+        points = np.asarray(points, dtype='float64').reshape(-1, 3)
+        inside = ((points >= self.lower) & (points <= self.upper)).all(axis=-1)
+        index = np.floor((points - self.lower) / self.cell_size).astype('int64')
+        index = np.clip(index, 0, np.array(self.shape) - 1)
+        cells = np.ravel_multi_index(index.T, self.shape)
+        cells[~inside] = -1
+        return cells
+
+    def margin(self, points):
+        """Distance of every point to the boundary of its cell. Points outside the grid have a margin of zero.
+
+        :param points: Points. Array of shape (R, 3).
+
+        A point that moves less than the margin stays in its cell and keeps its candidates.
+        """
+        points = np.asarray(points, dtype='float64').reshape(-1, 3)
+        cells = self.cells(points)
+        corner = self.lower + np.array(np.unravel_index(np.maximum(cells, 0), self.shape)).T * self.cell_size
+        margin = np.minimum(points - corner, corner + self.cell_size - points).min(axis=-1)
+        return np.where(cells >= 0, np.maximum(margin, 0.0), 0.0)
+
+    def pairs(self, points):
+        """Candidate regions of points.
+
+        :param points: Points. Array of shape (R, 3).
+
+        :returns: Index of the region (K,) and of the point (K,) of every candidate pair. Points outside the grid are paired with all regions.
+        """
+        cells = self.cells(points)
+        inside = np.flatnonzero(cells >= 0)
+        first = self.start[cells[inside]]
+        counts = self.start[cells[inside]+1] - first
+        rows = self.candidates[np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts - first, counts)]
+        point = np.repeat(inside, counts)
+
+        outside = np.flatnonzero(cells < 0)
+        rows = np.concatenate([rows, np.tile(np.arange(self.n_regions), len(outside))])
+        point = np.concatenate([point, np.repeat(outside, self.n_regions)])
+        return rows, point
@@ -2,10 +2,23 @@
 This module contains an implementation of the Image Source Method (ISM).
 """
 
-from heapq import nlargest
+from collections import Counter
 from geometry import Point, Plane, Polygon
-from ._ism import Wall, Mirror, is_shadowed, test_effectiveness
+from ._ism import Wall, Mirror, is_shadowed, test_effectiveness, test_effectiveness_parallel, reflection_magnitude
+from ._tree import MirrorTree, Evaluation
+from ._topology import Topology
+from ._shoebox import Shoebox
+from ._material import Materials
+from ._stream import stream
+from ._selection import Strongest
+from ._stats import Statistics
+from ._bvh import BVH
+from ._paths import validate as validate_paths, chains
+from ._table import MirrorTable
+from . import _store
+from ._response import impulse_response
 import logging
+import os
 from cytoolz import unique, count
 import numpy as np
 
@@ -33,16 +46,27 @@ def amount_of_sources(order, walls):
     """
     return 1 + sum((walls*(walls-1)**(o-1) for o in range(1, order+1)))
     
-    
+
+def _as_array(points):
+    """Convert a list of points to an array of shape (N, 3).
+    """
+    return np.array([tuple(point) for point in points], dtype='float64').reshape(-1, 3)
     
 
 class Model(object):
     """The `Model` is the main class used for determining mirror sources and their effectiveness.
     
-    This implementation requires a fixed source position. The receiver position can vary.
+    The source and receiver positions can vary.
+    """
+
+    ENGINES = ('ism', 'tree')
+    """Available engines for generating mirror sources.
+    
+    * ``ism`` creates a :class:`ism.Mirror` for every mirror source using :func:`ism`.
+    * ``tree`` stores the mirror sources as arrays in a :class:`ism.MirrorTree`.
     """
 
-    def __init__(self, walls, source, receiver, max_order=3):#, max_distance=1000.0, min_amplitude=0.01):
+    def __init__(self, walls, source, receiver, max_order=3, engine='ism', max_distance=None, min_amplitude=None, directory=None, frequencies=None):
         
         self.walls = walls
         """Walls
@@ -51,7 +75,7 @@ class Model(object):
         self.source = source
         """Source position. Requires a list of points.
         
-        The source cannot move.
+        The source can move. See :meth:`determine`.
         
         ##Required is an instance of :class:`geometry.Point`
         """
@@ -67,6 +91,56 @@ class Model(object):
         self.max_order = max_order
         """Order threshold. Highest order to include.
         """
+        
+        self.engine = engine
+        """Engine used for generating mirror sources. See :attr:`ENGINES`.
+        """
+        
+        self.max_distance = max_distance
+        """Distance threshold. Mirror sources that are further away from all receiver positions are dropped, including their descendants.
+        """
+        
+        self.min_amplitude = min_amplitude
+        """Amplitude threshold. Mirror sources that are weaker at all receiver positions are dropped, including their descendants.
+        """
+        
+        self.directory = directory
+        """Directory in which mirror trees are stored. See :meth:`mirror_tree`.
+        """
+        
+        self.frequencies = frequencies
+        """Frequency grid of the strength. Walls with :attr:`ism.Wall.frequencies` are resampled onto it. See :attr:`materials`.
+        """
+        
+        self.stats = Statistics()
+        """Statistics of the last generation of mirror sources. See :class:`ism._stats.Statistics`.
+        """
+        
+        self._tree = None
+        """Cached mirror tree. See :meth:`mirror_tree`.
+        """
+        
+        self._tree_key = None
+        
+        self._evaluation = None
+        """Evaluation of the cached mirror tree at the receiver positions. See :meth:`update_receiver`.
+        """
+        
+        self._topology = None
+        self._topology_key = None
+        
+        self._shoebox = None
+        self._shoebox_key = None
+        
+        self._materials = None
+        self._materials_key = None
+        
+        # The impedance of the walls is validated when the model is created.
+        if walls:
+            self.materials
+        
+        self._bvh = None
+        self._bvh_key = None
   
     @property
     def source(self):
@@ -94,6 +168,16 @@ class Model(object):
         else:
             raise ValueError("List of Point instances are required.")
         
+    @property
+    def engine(self):
+        return self._engine
+    
+    @engine.setter
+    def engine(self, x):
+        if x not in self.ENGINES:
+            raise ValueError("Engine should be one of {}.".format(self.ENGINES))
+        self._engine = x
+        
     @property
     def is_source_moving(self):
         return count(unique(self.source, key=tuple)) != 1
@@ -103,83 +187,464 @@ class Model(object):
         return count(unique(self.receiver, key=tuple)) != 1
         
   
-    def mirrors(self):
+    @property
+    def pruned(self):
+        """Amount of candidates dropped by each truncation rule during the last generation of mirror sources.
+        """
+        return self.stats.by_reason()
+    
+    def mirrors(self, workers=None, trace=False):
         """Mirrors.
         
+        :param workers: Amount of worker processes. See :meth:`ism.MirrorTree.generate`.
+        :param trace: Log every decision. See :class:`ism._stats.Statistics`.
+        
         Determine the mirrors of non-moving source. Whether the mirrors are effective can be obtained using :meth:`determine`.
         
         In order to determine the mirrors a receiver position is required. The first receiver location is chosen.
+        The distance and amplitude truncations consider all receiver positions.
+        
+        The amount of mirror sources that is kept and dropped per order is available as :attr:`stats` once the generation has started.
         """
         if not self.walls:
             raise ValueError("ISM cannot run without any walls.")
         
-        yield from ism(self.walls, self.source[0], self.receiver[0], self.max_order)
+        if self.engine == 'tree':
+            yield from self.mirror_tree(workers=workers, trace=trace).mirrors()
+        else:
+            self.stats = Statistics(trace=trace)
+            yield from ism(self.walls, self.source[0], self.receiver, self.max_order,
+                           max_distance=self.max_distance, min_amplitude=self.min_amplitude, stats=self.stats, workers=workers,
+                           materials=self.materials)
     
-    def _determine(self, mirrors):
+    def mirror_tree(self, workers=None, trace=False):
+        """Mirror tree.
+        
+        :param workers: Amount of worker processes. See :meth:`ism.MirrorTree.generate`.
+        :param trace: Log the counts of every order. See :class:`ism._stats.Statistics`.
+        
+        Determine the mirrors of non-moving source and store them as arrays in a :class:`ism.MirrorTree`.
+        
+        The tree is cached and generated again only when the walls, the source position, the maximum order or the truncations change.
+        The truncations depend on the receiver positions, so with a truncation the tree is generated again when they change as well.
+        The amplitude truncation also depends on :attr:`materials`.
+        
+        When :attr:`directory` is set, the tree is stored in a subdirectory named after :meth:`key` and loaded memory mapped when it exists.
+        """
+        if not self.walls:
+            raise ValueError("ISM cannot run without any walls.")
+        
+        truncated = self.max_distance is not None or self.min_amplitude is not None
+        receivers = tuple(tuple(point) for point in self.receiver) if truncated else None
+        materials = id(self.materials) if self.min_amplitude is not None else None
+        key = (tuple(id(wall) for wall in self.walls), tuple(self.source[0]), self.max_order, self.max_distance, self.min_amplitude, receivers, materials)
+        if self._tree is None or self._tree_key != key:
+            self.stats = Statistics(trace=trace)
+            path = os.path.join(self.directory, self.key()) if self.directory is not None else None
+            if path is not None and os.path.isdir(path):
+                self._tree = MirrorTree.load(path, self.walls, key=self.key())
+            else:
+                self._tree = self._generate(self.source[0], max_distance=self.max_distance, workers=workers)
+                if path is not None:
+                    self._tree.save(path, key=self.key())
+            self._tree_key = key
+            self._evaluation = None
+        return self._tree
+    
+    def _generate(self, source, max_distance=None, workers=None):
+        """Generate the mirror sources of a source position as a :class:`ism.MirrorTree`.
+        
+        :param source: Source position.
+        :param max_distance: Distance threshold. See :attr:`max_distance`.
+        :param workers: Amount of worker processes. See :meth:`ism.MirrorTree.generate`.
+        """
+        return MirrorTree.generate(self.walls, source, self.max_order, receiver_positions=self.receiver, max_distance=max_distance,
+                                   min_amplitude=self.min_amplitude, stats=self.stats, workers=workers, materials=self.materials)
+    
+    def key(self):
+        """Hash of the class of the model, the walls and their materials, the source position, the maximum order and the truncations.
+        See :func:`ism._store.key`.
+        """
+        return _store.key(self.walls, self.source[0], self.max_order, receiver_positions=self.receiver,
+                          max_distance=self.max_distance, min_amplitude=self.min_amplitude,
+                          generator=type(self).__name__, frequencies=self.frequencies)
+    
+    def update_receiver(self, receiver, grid=None):
+        """Update the receiver positions and evaluate the cached mirror tree at the new positions.
+        
+        :param receiver: Receiver positions. List of points or array of shape (R, 3).
+        :param grid: Amount of cells along each axis of a grid that lists the candidate mirror sources of every cell,
+                     e.g. ``(8, 8, 8)``. See :class:`ism._visibility.VisibilityGrid`. By default no grid.
+        
+        :returns: Instance of :class:`ism._tree.Evaluation` with the effectiveness, strength and distance of the mirror sources in :meth:`mirror_tree`.
+        
+        Only the mirror sources whose effectiveness could have changed since the previous update are tested again.
+        This makes frequent updates of a slowly moving receiver cheap. With :attr:`max_distance` or :attr:`min_amplitude`
+        the tree depends on the receiver positions and is generated again at every update. With a grid the first update after the tree
+        is generated tests only the mirror sources that are visible near each receiver position.
+        """
+        self.receiver = receiver
+        tree = self.mirror_tree()
+        if self._evaluation is None or (self._evaluation.grid is None) != (grid is None) or (grid is not None and self._evaluation.grid.shape != tuple(grid)):
+            self._evaluation = Evaluation(tree, self.source[0], materials=self.materials, grid=grid)
+        return self._evaluation.update(_as_array(self.receiver))
+    
+    @property
+    def topology(self):
+        """Wall sequences of the room up to :attr:`max_order`. See :class:`ism._topology.Topology`.
+        
+        The sequences are enumerated once and enumerated again only when the walls or the maximum order change.
+        The mirror sources of any source position in the room follow with :meth:`ism.MirrorTree.from_topology`.
+        """
+        key = (tuple(id(wall) for wall in self.walls), self.max_order)
+        if self._topology is None or self._topology_key != key:
+            self._topology = Topology.from_walls(self.walls, self.max_order)
+            self._topology_key = key
+        return self._topology
+    
+    @property
+    def materials(self):
+        """Impedance of the walls on the common frequency grid :attr:`frequencies`. See :class:`ism._material.Materials`.
+        
+        The impedance is validated when the model is created and collected again when the walls, their impedance, their
+        reflection tables or the grid change.
+        """
+        key = (tuple(id(wall) for wall in self.walls), tuple(id(wall.impedance) for wall in self.walls),
+               tuple(id(wall.reflection_table) for wall in self.walls), id(self.frequencies))
+        if self._materials is None or self._materials_key != key:
+            self._materials = Materials.from_walls(self.walls, self.frequencies)
+            self._materials_key = key
+        return self._materials
+    
+    @property
+    def shoebox(self):
+        """Rectangular room formed by the walls, or ``None``. See :class:`ism._shoebox.Shoebox`.
+        
+        When the walls form a rectangular room :class:`ShoeboxModel` determines the mirror sources in closed form.
+        """
+        key = tuple(id(wall) for wall in self.walls)
+        if self._shoebox_key != key:
+            self._shoebox = Shoebox.from_walls(self.walls)
+            self._shoebox_key = key
+        return self._shoebox
+    
+    @property
+    def bvh(self):
+        """Bounding volume hierarchy over the walls. See :class:`ism._bvh.BVH`.
+        
+        The hierarchy is built once and built again only when the walls change.
+        """
+        key = tuple(id(wall) for wall in self.walls)
+        if self._bvh is None or self._bvh_key != key:
+            self._bvh = BVH.from_walls(self.walls)
+            self._bvh_key = key
+        return self._bvh
+    
+    def _chain(self, mirror):
+        """Positions and wall indices of a mirror source and its mothers, excluding the source.
+        
+        The wall indices are taken from :attr:`ism.Mirror.wall_index`.
+        """
+        positions = []
+        walls = []
+        while mirror.mother is not None:
+            positions.append(tuple(mirror.position))
+            walls.append(mirror.wall_index)
+            mirror = mirror.mother
+        return np.array(positions, dtype='float64').reshape(-1, 3), np.array(walls, dtype='int64')
+    
+    def _occluded(self, mirror, receivers):
+        """Test whether the path of a mirror source to the receiver positions is blocked by any wall.
+        
+        See :meth:`ism._bvh.BVH.occluded`.
+        """
+        positions, walls = self._chain(mirror)
+        return self.bvh.occluded(np.array(tuple(self.source[0])), receivers, positions, walls)
+    
+    def _validate(self, mirrors):
+        """Validate the reflection paths of mirror sources.
+        
+        :param mirrors: Mirror sources with known effectiveness, sorted by order.
+        
+        Mirror sources whose path does not reflect inside the polygons are not effective. The mirror sources are collected per order
+        and all mirror sources of an order are validated at once for all receiver positions, see :func:`ism._paths.validate`.
+        """
+        receivers = _as_array(self.receiver)
+        arrays = self.bvh.arrays
+        
+        def flush(batch):
+            if batch[0].order > 0:
+                paths = [self._chain(mirror) for mirror in batch]
+                positions = np.array([path[0] for path in paths])
+                walls = np.array([path[1] for path in paths])
+                valid = validate_paths(receivers, positions, walls, arrays)
+                for mirror, path in zip(batch, valid):
+                    mirror.effective = (np.asarray(mirror.effective, dtype='bool') & path).astype('int32')
+            return batch
+        
+        batch = []
+        for mirror in mirrors:
+            if batch and mirror.order != batch[0].order:
+                yield from flush(batch)
+                batch = []
+            batch.append(mirror)
+        if batch:
+            yield from flush(batch)
+    
+    def _determine(self, mirrors, num_threads=None, occlusion=False, bands=None, dtype='complex128'):
         """Determine mirror source effectiveness and strength.
+        
+        :param num_threads: Amount of threads. By default a single thread.
+        :param occlusion: Test whether any wall blocks the path of an effective mirror source. See :meth:`_occluded`.
+        :param bands: Index of the frequency bands for which the strength is computed. By default all bands.
+        :param dtype: Data type of the strength, ``complex64`` or ``complex128``. With ``complex64`` the strength takes half the memory.
+        
+        All receiver positions of a mirror source are tested at once using the compiled kernel :func:`ism._ism.test_effectiveness_parallel`.
+        The kernel handles every receiver position the same way, so the result is bit-identical for any amount of threads.
+        The strengths are passed to the kernel in ``dtype``, which multiplies them in double precision and stores them in ``dtype``.
+        
+        The mirror sources have to be sorted by order. The strength of a mirror source is the strength of its mother times the
+        reflection coefficient. No strengths are kept besides those of the mirror sources themselves, so when a mother has been
+        released by :meth:`_strongest` its strength is computed again from its chain of walls, see :meth:`ism._material.Materials.strength`.
+        The memory for the strength is therefore bounded by the amount of mirror sources that is kept.
         """
-        #r = 1 if isinstance(self.receiver, Point) else len(self.receiver)
-        n_positions = len(self.receiver)
-        n_frequencies = len(self.walls[0].impedance)
+        if np.dtype(dtype) not in (np.complex64, np.complex128):
+            raise ValueError("Data type of the strength should be complex64 or complex128.")
+        receivers = _as_array(self.receiver)
+        n_positions = len(receivers)
+        materials = self.materials
+        n_frequencies = len(np.arange(materials.n_bands)[bands if bands is not None else slice(None)])
         
-        #amount_of_receiver_positions = r
-
-        while True:
-            mirror = next(mirrors)
-            mirror.effective = np.empty(n_positions, dtype='int32')#, dtype='bool')
-            mirror.distance = np.empty(n_positions, dtype='float64')
-            mirror.strength = np.ones((n_positions, n_frequencies), dtype='complex128')
-
-            for t in range(n_positions):
-                if mirror.mother is not None:
-                    mother_strength = mirror.mother.strength[t]
-                else:
-                    mother_strength = np.ones((n_frequencies), dtype='complex128')
-                    
-                mirror.effective[t], mirror.strength[t], mirror.distance[t] = test_effectiveness(self.walls, 
-                                                                                                 self.source[0], 
-                                                                                                 self.receiver[t], 
-                                                                                                 mirror.position, 
-                                                                                                 mirror.wall, 
-                                                                                                 mother_strength)
-
+        # Reflection coefficient of every wall at every receiver position, gathered by wall index below.
+        line_of_sight = receivers - np.array(tuple(self.source[0]), dtype='float64')
+        line_of_sight /= np.linalg.norm(line_of_sight, axis=-1)[:, None]
+        normals = np.array([np.asarray(wall.unit_normal) for wall in self.walls], dtype='float64').reshape(-1, 3)
+        refl = materials.reflection(np.dot(normals, line_of_sight.T), bands)
+        
+        unity = np.ones((n_positions, n_frequencies), dtype=dtype)
+        
+        for mirror in mirrors:
+            if mirror.mother is None:
+                mother_strength = unity
+            elif mirror.mother.strength is not None:
+                mother_strength = mirror.mother.strength
+            else:
+                # The mother has been released, so its strength follows from the walls along its chain, starting at the source.
+                walls = self._chain(mirror.mother)[1][::-1]
+                mother_strength = Materials.strength(refl, [walls])[0].astype(dtype, copy=False)
+            
+            effective, strength, distance = test_effectiveness_parallel(self.walls,
+                                                                        self.source[0],
+                                                                        receivers,
+                                                                        mirror.position,
+                                                                        mirror.wall,
+                                                                        mother_strength,
+                                                                        num_threads or 1,
+                                                                        refl[mirror.wall_index] if mirror.wall_index >= 0 else None)
+            if occlusion and effective.any():
+                effective = effective & ~self._occluded(mirror, receivers)
+            mirror.effective = effective.astype('int32')
+            mirror.distance = distance
+            mirror.strength = strength
+            
             yield mirror
     
     @staticmethod
-    def _strongest(mirrors, amount):
+    def _strongest(mirrors, amount, rank='mirror', threshold=None):
         """Determine strongest mirror sources.
         
+        :param amount: Amount of mirror sources to keep per ranking.
+        :param rank: Ranking. See :attr:`ism._selection.Strongest.RANKS`.
+        :param threshold: Mirror sources with a strength below the threshold are dropped.
+        
         :returns: Generator yielding sorted values.
         
+        The strength is the magnitude of the complex strength. Mirror sources are streamed through :class:`ism._selection.Strongest`,
+        which keeps only the current candidates. The arrays of mirror sources that are dropped are released.
         """
-        yield from nlargest(amount, mirrors, key=lambda x:x.strength.max())
-        #results = list()
-        #for mirror in mirrors:
-            #results.sort(key=lambda x:x.strength.max(), reverse=True)
-            #for i, result in enumerate(results):
-                #if (mirror.strength > result.strength).any():
-                    #results.insert(i, mirror)
-                    #if len(results) > amount:
-                        #del results[-1]
-            #else:
-                #if len(results) < amount:
-                    #results.append(mirror)
-        #yield from results
+        yield from Strongest(amount, rank=rank, threshold=threshold).extend(mirrors).result()
     
-    def determine(self, strongest=None):
+    def determine(self, strongest=None, workers=None, num_threads=None, rank='mirror', threshold=None, occlusion=False, validate=False, table=False, reuse_distance=0.1, bands=None, dtype='complex128'):
         """Determine.
+        
+        :param strongest: Amount of strongest mirror sources to yield.
+        :param rank: Ranking of the strongest mirror sources. See :meth:`_strongest`.
+        :param threshold: Strength threshold of the strongest mirror sources. See :meth:`_strongest`.
+        :param workers: Amount of worker processes for generating the mirror sources. See :meth:`mirrors`.
+        :param num_threads: Amount of threads for testing the receiver positions. See :meth:`_determine`.
+        :param occlusion: Test whether the paths of effective mirror sources are blocked. See :meth:`_determine`.
+        :param validate: Test whether the reflection paths are valid. See :meth:`_validate`.
+        :param table: Return a :class:`ism.MirrorTable` instead of a generator. See :meth:`_table`.
+        :param reuse_distance: Distance over which the source may move before the mirror sources are generated again. See :meth:`_trajectory`.
+        :param bands: Index of the frequency bands for which the strength is computed. By default all bands. See :meth:`_determine`.
+        :param dtype: Data type of the strength. See :meth:`_determine`.
+        
+        :returns: Generator yielding mirror sources, or a :class:`ism.MirrorTable`. With a moving source and ``table`` a list with a table per source position.
+        
+        The generator considers only the first source position.
         """
         if not self.walls:
             raise ValueError("ISM cannot run without any walls.")
+        if table and self.is_source_moving:
+            return self._trajectory(strongest=strongest, workers=workers, rank=rank, threshold=threshold, occlusion=occlusion,
+                                    validate=validate, reuse_distance=reuse_distance, bands=bands, dtype=dtype)
+        if table:
+            return self._table(strongest=strongest, workers=workers, rank=rank, threshold=threshold, occlusion=occlusion, validate=validate,
+                               bands=bands, dtype=dtype)
         #self.determine_mirrors()
         logging.info("determine: Determining mirror sources.")
-        mirrors = self.mirrors()
+        mirrors = self.mirrors(workers=workers)
         logging.info("determine: Determining mirror sources strength and effectiveness.")
-        mirrors = self._determine(mirrors)
+        mirrors = self._determine(mirrors, num_threads=num_threads, occlusion=occlusion, bands=bands, dtype=dtype)
+        if validate:
+            logging.info("determine: Validating reflection paths.")
+            mirrors = self._validate(mirrors)
         if strongest:
             logging.info("determine: Determining strongest mirror sources.")
-            mirrors = self._strongest(mirrors, strongest)
-        yield from mirrors
+            mirrors = self._strongest(mirrors, strongest, rank=rank, threshold=threshold)
+        return mirrors
+    
+    def _table(self, strongest=None, workers=None, rank='mirror', threshold=None, occlusion=False, validate=False, bands=None, dtype='complex128'):
+        """Determine mirror source effectiveness and strength as columns.
+        
+        :returns: Instance of :class:`ism.MirrorTable`.
+        
+        The mirror sources are generated as a :class:`ism.MirrorTree` and evaluated at all receiver positions at once
+        using :class:`ism._tree.Evaluation`. The effectiveness, distance and strength are stored in preallocated arrays
+        and no :class:`ism.Mirror` is created. See :meth:`determine` for the parameters.
+        """
+        tree = self.mirror_tree(workers=workers)
+        return self._evaluate(tree, self.source[0], strongest=strongest, rank=rank, threshold=threshold, occlusion=occlusion, validate=validate,
+                              bands=bands, dtype=dtype)
+    
+    def _trajectory(self, strongest=None, workers=None, rank='mirror', threshold=None, occlusion=False, validate=False, reuse_distance=0.1, bands=None, dtype='complex128'):
+        """Determine mirror source effectiveness and strength along the trajectory of a moving source.
+        
+        :param reuse_distance: Distance over which the source may move before the mirror sources are generated again.
+        
+        :returns: List with an instance of :class:`ism.MirrorTable` for every source position.
+        
+        The mirror sources are generated as a :class:`ism.MirrorTree` for the first source position. The wall sequences of
+        that tree are reused for the following source positions as long as they are within ``reuse_distance`` of it.
+        Only the positions are mirrored again using :meth:`ism.MirrorTree.from_topology`. A source position further away
+        starts a new tree.
+        
+        The wall sequences depend slightly on the source position, so a reused tree may lack mirror sources that a new tree
+        would have. The distance truncation is widened by ``reuse_distance``, because mirror sources move as far as the source.
+        The amplitude truncation uses the first source position of a tree. See :meth:`determine` for the other parameters.
+        """
+        receivers = _as_array(self.receiver)
+        max_distance = self.max_distance + reuse_distance if self.max_distance is not None else None
+        self.stats = Statistics()
+        tables = []
+        tree = topology = origin = None
+        for source in self.source:
+            position = np.array(tuple(source), dtype='float64')
+            if tree is None or np.linalg.norm(position - origin) > reuse_distance:
+                logging.info("determine: Generating mirror sources for source position {}.".format(tuple(position)))
+                tree = self._generate(source, max_distance=max_distance, workers=workers)
+                topology = None
+                origin = position
+                moved = tree
+            else:
+                if topology is None:
+                    topology = Topology.from_tree(tree)
+                moved = MirrorTree.from_topology(topology, source)
+            tables.append(self._evaluate(moved, source, strongest=strongest, rank=rank, threshold=threshold, occlusion=occlusion,
+                                         validate=validate, receivers=receivers, bands=bands, dtype=dtype))
+        return tables
+    
+    def _evaluate(self, tree, source, strongest=None, rank='mirror', threshold=None, occlusion=False, validate=False, receivers=None, bands=None, dtype='complex128'):
+        """Evaluate a mirror tree at the receiver positions.
+        
+        :param tree: Instance of :class:`ism.MirrorTree`.
+        :param source: Source position of the tree.
+        
+        :returns: Instance of :class:`ism.MirrorTable`. See :meth:`determine` for the other parameters.
+        
+        The evaluation is not kept, so it is not incremental and tests the mirror sources in chunks. See :class:`ism._tree.Evaluation`.
+        """
+        if receivers is None:
+            receivers = _as_array(self.receiver)
+        evaluation = Evaluation(tree, source, bands=bands, dtype=dtype, materials=self.materials, incremental=False)
+        table = MirrorTable.from_evaluation(evaluation.update(receivers))
+        if validate:
+            table.effective &= tree.validate(receivers)
+        if occlusion:
+            source = np.array(tuple(source))
+            for index in np.flatnonzero(table.effective.any(axis=-1)):
+                chain = chains(tree.mother, tree.wall, [index])[0]
+                table.effective[index] &= ~self.bvh.occluded(source, receivers, tree.positions[chain], tree.wall[chain])
+        if strongest:
+            table = table.strongest(strongest, rank=rank, threshold=threshold)
+        return table
+    
+    def strength_chunks(self, chunk_size=64, index=None, bands=None, dtype='complex128'):
+        """Strength of the mirror sources computed for a chunk of frequency bands at a time.
+        
+        :param chunk_size: Amount of frequency bands per chunk.
+        :param index: Index of the mirror sources in :meth:`mirror_tree`, e.g. :attr:`ism.MirrorTable.index` of a table with the strongest mirror sources.
+                      By default the mirror sources that are effective at any receiver position.
+        :param bands: Index of the frequency bands. By default all bands.
+        :param dtype: Data type of the strength.
+        
+        :returns: Index of the mirror sources (M,) and a generator yielding the band indices (B,) and the strength (M, R, B) of every chunk.
+        
+        The effectiveness is determined once, before the first chunk, so only the strength of a single chunk is held in memory.
+        See :meth:`ism._tree.Evaluation.chunks`.
+        """
+        tree = self.mirror_tree()
+        evaluation = Evaluation(tree, self.source[0], bands=bands, dtype=dtype, materials=self.materials, incremental=False)
+        evaluation.update(_as_array(self.receiver), strength=False)
+        if index is None:
+            index = np.flatnonzero(evaluation.effective.any(axis=-1))
+        return index, evaluation.chunks(chunk_size, index)
+    
+    def stream(self, receiver_updates, executor=None, **kwargs):
+        """Determine the mirror sources for a stream of receiver positions.
+        
+        :param receiver_updates: Asynchronous or ordinary iterable yielding receiver positions.
+        :param executor: Executor the mirror sources are determined in. By default a single thread.
+        :param kwargs: Keyword arguments passed to :meth:`determine`.
+        
+        :returns: Asynchronous generator yielding a :class:`ism._stream.Frame` for the most recent update whenever the previous frame is done.
+        
+        Updates that arrive while a frame is being determined are dropped except for the last one. See :func:`ism._stream.stream`.
+        
+        .. code-block:: python
+        
+            async for frame in model.stream(receiver_updates):
+                render(frame.table)
+        """
+        return stream(self, receiver_updates, executor=executor, **kwargs)
+    
+    def impulse_response(self, fs, c=343.0, length=None, frequencies=None, chunk_size=1024, **kwargs):
+        """Impulse responses at the receiver positions.
+        
+        :param fs: Sample frequency.
+        :param c: Speed of sound.
+        :param length: Length of the impulse responses in samples. By default the length follows from :attr:`max_distance`.
+        :param frequencies: Centre frequencies of the bands of the impedance, or of the selected ``bands``. See :func:`ism._response.impulse_response`.
+        :param chunk_size: Amount of mirror sources that are placed at once.
+        :param kwargs: Keyword arguments passed to :meth:`determine`.
+        
+        :returns: Impulse responses. Array of shape (R, N).
+        
+        The mirror sources are streamed from :meth:`determine` and placed in chunks using :func:`ism._response.impulse_response`.
+        With a moving source :meth:`determine` considers only the first source position, unless ``table`` is given, which
+        gives a table per source position and raises a :class:`ValueError`.
+        """
+        if kwargs.get('table') and self.is_source_moving:
+            raise ValueError("Impulse responses of a moving source with a table per source position are not supported.")
+        if length is None:
+            if self.max_distance is None:
+                raise ValueError("Length of the impulse response is required when the distance is not truncated.")
+            length = int(np.ceil(self.max_distance / c * fs)) + 2
+        mirrors = self.determine(**kwargs)
+        bands = kwargs.get('bands')
+        n_bands = len(np.arange(self.materials.n_bands)[bands if bands is not None else slice(None)])
+        return impulse_response(mirrors, len(_as_array(self.receiver)), n_bands, fs, length,
+                                c=c, frequencies=frequencies, chunk_size=chunk_size)
     
     def plot(self, **kwargs):
         return plot_model(self, **kwargs)
@@ -190,31 +655,157 @@ class Model(object):
         """
         return plot_walls(self.walls, filename)
     
+
+class ShoeboxModel(Model):
+    """Model of a rectangular room with axis-aligned walls.
+    
+    The mirror sources form a lattice and are determined in closed form using :class:`ism._shoebox.Shoebox`
+    instead of testing field angles. Every mirror source has a valid path to every receiver position in the room,
+    so the effectiveness requires no tests and the strength follows from the amount of reflections at each wall.
+    Whether walls form a rectangular room can be checked with :attr:`Model.shoebox`.
+    """
+    
+    ENGINES = ('shoebox',)
+    """Available engines for generating mirror sources.
+    
+    * ``shoebox`` generates the lattice of mirror sources in closed form.
+    """
     
-def ism(walls, source_position, receiver_position, max_order=3):
+    def __init__(self, walls, source, receiver, max_order=3, max_distance=None, min_amplitude=None, directory=None, frequencies=None):
+        super().__init__(walls, source, receiver, max_order=max_order, engine='shoebox', max_distance=max_distance,
+                         min_amplitude=min_amplitude, directory=directory, frequencies=frequencies)
+        if self.shoebox is None:
+            raise ValueError("Walls do not form a rectangular room with axis-aligned walls.")
+    
+    def mirrors(self, workers=None, trace=False):
+        """Mirrors. See :meth:`Model.mirrors`.
+        """
+        yield from self.mirror_tree(workers=workers, trace=trace).mirrors()
+    
+    def _generate(self, source, max_distance=None, workers=None):
+        """Generate the lattice of mirror sources. See :meth:`ism._shoebox.Shoebox.tree`.
+        """
+        return self.shoebox.tree(source, self.max_order, receiver_positions=self.receiver, max_distance=max_distance,
+                                 min_amplitude=self.min_amplitude, materials=self.materials)
+    
+    def determine(self, strongest=None, workers=None, num_threads=None, rank='mirror', threshold=None, occlusion=False, validate=False, table=False, reuse_distance=0.0, bands=None, dtype='complex128'):
+        """Determine. See :meth:`Model.determine`.
+        
+        The mirror sources are always determined as a :class:`ism.MirrorTable`. Without ``table`` the generator yields its mirror sources.
+        The lattice is cheap to generate, so by default it is generated again for every position of a moving source.
+        
+        The paths of all mirror sources are valid and cannot be blocked inside the room, so ``validate`` and ``occlusion`` have no effect.
+        No field angles are tested, so ``num_threads`` has no effect either.
+        """
+        if table:
+            return super().determine(strongest=strongest, workers=workers, rank=rank, threshold=threshold, table=True,
+                                     reuse_distance=reuse_distance, bands=bands, dtype=dtype)
+        if not self.walls:
+            raise ValueError("ISM cannot run without any walls.")
+        return iter(self._table(strongest=strongest, workers=workers, rank=rank, threshold=threshold, bands=bands, dtype=dtype))
+    
+    def update_receiver(self, receiver, grid=None):
+        """Update the receiver positions and evaluate the cached lattice at the new positions. See :meth:`Model.update_receiver`.
+        
+        :param receiver: Receiver positions. List of points or array of shape (R, 3).
+        :param grid: Has no effect.
+        
+        :returns: Instance of :class:`ism.MirrorTable`. See :meth:`ism._shoebox.Shoebox.evaluate`.
+        
+        The mother and the generating wall of a mirror source in the lattice are its neighbour along one axis, which is not
+        necessarily the last wall its path reflects at. The field angle tests of :class:`ism._tree.Evaluation` therefore do not apply.
+        The effectiveness requires no tests, so the lattice is evaluated at once like in :meth:`determine`.
+        """
+        self.receiver = receiver
+        tree = self.mirror_tree()
+        return self.shoebox.evaluate(tree, self.source[0], _as_array(self.receiver), materials=self.materials)
+    
+    def strength_chunks(self, chunk_size=64, index=None, bands=None, dtype='complex128'):
+        """Strength of the mirror sources computed for a chunk of frequency bands at a time. See :meth:`Model.strength_chunks`.
+        
+        By default all mirror sources are included, because all are effective inside the room.
+        """
+        if index is None:
+            index = np.arange(len(self.mirror_tree()))
+        return super().strength_chunks(chunk_size=chunk_size, index=index, bands=bands, dtype=dtype)
+    
+    def _evaluate(self, tree, source, strongest=None, rank='mirror', threshold=None, occlusion=False, validate=False, receivers=None, bands=None, dtype='complex128'):
+        """Evaluate the lattice at the receiver positions. See :meth:`ism._shoebox.Shoebox.evaluate`.
+        
+        The paths are valid and cannot be blocked inside the room, so ``validate`` and ``occlusion`` have no effect.
+        """
+        if receivers is None:
+            receivers = _as_array(self.receiver)
+        table = self.shoebox.evaluate(tree, source, receivers, bands=bands, dtype=dtype, materials=self.materials)
+        if strongest:
+            table = table.strongest(strongest, rank=rank, threshold=threshold)
+        return table
+    
+    
+def ism(walls, source_position, receiver_position, max_order=3, max_distance=None, min_amplitude=None, stats=None, workers=None, materials=None):
     """Image source method.
     
     :param walls: List of walls
     :param source: Position of Source
-    :param receiver: Position of Receiver
+    :param receiver: Position of Receiver, or a list of positions.
     :param max_order: Maximum order to determine image sources for.
-    :param max_distance: Maximum distance
-    :param max_amplitude: Maximum amplitude
+    :param max_distance: Maximum distance between a mirror source and the receiver.
+    :param min_amplitude: Minimum amplitude of the strength of a mirror source.
+    :param stats: Optional :class:`ism._stats.Statistics` that is updated with the amount of mirror sources that is kept and dropped.
+    :param workers: Amount of worker processes. When given, the subtrees of the first order mirror sources are generated in parallel
+                    by :meth:`ism.MirrorTree.generate` and views of the mirror sources are yielded.
+    :param materials: Impedance of the walls, used for the amplitude truncation. See :class:`ism._material.Materials`. By default it is collected from the walls.
+    
+    When a list of receiver positions is given, a mirror source is kept when it passes the truncations for any of the positions.
+    
+    The mirror sources are yielded order by order, as soon as an order is complete. Only the mirror sources of the previous order
+    are kept for generating the next order, so the memory is bounded by the largest order instead of the whole tree.
+    
+    A mirror source that is dropped because of distance or amplitude is dropped together with all its descendants.
+    Reflections never shorten the path between a mirror source and the receiver, and the strength of a subtree is bounded using
+    the largest magnitude of the reflection coefficients, see :func:`ism._ism.reflection_magnitude`.
     """
     logging.info("Start calculating image sources.")
 
     n_walls = len(walls)
     
+    receiver_positions = receiver_position if isinstance(receiver_position, list) else [receiver_position]
+    receiver_position = receiver_positions[0]
+    
     source_receiver_distance = source_position.distance_to(receiver_position)
 
-    mirrors = list()
-    """List of lists with mirror sources where ``mirrors[order]`` is a list of mirror sources of order ``order``"""
+    if stats is None:
+        stats = Statistics()
+    trace = stats.trace
+    pruned = Counter()
+
+    if workers:
+        tree = MirrorTree.generate(walls, source_position, max_order, receiver_positions=receiver_positions,
+                                   max_distance=max_distance, min_amplitude=min_amplitude, stats=stats, workers=workers,
+                                   materials=materials)
+        yield from tree.mirrors()
+        return
+
+    if max_distance is not None or min_amplitude is not None:
+        receivers = _as_array(receiver_positions)
+
+    if min_amplitude is not None:
+        gain = reflection_magnitude(walls, source_position, receivers, materials)
+        """Upper bound of the magnitude of the reflection coefficient of each wall at each receiver position."""
+        growth = np.maximum(1.0, gain.max(axis=0))
+        """Largest factor by which the strength of a descendant can exceed the strength of its mother at each receiver position."""
+        previous_amplitudes = [np.ones(len(receivers))]
+        """Upper bound of the amplitude of the strength of each mirror source of the previous order at each receiver position."""
+
+    previous = list()
+    """Mirror sources of the previous order. Only this frontier is kept, earlier orders are referenced by their descendants only."""
     
     """Step 3: Include the original source."""
     """Test first whether there is a direct path."""
     
     
-    logging.info("Main source effective: {}".format(not is_shadowed(source_position, receiver_position, walls)))
+    if trace:
+        stats.log(0, 0, None, "Main source effective: {}".format(not is_shadowed(source_position, receiver_position, walls)))
     
     #mirrors.append([Mirror(source_position, 
                            #None, 
@@ -225,28 +816,35 @@ def ism(walls, source_position, receiver_position, max_order=3):
                            #not is_shadowed(source_position, receiver_position, walls)
                            #)])
     
-    mirrors.append([Mirror(source_position, mother=None, wall=None, order=0)])
+    previous.append(Mirror(source_position, mother=None, wall=None, order=0))
+    yield previous[0]
    
     """Step 4: Loop over orders."""
     for order in range(1, max_order+1):
-        mirrors.append(list())  # Add per order a list that will contain mirror sources of that order
+        current = list()    # Mirror sources of this order
+        if min_amplitude is not None:
+            current_amplitudes = list()
+            threshold = min_amplitude / growth**(max_order-order)
+        pruned.clear()
         
-        """Step 5: Loop over sources of this order."""
-        for m, mirror in enumerate(mirrors[order-1], start=1):
+        """Step 5: Loop over sources of the previous order."""
+        for m, mirror in enumerate(previous, start=1):
         
             """Step 6: Loop over walls."""
-            for wall in walls:
+            for w, wall in enumerate(walls):
                 
-                info_string = "Order: {} - Mirror: {} - Wall: {}".format(order, m, wall)
-
                 """Step 7: Several geometrical truncations. 
                 We won't consider a mirror source when..."""
-                if wall == mirror.wall:
-                    logging.info(info_string + " - Illegal- Generating wall of this mirror.")
+                if w == mirror.wall_index:
+                    if trace:
+                        stats.log(order, m, wall, "Illegal - Generating wall of this mirror.")
+                    pruned['generating_wall'] += 1
                     continue    # ...the (mirror) source one order lower is already at this position.
                 
-                if mirror.position.on_interior_side_of(wall.plane()) == -1:
-                    logging.info(info_string + " - Illegal - Mirror on wrong side of wall. Position: {}".format(mirror.position) )
+                if mirror.position.on_interior_side_of(wall.cached_plane()) == -1:
+                    if trace:
+                        stats.log(order, m, wall, "Illegal - Mirror on wrong side of wall. Position: {}".format(mirror.position))
+                    pruned['wrong_side'] += 1
                     continue    #...the (mirror) source is on the other side of the wall.
                 
                 if mirror.wall: # Should be mirrored at a wall. This is basically only an issue with zeroth order?
@@ -257,44 +855,41 @@ def ism(walls, source_position, receiver_position, max_order=3):
                     #print ('Mirror position: {}'.format(str(mirror.position)))
                     
                     
-                    if not wall.center.in_field_angle(mirror.position, mirror.wall, wall.plane()):
+                    if not wall.center.in_field_angle(mirror.position, mirror.wall, wall.cached_plane()):
                     #if is_point_in_field_angle(mirror.position, wall.center, mirror.wall, wall) == -1:
-                        logging.info(info_string + " - Illegal - Center of wall cannot be seen.")
+                        if trace:
+                            stats.log(order, m, wall, "Illegal - Center of wall cannot be seen.")
+                        pruned['field_angle'] += 1
                         continue    #...the center of the wall is not visible from the (mirror) source.
                     #else:
-                    
-                """Step 8: Evaluate new mirror source and its parameters."""
-                position = mirror.position.mirror_with(wall.plane())   # Position of the new source
                 
-                logging.info(info_string + " - Storing mirror.")
-                
-                mirrors[order].append(Mirror(position, mirror, wall, order))
-                
-                
-                #position_receiver_distance = position.distance_to(receiver_position)    # Distance between receiver and the new source
-                
-                #cos_angle = wall.plane().normal().cosines_with(position.cosines_with(receiver_position))   # Cosine of the angle between the line of sight and the wall normal.
-                
-                
-                #try:
-                    #refl = (wall.impedance*cos_angle - 1.0) / (wall.impedance*cos_angle + 1.0)    # Reflection coefficient
-                #except ZeroDivisionError:   # If angle of incidence is 90 degrees, then cos_angle is 0.0. With hard reflection this results in a division by zero.
-                    #refl = 1.0
-                
-                #strength = mirror.strength * refl   # Amplitude strength due to current and past reflections
+                """Step 8: Truncation for weak q, before the new mirror source is created."""
+                if min_amplitude is not None:
+                    amplitude = previous_amplitudes[m-1] * gain[w]
+                    if np.all(amplitude < threshold):
+                        if trace:
+                            stats.log(order, m, wall, "Source is too weak: {}".format(amplitude.max()))
+                        pruned['amplitude'] += 1
+                        continue
+                    
+                """Step 9: Evaluate new mirror source and its parameters."""
+                position = mirror.position.mirror_with(wall.cached_plane())   # Position of the new source
                 
-                #print("Refl {}".format(refl))
+                """Step 10: Truncation for q too far away."""
+                if max_distance is not None:
+                    distance = np.linalg.norm(receivers - np.array(tuple(position)), axis=-1)
+                    if np.all(distance > max_distance):
+                        if trace:
+                            stats.log(order, m, wall, "Source is too far away: {} > {}".format(distance.min(), max_distance))
+                        pruned['distance'] += 1
+                        continue
                 
-                """Step 9: Truncation for weak q."""
+                if trace:
+                    stats.log(order, m, wall, "Storing mirror.")
                 
-                ###"""Check if q is not too weak."""                
-                ###if np.all(strength < min_amplitude):
-                    ###logging.info(info_string + " - Source is too weak: {}".format(strength))
-                    ###continue
-                ###"""Check if q not too far away."""
-                ###if (position_receiver_distance / source_receiver_distance) > max_distance:
-                    ###logging.info(info_string + " - Source is too far away: {} > {}".format(position_receiver_distance / source_receiver_distance, max_distance))
-                    ###continue
+                current.append(Mirror(position, mirror, wall, order, w))
+                if min_amplitude is not None:
+                    current_amplitudes.append(amplitude)
                 
                 """Check if q can be seen."""
                 """We have to create a plane on which the receiver_position is situated."""
@@ -303,8 +898,14 @@ def ism(walls, source_position, receiver_position, max_order=3):
                 
                 #logging.info(info_string + " - Mirrorsource: {} - Effective: {}".format(position, effective))
                 #mirrors[order].append(Mirror(position, mirror, wall, order, position_receiver_distance, strength, effective))
-
-    yield from (val for subl in mirrors for val in subl)
+        
+        stats.add(order, pruned, len(current))
+        
+        """Step 11: Yield the order as soon as it is complete."""
+        yield from current
+        previous = current
+        if min_amplitude is not None:
+            previous_amplitudes = current_amplitudes
 
 
 def children(mirrors, mirror):
@@ -0,0 +1,50 @@
+"""
+Fixtures shared by the tests.
+"""
+import pytest
+import numpy as np
+from ism import Wall
+from geometry import Point
+
+@pytest.fixture
+def impedance1():
+    bands = 10
+    return np.ones(bands) + np.ones(bands)*1j
+
+@pytest.fixture
+def impedance2():
+    bands = 10
+    return np.linspace(1.0, 8.0, bands) + np.ones(bands)*1j
+
+@pytest.fixture
+def walls1(impedance1):
+    """Walls of a unit cube with the normals pointing inwards.
+    """
+    P = Point
+    return [ Wall([P(0.0, 0.0, 0.0), P(1.0, 0.0, 0.0), P(1.0, 1.0, 0.0), P(0.0, 1.0, 0.0)], P(0.5, 0.5, 0.0), impedance1),
+             Wall([P(0.0, 0.0, 0.0), P(0.0, 1.0, 0.0), P(0.0, 1.0, 1.0), P(0.0, 0.0, 1.0)], P(0.0, 0.5, 0.5), impedance1),
+             Wall([P(0.0, 0.0, 0.0), P(0.0, 0.0, 1.0), P(1.0, 0.0, 1.0), P(1.0, 0.0, 0.0)], P(0.5, 0.0, 0.5), impedance1),
+             Wall([P(0.0, 0.0, 1.0), P(0.0, 1.0, 1.0), P(1.0, 1.0, 1.0), P(1.0, 0.0, 1.0)], P(0.5, 0.5, 1.0), impedance1),
+             Wall([P(1.0, 0.0, 0.0), P(1.0, 0.0, 1.0), P(1.0, 1.0, 1.0), P(1.0, 1.0, 0.0)], P(1.0, 0.5, 0.5), impedance1),
+             Wall([P(0.0, 1.0, 0.0), P(1.0, 1.0, 0.0), P(1.0, 1.0, 1.0), P(0.0, 1.0, 1.0)], P(0.5, 1.0, 0.5), impedance1),
+            ]
+
+@pytest.fixture
+def walls2(impedance2):
+    """Walls of a shoebox of 3 by 2 by 1.5 with the normals pointing inwards.
+    """
+    P = Point
+    return [ Wall([P(0.0, 0.0, 0.0), P(3.0, 0.0, 0.0), P(3.0, 2.0, 0.0), P(0.0, 2.0, 0.0)], P(1.5, 1.0, 0.0), impedance2),
+             Wall([P(0.0, 0.0, 0.0), P(0.0, 2.0, 0.0), P(0.0, 2.0, 1.5), P(0.0, 0.0, 1.5)], P(0.0, 1.0, 0.75), impedance2),
+             Wall([P(0.0, 0.0, 0.0), P(0.0, 0.0, 1.5), P(3.0, 0.0, 1.5), P(3.0, 0.0, 0.0)], P(1.5, 0.0, 0.75), impedance2),
+             Wall([P(0.0, 0.0, 1.5), P(0.0, 2.0, 1.5), P(3.0, 2.0, 1.5), P(3.0, 0.0, 1.5)], P(1.5, 1.0, 1.5), impedance2),
+             Wall([P(3.0, 0.0, 0.0), P(3.0, 0.0, 1.5), P(3.0, 2.0, 1.5), P(3.0, 2.0, 0.0)], P(3.0, 1.0, 0.75), impedance2),
+             Wall([P(0.0, 2.0, 0.0), P(3.0, 2.0, 0.0), P(3.0, 2.0, 1.5), P(0.0, 2.0, 1.5)], P(1.5, 2.0, 0.75), impedance2),
+            ]
+
+@pytest.fixture
+def receivers1():
+    """Receiver positions inside the shoebox of :func:`walls2`.
+    """
+    state = np.random.RandomState(0)
+    return state.uniform(0.1, 1.4, (10, 3))
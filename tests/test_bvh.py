@@ -0,0 +1,90 @@
+"""
+Tests for :mod:`ism._bvh`.
+"""
+import pytest
+import numpy as np
+from ism import Model, Wall
+from ism._bvh import BVH
+from ism._geometry import signed_distance, in_polygon
+from geometry import Point
+
+@pytest.fixture
+def walls3(walls1, impedance1):
+    """Walls of a unit cube with the normals pointing inwards and a panel halfway.
+    """
+    P = Point
+    return walls1 + [Wall([P(0.5, 0.0, 0.0), P(0.5, 1.0, 0.0), P(0.5, 1.0, 0.6), P(0.5, 0.0, 0.6)], P(0.5, 0.5, 0.3), impedance1)]
+
+@pytest.fixture
+def triangles(impedance1):
+    state = np.random.RandomState(0)
+    walls = list()
+    for i in range(200):
+        vertices = state.uniform(0.0, 10.0, 3) + state.randn(3, 3)
+        walls.append(Wall([Point(*vertex) for vertex in vertices], Point(*vertices.mean(axis=0)), impedance1))
+    return walls
+
+
+class TestBVH:
+    """Tests for :class:`ism._bvh.BVH`.
+    """
+
+    def test_leaves(self, triangles):
+        """Every wall belongs to exactly one leaf.
+        """
+        bvh = BVH.from_walls(triangles, leaf_size=4)
+        leaves = bvh.left < 0
+        assert bvh.count[leaves].sum() == len(triangles)
+        assert bvh.count[leaves].max() <= 4
+        assert sorted(bvh.index) == list(range(len(triangles)))
+
+    def test_intersects(self, triangles):
+        """The hierarchy gives the same result as testing every wall.
+        """
+        bvh = BVH.from_walls(triangles)
+        state = np.random.RandomState(1)
+        starts = state.uniform(0.0, 10.0, (500, 3))
+        ends = state.uniform(0.0, 10.0, (500, 3))
+        
+        arrays = bvh.arrays
+        a = signed_distance(starts[:, None], arrays.normals, arrays.offsets)
+        b = signed_distance(ends[:, None], arrays.normals, arrays.offsets)
+        points = starts[:, None] + (a / (a - b))[..., None] * (ends - starts)[:, None]
+        expected = ((a * b < 0.0) & in_polygon(points, arrays.vertices, arrays.normals)).any(axis=-1)
+        
+        assert (bvh.intersects(starts, ends) == expected).all()
+        
+        segment, wall = bvh.candidates(starts, ends)
+        assert len(segment) < len(starts) * len(triangles)
+        
+        # No segments give no candidates.
+        segment, wall = bvh.candidates(starts[:0], ends[:0])
+        assert len(segment) == len(wall) == 0
+        assert len(bvh.intersects(starts[:0], ends[:0])) == 0
+
+    def test_occluded(self, walls3):
+        """The panel blocks the direct sound and the reflections at the wall behind the source.
+        """
+        bvh = BVH.from_walls(walls3)
+        source = np.array([0.9, 0.5, 0.5])
+        receivers = np.array([[0.1, 0.5, 0.5], [0.7, 0.5, 0.5], [0.1, 0.5, 0.9]])
+        
+        no_reflections = np.zeros((0, 3)), np.zeros(0, dtype='int64')
+        assert list(bvh.occluded(source, receivers, *no_reflections)) == [True, False, False]
+        
+        # Reflection at the wall x = 1.
+        assert list(bvh.occluded(source, receivers, np.array([[1.1, 0.5, 0.5]]), np.array([4]))) == [True, False, False]
+
+    def test_model(self, walls3):
+        """Blocked paths are not effective when testing for occlusion.
+        """
+        S = [Point(0.9, 0.5, 0.5)]
+        R = [Point(0.1, 0.5, 0.5)]
+        model = Model(walls3, S, R, max_order=1)
+        assert model.bvh is model.bvh
+        
+        direct = next(model.determine())
+        assert direct.effective[0] == 1
+        
+        direct = next(model.determine(occlusion=True))
+        assert direct.effective[0] == 0
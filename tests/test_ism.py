@@ -4,14 +4,14 @@ Tests for :mod:`ism`.
 import pytest
 import numpy as np
 from ism import Model, Wall
+from ism.ism import ism
+from ism._stats import Statistics
+from ism._ism import test_effectiveness, test_effectiveness_many, test_effectiveness_parallel, is_shadowed, is_shadowed_parallel
 from geometry import Point
 import tempfile
 import pickle
-
-@pytest.fixture
-def impedance1():
-    bands = 10
-    return np.ones(bands) + np.ones(bands)*1j
+import logging
+import weakref
 
 @pytest.fixture
 def wall1(impedance1):
@@ -23,6 +23,47 @@ class TestWall:
     def test_mirror(self, wall1):
         assert wall1.mirror().points == wall1.points[::-1]
 
+    def test_cache(self, wall1):
+        assert np.asarray(wall1.unit_normal) == pytest.approx([0.0, 0.0, 1.0])
+        assert np.asarray(wall1.plane_coefficients) == pytest.approx([0.0, 0.0, 1.0, 0.0])
+        assert np.asarray(wall1.centroid) == pytest.approx([0.5, 0.5, 0.0])
+        assert np.asarray(wall1.edges).sum(axis=0) == pytest.approx([0.0, 0.0, 0.0])
+        assert wall1.cached_plane() is wall1.cached_plane()
+
+        # The mirrored wall should not share the cache.
+        mirrored = wall1.mirror()
+        assert np.asarray(mirrored.unit_normal) == pytest.approx([0.0, 0.0, -1.0])
+
+    def test_tabulate(self, wall1):
+        cos_angle = np.linspace(-1.0, 1.0, 101)
+        exact = wall1.reflection(cos_angle)
+        assert wall1.reflection_table is None
+        
+        table = wall1.tabulate(bins=256, tolerance=1e-6)
+        assert wall1.reflection_table is table
+        assert wall1.reflection(cos_angle) == pytest.approx(exact, abs=1e-6)
+        
+        # The mirrored wall keeps using the table.
+        assert wall1.mirror().reflection_table is table
+
+    def test_hash(self, wall1, impedance1):
+        copy = Wall(list(wall1.points), wall1.center, impedance1)
+        assert copy == wall1
+        assert hash(copy) == hash(wall1)
+        assert len({wall1, copy}) == 1
+        assert wall1.mirror() != wall1
+        
+        copy.impedance = impedance1 * 2.0
+        assert copy != wall1
+    
+    def test_hash_negative_zero(self, wall1, impedance1):
+        """Coordinates of -0.0 and 0.0 are equal, so the walls and their hashes are equal.
+        """
+        negative = Wall([Point(-0.0, 0.0, -0.0), Point(1.0, -0.0, 0.0), Point(1.0, 1.0, -0.0), Point(-0.0, 1.0, 0.0)], wall1.center, impedance1)
+        assert negative == wall1
+        assert hash(negative) == hash(wall1)
+        assert len({wall1, negative}) == 1
+
 class TestConcave:
     """Tests for :class:`ism.Model`.
     """
@@ -112,9 +153,96 @@ class TestConcave:
             assert(mirror.effective.all() == True )
 
 
+    @pytest.mark.parametrize("engine", Model.ENGINES)
+    def test_single_surface_truncation(self, wall1, engine):
+        """
+        A model with a single surface. The mirror source is too weak or too far away and thus dropped.
+        """
+        S = [Point(0.7, 0.5, 0.5)]
+        R = [Point(0.7, 0.5, 0.9)]
+        
+        model = Model([wall1], S, R, max_order=3, engine=engine)
+        assert len(list(model.mirrors())) == 2
+        
+        # The reflection coefficient at normal incidence has a magnitude of 0.447.
+        model.min_amplitude = 0.5
+        assert len(list(model.mirrors())) == 1
+        assert model.pruned['amplitude'] == 1
+        
+        model.min_amplitude = 0.4
+        assert len(list(model.mirrors())) == 2
+        assert model.pruned['amplitude'] == 0
+        
+        model.max_distance = 1.0
+        assert len(list(model.mirrors())) == 1
+        assert model.pruned['distance'] == 1
+        assert model.stats.pruned[1, 'distance'] == 1
+        assert model.stats.generated[1] == 0
+    
+    @pytest.mark.parametrize("engine", Model.ENGINES)
+    def test_trace(self, wall1, engine, caplog):
+        """
+        Decisions are only logged when tracing is enabled.
+        """
+        S = [Point(0.7, 0.5, 0.5)]
+        R = [Point(0.7, 0.5, 0.9)]
+        
+        with caplog.at_level(logging.DEBUG, logger='ism._stats'):
+            list(Model([wall1], S, R, max_order=2, engine=engine).mirrors())
+            assert not caplog.records
+            model = Model([wall1], S, R, max_order=2, engine=engine)
+            list(model.mirrors(trace=True))
+            assert caplog.records
+        assert model.stats.generated == {1: 1, 2: 0}
+        assert model.stats.by_order() == {2: 1}
+
+    
+    def test_streaming(self, wall1):
+        """
+        An order is yielded before the next order is generated.
+        """
+        S = Point(0.7, 0.5, 0.5)
+        R = Point(0.7, 0.5, 0.9)
+        stats = Statistics()
+        mirrors = ism([wall1], S, R, max_order=2, stats=stats)
+        assert next(mirrors).order == 0
+        assert not stats.generated
+        assert next(mirrors).order == 1
+        assert stats.generated == {1: 1}
+        assert list(mirrors) == []
+        assert stats.generated == {1: 1, 2: 0}
+    
+    def test_wall_index(self, wall1):
+        """
+        Mirror sources refer to their generating wall by index.
+        """
+        S = [Point(0.7, 0.5, 0.5)]
+        R = [Point(0.7, 0.5, 0.9)]
+        for engine in Model.ENGINES:
+            mirrors = list(Model([wall1], S, R, max_order=2, engine=engine).mirrors())
+            assert [mirror.wall_index for mirror in mirrors] == [-1, 0]
+
+
 class TestConvex:
     pass
 
+def test_effectiveness_many_receivers(wall1, impedance1):
+    """
+    The vectorized test should give the same result as testing receiver by receiver.
+    """
+    source = Point(0.7, 0.5, 0.5)
+    mirror = Point(0.7, 0.5, -0.5)
+    receivers = [Point(0.3, 0.501, 0.501), Point(0.5, 0.5, 0.2), Point(0.3, 0.5, -0.2), Point(5.0, 0.5, 0.2)]
+    mother_strength = np.ones((len(receivers), len(impedance1)), dtype='complex128')
+    
+    effective, strength, distance = test_effectiveness_many([wall1], source, np.array([tuple(r) for r in receivers]), mirror, wall1, mother_strength)
+    
+    for t, receiver in enumerate(receivers):
+        e, s, d = test_effectiveness([wall1], source, receiver, mirror, wall1, mother_strength[t])
+        assert effective[t] == e
+        assert strength[t] == pytest.approx(s)
+        assert distance[t] == pytest.approx(d)
+
 def test_pickle(impedance1):
     corners1 = [ Point(0.0, 0.0, 0.0), Point(1.0, 0.0, 0.0), Point(1.0, 1.0, 0.0), Point(0.0, 1.0, 0.0) ]
     wall = Wall(corners1, Point(0.5, 0.5, 0.0), impedance1)
@@ -127,3 +255,108 @@ def test_pickle(impedance1):
             wall2 = pickle.load(f)
 
         assert wall2 == wall
+
+
+def test_effectiveness_parallel_receivers(wall1, impedance1):
+    """
+    The parallel kernel should agree with the vectorized test up to rounding and be bit-identical for any amount of threads.
+    """
+    source = Point(0.7, 0.5, 0.5)
+    mirror = Point(0.7, 0.5, -0.5)
+    receivers = np.random.RandomState(0).uniform(-0.5, 1.5, size=(1000, 3))
+    mother_strength = np.ones((len(receivers), len(impedance1)), dtype='complex128')
+    
+    expected = test_effectiveness_many([wall1], source, receivers, mirror, wall1, mother_strength)
+    serial = test_effectiveness_parallel([wall1], source, receivers, mirror, wall1, mother_strength, 1)
+    parallel = test_effectiveness_parallel([wall1], source, receivers, mirror, wall1, mother_strength, 4)
+    
+    assert (serial[0] == expected[0]).all()
+    assert serial[1] == pytest.approx(expected[1])
+    assert serial[2] == pytest.approx(expected[2])
+    for a, b in zip(serial, parallel):
+        assert (a == b).all()
+    
+    # Single precision is multiplied in double precision and stored in single precision.
+    single = test_effectiveness_parallel([wall1], source, receivers, mirror, wall1, mother_strength.astype('complex64'), 4)
+    assert single[1].dtype == np.complex64
+    assert (single[1] == serial[1].astype('complex64')).all()
+    
+    shadowed = is_shadowed_parallel(source, receivers, [wall1], 1)
+    assert (shadowed == is_shadowed_parallel(source, receivers, [wall1], 4)).all()
+
+
+def test_determine_threads(wall1, impedance1):
+    """
+    The serial and the parallel path of :meth:`ism.Model.determine` share a kernel and are bit-identical, also with a reflection table.
+    """
+    source = Point(0.7, 0.5, 0.5)
+    receivers = np.random.RandomState(0).uniform(-0.5, 1.5, size=(100, 3))
+    receivers[:, 2] = np.abs(receivers[:, 2]) + 0.1
+    wall2 = Wall([Point(0.0, 0.0, 2.0), Point(0.0, 1.0, 2.0), Point(1.0, 1.0, 2.0), Point(1.0, 0.0, 2.0)], Point(0.5, 0.5, 2.0), impedance1 * 3.0)
+    wall2.tabulate()
+    model = Model([wall1, wall2], [source], receivers, max_order=3)
+    
+    serial = list(model.determine())
+    for num_threads in (1, 4):
+        parallel = list(model.determine(num_threads=num_threads))
+        assert len(parallel) == len(serial)
+        for a, b in zip(serial, parallel):
+            assert (a.effective == b.effective).all()
+            assert (a.strength == b.strength).all()
+            assert (a.distance == b.distance).all()
+    
+    # The table of the second wall is used by both paths.
+    second = [mirror for mirror in serial if mirror.order == 1 and mirror.wall_index == 1][0]
+    line_of_sight = receivers - np.array(tuple(source))
+    cos_angle = line_of_sight.dot(np.asarray(wall2.unit_normal)) / np.linalg.norm(line_of_sight, axis=-1)
+    assert second.strength == pytest.approx(wall2.reflection_table(cos_angle))
+
+
+def test_strongest_memory(walls1):
+    """
+    With a selection of the strongest mirror sources only the strengths of the kept mirror sources stay in memory.
+    """
+    S = [Point(0.9, 0.5, 0.5)]
+    R = np.random.RandomState(0).uniform(0.1, 0.9, (10, 3))
+    model = Model(walls1, S, R, max_order=4)
+    references = []
+    peak = 0
+    
+    def track(mirrors):
+        nonlocal peak
+        for mirror in mirrors:
+            references.append(weakref.ref(mirror.strength))
+            yield mirror
+            peak = max(peak, sum(reference() is not None for reference in references))
+    
+    result = list(model._strongest(track(model._determine(model.mirrors())), 5))
+    expected = list(Model(walls1, S, R, max_order=4).determine())
+    assert len(references) == len(expected) > 50
+    # The kept mirror sources, the last one that was offered and the mother that is referenced by the kernel.
+    assert peak <= 5 + 2
+    
+    expected = sorted(np.abs(mirror.strength).max() for mirror in expected)[::-1][:5]
+    assert [np.abs(mirror.strength).max() for mirror in result] == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("inwards", [True, False])
+def test_effectiveness_orientation(walls1, inwards):
+    """
+    The array kernels should agree with the predicates of :mod:`geometry` for both orientations of the vertices.
+    """
+    walls = walls1 if inwards else [wall.mirror() for wall in walls1]
+    source = Point(0.7, 0.4, 0.3)
+    receivers = np.random.RandomState(0).uniform(-0.5, 1.5, size=(200, 3))
+    points = [Point(*receiver) for receiver in receivers]
+    
+    for wall in walls:
+        mirror = source.mirror_with(wall.cached_plane())
+        mother_strength = np.ones((len(receivers), len(wall.impedance)), dtype='complex128')
+        many = test_effectiveness_many(walls, source, receivers, mirror, wall, mother_strength)
+        parallel = test_effectiveness_parallel(walls, source, receivers, mirror, wall, mother_strength, 4)
+        serial = [test_effectiveness(walls, source, point, mirror, wall, mother_strength[t]) for t, point in enumerate(points)]
+        assert [e for e, s, d in serial] == list(many[0]) == list(parallel[0])
+        assert np.array([s for e, s, d in serial]) == pytest.approx(parallel[1])
+    
+    shadowed = [is_shadowed(source, point, walls) for point in points]
+    assert shadowed == list(is_shadowed_parallel(source, receivers, walls, 4))
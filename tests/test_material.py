@@ -0,0 +1,108 @@
+"""
+Tests for :mod:`ism._material`.
+"""
+import pytest
+import numpy as np
+from ism import Model, Wall
+from ism._material import Materials
+from ism._ism import reflection_magnitude
+from geometry import Point
+
+
+class TestMaterials:
+    """Tests for :class:`ism._material.Materials`.
+    """
+
+    def test_from_walls(self, walls2, impedance2):
+        walls2[5].impedance = impedance2 * 2.0
+        materials = Materials.from_walls(walls2)
+        assert materials.impedance.shape == (6, 10)
+        assert materials.impedance.flags.c_contiguous
+        assert materials.n_bands == 10
+        assert materials.frequencies is None
+        assert materials.impedance[0] == pytest.approx(impedance2)
+        assert materials.impedance[5] == pytest.approx(impedance2 * 2.0)
+
+    def test_resample(self, walls2):
+        """Walls with their own frequencies are interpolated onto the common grid.
+        """
+        frequencies = np.linspace(100.0, 1000.0, 10)
+        for wall in walls2:
+            wall.frequencies = frequencies
+        walls2[0].impedance = np.array([2.0+1.0j, 11.0+4.0j])
+        walls2[0].frequencies = np.array([100.0, 1000.0])
+
+        materials = Materials.from_walls(walls2, frequencies)
+        assert materials.frequencies == pytest.approx(frequencies)
+        assert materials.impedance[0] == pytest.approx((frequencies - 100.0) / 100.0 + 2.0 + 1.0j + 3.0j * (frequencies - 100.0) / 900.0)
+        assert materials.impedance[1] == pytest.approx(walls2[1].impedance)
+
+    def test_invalid(self, walls2):
+        walls2[3].impedance = walls2[3].impedance[:5]
+        with pytest.raises(ValueError):
+            Materials.from_walls(walls2)
+        walls2[3].impedance = np.full(10, np.nan, dtype='complex128')
+        with pytest.raises(ValueError):
+            Materials.from_walls(walls2)
+        with pytest.raises(ValueError):
+            Model(walls2, [Point(1.0, 1.0, 1.0)], [Point(0.5, 0.5, 0.5)])
+
+    def test_reflection(self, walls2, receivers1):
+        """The reflection coefficients of all walls equal those of the individual walls, also with a table.
+        """
+        walls2[2].tabulate()
+        materials = Materials.from_walls(walls2)
+        cos_angle = np.random.RandomState(1).uniform(-1.0, 1.0, (6, len(receivers1)))
+        refl = materials.reflection(cos_angle)
+        assert refl.shape == (6, len(receivers1), 10)
+        for i, wall in enumerate(walls2):
+            assert refl[i] == pytest.approx(wall.reflection(cos_angle[i]))
+        assert materials.reflection(cos_angle, [1, 4]) == pytest.approx(refl[..., [1, 4]])
+
+    def test_model_tables(self, walls2):
+        """Tabulating a wall after the model is created is picked up by the model.
+        """
+        model = Model(walls2, [Point(0.9, 0.5, 0.5)], [Point(0.5, 0.5, 0.5)])
+        assert model.materials.tables[2] is None
+        table = walls2[2].tabulate()
+        assert model.materials.tables[2] is table
+
+    def test_reflection_magnitude(self, walls2, receivers1):
+        """The bound of the amplitude truncation follows from the impedance on the common frequency grid.
+        """
+        S = Point(0.9, 0.5, 0.5)
+        frequencies = np.linspace(100.0, 500.0, 5)
+        for wall in walls2:
+            wall.impedance = wall.impedance[:5]
+        walls2[0].impedance = np.array([2.0+1.0j, 50.0+1.0j])
+        walls2[0].frequencies = np.array([100.0, 1000.0])
+        model = Model(walls2, [S], receivers1, max_order=2, min_amplitude=0.1, frequencies=frequencies)
+        
+        line_of_sight = receivers1 - np.array(tuple(S))
+        line_of_sight /= np.linalg.norm(line_of_sight, axis=-1)[:, None]
+        cos_angle = np.dot(np.array([np.asarray(wall.unit_normal) for wall in walls2]), line_of_sight.T)
+        gain = reflection_magnitude(walls2, S, receivers1, model.materials)
+        assert gain == pytest.approx(np.abs(model.materials.reflection(cos_angle)).max(axis=-1))
+        # The impedance of the first wall above the grid is not part of the bound.
+        assert (gain[0] < np.abs(walls2[0].reflection(cos_angle[0])).max(axis=-1)).all()
+        assert len(model.mirror_tree()) > 1
+
+    def test_strength(self, walls2, receivers1):
+        """Gathering the reflection coefficients along the chains gives the strength of the mirror sources.
+        """
+        S = Point(0.9, 0.5, 0.5)
+        model = Model(walls2, [S], receivers1, max_order=2)
+        table = model.determine(table=True)
+        chains = np.full((len(table), 2), -1, dtype='int64')
+        mother = table.tree.mother
+        for i, index in enumerate(table.index):
+            k = 1
+            while index > 0:
+                chains[i, k] = table.tree.wall[index]
+                index, k = mother[index], k - 1
+
+        line_of_sight = receivers1 - np.array(tuple(S))
+        line_of_sight /= np.linalg.norm(line_of_sight, axis=-1)[:, None]
+        normals = np.array([np.asarray(wall.unit_normal) for wall in walls2])
+        refl = model.materials.reflection(np.dot(normals, line_of_sight.T))
+        assert Materials.strength(refl, chains) == pytest.approx(table.strength)
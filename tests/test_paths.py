@@ -0,0 +1,50 @@
+"""
+Tests for :mod:`ism._paths`.
+"""
+import pytest
+import numpy as np
+from ism import Model, Wall, MirrorTree
+from ism._paths import chains
+from geometry import Point
+
+
+class TestPaths:
+    """Tests for :mod:`ism._paths`.
+    """
+
+    def test_chains(self, walls2):
+        tree = MirrorTree.generate(walls2, Point(0.9, 0.5, 0.5), max_order=3)
+        index = np.arange(len(tree))[tree.order_slice(3)]
+        chain = chains(tree.mother, tree.wall, index)
+        assert chain.shape == (len(index), 3)
+        assert (chain[:, 0] == index).all()
+        assert (chain[:, 1] == tree.mother[index]).all()
+        assert (tree.order[chain[:, 2]] == 1).all()
+
+    def test_validate(self, walls2, receivers1):
+        """In a shoebox every mirror source position can be reached by at most one valid path.
+        """
+        tree = MirrorTree.generate(walls2, Point(0.9, 0.5, 0.5), max_order=4)
+        valid = tree.validate(receivers1, chunk_size=50)
+        assert valid.shape == (len(tree), len(receivers1))
+        assert valid[0].all()
+        assert (valid[tree.order_slice(1)]).all()
+        for r in range(len(receivers1)):
+            positions = np.round(tree.positions[valid[:, r]], 6)
+            assert len(np.unique(positions, axis=0)) == len(positions)
+
+    @pytest.mark.parametrize("engine", Model.ENGINES)
+    def test_model(self, walls2, receivers1, engine):
+        """Validation only removes effective mirror sources.
+        """
+        S = [Point(0.9, 0.5, 0.5)]
+        R = [Point(*receiver) for receiver in receivers1]
+        model = Model(walls2, S, R, max_order=3, engine=engine)
+        effective = np.array([mirror.effective for mirror in model.determine()])
+        validated = np.array([mirror.effective for mirror in model.determine(validate=True)])
+        assert (validated <= effective).all()
+        assert validated.sum() < effective.sum()
+        
+        if engine == 'tree':
+            tree = model.mirror_tree()
+            assert (validated.astype(bool) == (tree.validate(receivers1) & effective.astype(bool))).all()
@@ -0,0 +1,50 @@
+"""
+Tests for :mod:`ism._reflection`.
+"""
+import pytest
+import numpy as np
+from ism._reflection import ReflectionTable, reflection_coefficient
+
+@pytest.fixture
+def impedance1():
+    return np.array([1.0+1.0j, 5.0+0.1j, 40.0, 2.0-3.0j])
+
+@pytest.fixture
+def cos_angle1():
+    return np.random.RandomState(0).uniform(-1.0, 1.0, (50, 20))
+
+
+class TestReflectionTable:
+    """Tests for :class:`ism._reflection.ReflectionTable`.
+    """
+
+    def test_interpolation(self, impedance1, cos_angle1):
+        """Bins close to a pole fall back to the exact reflection coefficient.
+        """
+        table = ReflectionTable(impedance1, bins=1024, tolerance=1e-4)
+        assert table.exact.any()
+        refl = table(cos_angle1)
+        assert refl.shape == (50, 20, 4)
+        assert np.abs(refl - reflection_coefficient(impedance1, cos_angle1)).max() < 1e-4
+        assert table(0.3) == pytest.approx(reflection_coefficient(impedance1, 0.3), abs=1e-4)
+
+    def test_edges(self, impedance1):
+        table = ReflectionTable(impedance1, bins=16, tolerance=None)
+        assert table(-1.0) == pytest.approx(reflection_coefficient(impedance1, -1.0))
+        assert table(1.0) == pytest.approx(reflection_coefficient(impedance1, 1.0))
+        
+        with pytest.raises(ValueError):
+            ReflectionTable(impedance1, bins=1)
+
+    def test_bands(self, impedance1, cos_angle1):
+        table = ReflectionTable(impedance1)
+        assert table(cos_angle1, [1, 3]) == pytest.approx(table(cos_angle1)[..., [1, 3]])
+
+    def test_memoized(self, impedance1):
+        table = ReflectionTable.from_impedance(impedance1)
+        assert ReflectionTable.from_impedance(impedance1.copy()) is table
+        assert ReflectionTable.from_impedance(impedance1, bins=64) is not table
+        for i in range(ReflectionTable.MAX_TABLES):
+            ReflectionTable.from_impedance(impedance1 + i + 1.0)
+        assert len(ReflectionTable._tables) <= ReflectionTable.MAX_TABLES
+        assert ReflectionTable.from_impedance(impedance1) is not table
@@ -0,0 +1,67 @@
+"""
+Tests for :mod:`ism._response`.
+"""
+import pytest
+import numpy as np
+from ism import Model, Wall
+from ism._response import band_masks, place, impulse_response
+from geometry import Point
+
+
+class TestImpulseResponse:
+    """Tests for :func:`ism._response.impulse_response`.
+    """
+
+    def test_band_masks(self):
+        """Every frequency bin belongs to exactly one band.
+        """
+        masks = band_masks([125.0, 250.0, 500.0, 1000.0], 8000.0, 64)
+        assert masks.shape == (4, 33)
+        assert (masks.sum(axis=0) == 1.0).all()
+        
+        with pytest.raises(ValueError):
+            band_masks([250.0, 125.0], 8000.0, 64)
+
+    def test_place(self):
+        """A fractional delay is divided over the neighbouring samples.
+        """
+        signals = np.zeros((2, 1, 8), dtype='complex128')
+        place(signals, np.array([[2.25, 7.5]]), np.ones((1, 2, 1)))
+        assert signals[0, 0, 2:4] == pytest.approx([0.75, 0.25])
+        assert signals[1, 0, 7] == pytest.approx(0.5)
+        assert signals.sum() == pytest.approx(1.5)
+
+    def test_single_surface(self, impedance1):
+        """The direct sound and the reflection arrive at their delay and are attenuated with distance.
+        """
+        P = Point
+        walls = [Wall([P(0.0, 0.0, 0.0), P(1.0, 0.0, 0.0), P(1.0, 1.0, 0.0), P(0.0, 1.0, 0.0)], P(0.5, 0.5, 0.0), impedance1)]
+        model = Model(walls, [P(0.7, 0.5, 0.5)], [P(0.7, 0.5, 0.9)], max_order=1)
+        
+        response = model.impulse_response(3430.0, c=343.0, length=32)
+        reflection = (impedance1[0] - 1.0) / (impedance1[0] + 1.0)
+        assert response.shape == (1, 32)
+        assert response[0, 4] == pytest.approx(1.0 / 0.4)
+        assert response[0, 14] == pytest.approx(reflection.real / 1.4)
+        
+        with pytest.raises(ValueError):
+            model.impulse_response(3430.0)
+        
+        # The table of a moving source is a list of tables.
+        model.source = [P(0.7, 0.5, 0.5), P(0.6, 0.5, 0.5)]
+        with pytest.raises(ValueError):
+            model.impulse_response(3430.0, length=32, table=True)
+
+    def test_bands(self, walls1):
+        """Filtering the bands of a chunk at a time gives the sum of the band filtered responses.
+        """
+        model = Model(walls1, [Point(0.9, 0.5, 0.5)], [Point(0.1, 0.501, 0.501), Point(0.3, 0.2, 0.6)], max_order=3)
+        frequencies = np.array([125.0, 250.0, 500.0, 1000.0, 2000.0, 3000.0, 4000.0, 5000.0, 6000.0, 7000.0])
+        mirrors = list(model.determine())
+        response = impulse_response(mirrors, 2, 10, 16000.0, 256, frequencies=frequencies, chunk_size=7)
+        
+        signals = np.zeros((2, 10, 256), dtype='complex128')
+        for mirror in mirrors:
+            place(signals, mirror.distance[None] * 16000.0 / 343.0, (mirror.strength * (mirror.effective / mirror.distance)[:, None])[None])
+        spectrum = np.fft.fft(signals, axis=-1)[..., :129] * band_masks(frequencies, 16000.0, 256)
+        assert response == pytest.approx(np.fft.irfft(spectrum.sum(axis=-2), n=256, axis=-1))
@@ -0,0 +1,49 @@
+"""
+Tests for :mod:`ism._selection`.
+"""
+import pytest
+import numpy as np
+from heapq import nlargest
+from ism import Mirror
+from ism._selection import Strongest
+from geometry import Point
+
+@pytest.fixture
+def mirrors():
+    state = np.random.RandomState(1)
+    mirrors = list()
+    for i in range(100):
+        mirror = Mirror(Point(float(i), 0.0, 0.0), None, None, 0)
+        mirror.strength = state.randn(4, 3) + 1j*state.randn(4, 3)
+        mirrors.append(mirror)
+    return mirrors
+
+
+class TestStrongest:
+    """Tests for :class:`ism._selection.Strongest`.
+    """
+
+    def test_mirror(self, mirrors):
+        expected = nlargest(10, mirrors, key=lambda x: np.abs(x.strength).max())
+        result = Strongest(10).extend(mirrors).result()
+        assert result == expected
+        
+        # The arrays of the dropped mirror sources are released.
+        assert sum(mirror.strength is not None for mirror in mirrors) == 10
+
+    def test_receiver(self, mirrors):
+        strengths = [np.abs(mirror.strength).max(axis=-1) for mirror in mirrors]
+        expected = set()
+        for receiver in range(4):
+            expected.update(nlargest(3, range(len(mirrors)), key=lambda i: strengths[i][receiver]))
+        
+        result = Strongest(3, rank='receiver').extend(mirrors).result()
+        assert set(mirrors.index(mirror) for mirror in result) == expected
+
+    def test_threshold(self, mirrors):
+        result = Strongest(10, threshold=3.5).extend(mirrors).result()
+        assert all(np.abs(mirror.strength).max() >= 3.5 for mirror in result)
+
+    def test_rank(self):
+        with pytest.raises(ValueError):
+            Strongest(10, rank='unknown')
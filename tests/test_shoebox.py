@@ -0,0 +1,90 @@
+"""
+Tests for :mod:`ism._shoebox`.
+"""
+import pytest
+import numpy as np
+from ism import Model, ShoeboxModel, Wall, MirrorTree
+from ism._shoebox import Shoebox
+from ism._topology import Topology
+from ism._tree import Evaluation
+from geometry import Point
+
+
+class TestShoebox:
+    """Tests for :class:`ism._shoebox.Shoebox`.
+    """
+
+    def test_from_walls(self, walls2):
+        shoebox = Shoebox.from_walls(walls2)
+        assert shoebox.lower == pytest.approx([0.0, 0.0, 0.0])
+        assert shoebox.upper == pytest.approx([3.0, 2.0, 1.5])
+        assert sorted(shoebox.index.ravel()) == list(range(6))
+        assert Shoebox.from_walls(walls2[:5]) is None
+        assert Shoebox.from_walls(walls2[:5] + walls2[:1]) is None
+
+    def test_tree(self, walls2):
+        """Every mirror source is its mother mirrored with its generating wall.
+        """
+        S = Point(0.9, 0.5, 0.5)
+        tree = Shoebox.from_walls(walls2).tree(S, max_order=4)
+        assert len(tree) == 1 + 6 + 18 + 38 + 66
+        assert (tree.order[tree.mother[1:]] == tree.order[1:] - 1).all()
+        for index in range(1, len(tree)):
+            position = Point(*tree.positions[tree.mother[index]]).mirror_with(walls2[tree.wall[index]].cached_plane())
+            assert tuple(position) == pytest.approx(tree.positions[index])
+
+    def test_general(self, walls2, receivers1):
+        """The lattice holds the mirror sources with a valid path, with the same strength.
+        """
+        S = Point(0.9, 0.5, 0.5)
+        shoebox = Shoebox.from_walls(walls2)
+        tree = shoebox.tree(S, max_order=3)
+        table = shoebox.evaluate(tree, S, receivers1)
+        assert table.effective.all()
+
+        general = MirrorTree.from_topology(Topology.from_walls(walls2, max_order=3), S)
+        valid = general.validate(receivers1)
+        strength = Evaluation(general, S).update(receivers1).strength
+        b = np.lexsort(np.round(table.positions, 6).T)
+        for receiver in range(len(receivers1)):
+            index = np.flatnonzero(valid[:, receiver])
+            a = index[np.lexsort(np.round(general.positions[index], 6).T)]
+            assert general.positions[a] == pytest.approx(table.positions[b])
+            assert strength[a, receiver] == pytest.approx(table.strength[b, receiver])
+
+    def test_truncation(self, walls2, receivers1):
+        """Truncated mirror sources are dropped together with their descendants.
+        """
+        S = Point(0.9, 0.5, 0.5)
+        tree = Shoebox.from_walls(walls2).tree(S, max_order=4, receiver_positions=receivers1, max_distance=6.0)
+        assert len(tree) < 1 + 6 + 18 + 38 + 66
+        assert (tree.mother[1:] < np.arange(1, len(tree))).all()
+        distance = np.linalg.norm(tree.positions[:, None] - receivers1[None], axis=-1)
+        assert (distance.min(axis=-1) <= 6.0).all()
+
+    def test_model(self, walls2, receivers1):
+        S = [Point(0.9, 0.5, 0.5)]
+        model = ShoeboxModel(walls2, S, receivers1, max_order=3)
+        table = model.determine(table=True)
+        mirrors = list(model.determine())
+        assert len(mirrors) == len(table) == 1 + 6 + 18 + 38
+        assert mirrors[5].strength == pytest.approx(table.strength[5])
+        assert len(model.determine(table=True, strongest=5)) == 5
+
+        with pytest.raises(ValueError):
+            ShoeboxModel(walls2[:5], S, receivers1)
+
+    def test_update_receiver(self, walls2, receivers1):
+        """Updating the receiver positions gives the same table as determining it.
+        """
+        S = [Point(0.9, 0.5, 0.5)]
+        model = ShoeboxModel(walls2, S, receivers1, max_order=3)
+        tree = model.mirror_tree()
+        for receivers in (receivers1, receivers1 + 0.05):
+            table = model.update_receiver(receivers)
+            assert model.mirror_tree() is tree
+            expected = model.determine(table=True)
+            assert table.effective.all()
+            assert (table.effective == expected.effective).all()
+            assert table.distance == pytest.approx(expected.distance)
+            assert table.strength == pytest.approx(expected.strength)
@@ -0,0 +1,89 @@
+"""
+Tests for :mod:`ism._store`.
+"""
+import os
+import pytest
+import numpy as np
+from ism import Model, ShoeboxModel, Wall, MirrorTree, MirrorTable
+from ism._store import key, TREE_COLUMNS
+from geometry import Point
+
+
+class TestStore:
+    """Tests for :mod:`ism._store`.
+    """
+
+    def test_key(self, walls1):
+        S = Point(0.9, 0.5, 0.5)
+        assert key(walls1, S, 3) == key(walls1, S, 3)
+        assert key(walls1, S, 3) != key(walls1, S, 4)
+        assert key(walls1, S, 3) != key(walls1, Point(0.8, 0.5, 0.5), 3)
+        assert key(walls1, S, 3) != key(walls1[:-1], S, 3)
+        assert key(walls1, S, 3, [S], max_distance=2.0) != key(walls1, S, 3, [S], max_distance=3.0)
+        assert key(walls1, S, 3, generator='Model') != key(walls1, S, 3, generator='ShoeboxModel')
+        assert key(walls1, S, 3) != key(walls1, S, 3, frequencies=np.arange(10.0))
+        
+        # The materials change the amplitude truncation.
+        reference = key(walls1, S, 3)
+        walls1[0].frequencies = np.arange(10.0)
+        assert key(walls1, S, 3) != reference
+        walls1[0].frequencies = None
+        walls1[1].tabulate()
+        assert key(walls1, S, 3) != reference
+
+    def test_tree(self, walls1, tmpdir):
+        tree = MirrorTree.generate(walls1, Point(0.9, 0.5, 0.5), max_order=3)
+        path = str(tmpdir.join('tree'))
+        tree.save(path, key='a')
+        loaded = MirrorTree.load(path, walls1, key='a')
+        assert isinstance(loaded.positions, np.memmap)
+        for name in TREE_COLUMNS:
+            assert (getattr(loaded, name) == getattr(tree, name)).all()
+        assert loaded.mirror(len(tree)-1).order == 3
+        
+        with pytest.raises(ValueError):
+            MirrorTree.load(path, walls1, key='b')
+
+    def test_table(self, walls1, tmpdir):
+        model = Model(walls1, [Point(0.9, 0.5, 0.5)], [Point(0.1, 0.501, 0.501)], max_order=3)
+        table = model.determine(table=True).where(effective=True)
+        path = str(tmpdir.join('table'))
+        table.save(path)
+        loaded = MirrorTable.load(path, walls1)
+        assert len(loaded) == len(table)
+        assert loaded.strength == pytest.approx(table.strength)
+        assert (loaded.order == table.order).all()
+
+    def test_model(self, walls1, tmpdir):
+        """A second model with the same input loads the stored tree.
+        """
+        S = [Point(0.9, 0.5, 0.5)]
+        R = [Point(0.1, 0.501, 0.501)]
+        first = Model(walls1, S, R, max_order=3, engine='tree', directory=str(tmpdir))
+        tree = first.mirror_tree()
+        assert os.listdir(str(tmpdir)) == [first.key()]
+        
+        second = Model(walls1, S, R, max_order=3, engine='tree', directory=str(tmpdir))
+        loaded = second.mirror_tree()
+        assert isinstance(loaded.positions, np.memmap)
+        assert (loaded.positions == tree.positions).all()
+        assert len(list(second.mirrors())) == len(tree)
+
+    def test_generators(self, walls2, tmpdir):
+        """A general and a shoebox model that share a directory each store their own tree.
+        """
+        S = [Point(0.9, 0.5, 0.5)]
+        R = [Point(2.1, 1.5, 0.5)]
+        general = Model(walls2, S, R, max_order=3, engine='tree', directory=str(tmpdir))
+        shoebox = ShoeboxModel(walls2, S, R, max_order=3, directory=str(tmpdir))
+        assert general.key() != shoebox.key()
+        
+        expected = general.mirror_tree()
+        lattice = shoebox.mirror_tree()
+        assert sorted(os.listdir(str(tmpdir))) == sorted([general.key(), shoebox.key()])
+        assert len(lattice) == len(Model(walls2, S, R, max_order=3).shoebox.tree(S[0], 3))
+        
+        loaded = Model(walls2, S, R, max_order=3, engine='tree', directory=str(tmpdir)).mirror_tree()
+        assert (loaded.positions == expected.positions).all()
+        loaded = ShoeboxModel(walls2, S, R, max_order=3, directory=str(tmpdir)).mirror_tree()
+        assert (loaded.positions == lattice.positions).all()
@@ -0,0 +1,67 @@
+"""
+Tests for :mod:`ism._stream`.
+"""
+import asyncio
+import pytest
+import numpy as np
+from ism import Model, Wall
+from geometry import Point
+
+@pytest.fixture
+def updates1():
+    state = np.random.RandomState(0)
+    return [state.uniform(0.1, 0.9, (4, 3)) for _ in range(5)]
+
+
+def collect(frames):
+    async def run():
+        return [frame async for frame in frames]
+    return asyncio.run(run())
+
+
+class TestStream:
+    """Tests for :func:`ism._stream.stream`.
+    """
+
+    def test_frames(self, walls1, updates1):
+        """Every update gives a frame when the updates wait for the frames, and the frames equal :meth:`ism.Model.determine`.
+        """
+        S = [Point(0.9, 0.5, 0.5)]
+        model = Model(walls1, S, updates1[0], max_order=2, engine='tree')
+
+        async def run():
+            queue = asyncio.Queue()
+            async def updates():
+                while True:
+                    receiver = await queue.get()
+                    if receiver is None:
+                        return
+                    yield receiver
+            frames = []
+            await queue.put(updates1[0])
+            async for frame in model.stream(updates()):
+                frames.append(frame)
+                await queue.put(updates1[len(frames)] if len(frames) < len(updates1) else None)
+            return frames
+
+        frames = asyncio.run(run())
+        tree = model.mirror_tree()
+        assert [frame.index for frame in frames] == list(range(len(updates1)))
+        assert [frame.dropped for frame in frames] == [0] * len(updates1)
+        assert all(frame.latency >= 0.0 for frame in frames)
+        for frame, receiver in zip(frames, updates1):
+            assert frame.table.tree is tree
+            expected = Model(walls1, S, receiver, max_order=2, engine='tree').determine(table=True)
+            assert (frame.table.effective == expected.effective).all()
+            assert frame.table.strength == pytest.approx(expected.strength)
+
+    def test_stale(self, walls1, updates1):
+        """Updates that arrive at once are dropped except for the last one.
+        """
+        model = Model(walls1, [Point(0.9, 0.5, 0.5)], updates1[0], max_order=2, engine='tree')
+        frames = collect(model.stream(updates1, strongest=5))
+        assert len(frames) == 1
+        assert frames[0].index == len(updates1) - 1
+        assert frames[0].dropped == len(updates1) - 1
+        assert len(frames[0].table) == 5
+        assert np.asarray(frames[0].receiver) == pytest.approx(updates1[-1])
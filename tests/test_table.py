@@ -0,0 +1,87 @@
+"""
+Tests for :mod:`ism._table`.
+"""
+import pytest
+import numpy as np
+from ism import Model, Wall, Mirror, MirrorTable
+from geometry import Point
+
+@pytest.fixture
+def impedance1():
+    """Impedance that differs per band, used by :func:`walls1` in this module.
+    """
+    bands = 10
+    return np.linspace(1.0, 3.0, bands) + np.ones(bands)*1j
+
+@pytest.fixture
+def model1(walls1):
+    S = [Point(0.9, 0.5, 0.5)]
+    R = [Point(0.1, 0.501, 0.501), Point(0.3, 0.2, 0.6), Point(0.5, 0.8, 0.3)]
+    return Model(walls1, S, R, max_order=3, engine='tree')
+
+
+class TestMirrorTable:
+    """Tests for :class:`ism.MirrorTable`.
+    """
+
+    def test_determine(self, model1):
+        """The table holds the same results as the mirror sources.
+        """
+        table = model1.determine(table=True)
+        assert isinstance(table, MirrorTable)
+        mirrors = list(model1.determine())
+        assert len(table) == len(mirrors)
+        assert table.effective == pytest.approx(np.array([mirror.effective for mirror in mirrors]).astype(bool))
+        assert table.distance == pytest.approx(np.array([mirror.distance for mirror in mirrors]))
+        assert table.strength == pytest.approx(np.array([mirror.strength for mirror in mirrors]))
+
+    def test_indexing(self, model1):
+        table = model1.determine(table=True)
+        
+        mirror = table[5]
+        assert isinstance(mirror, Mirror)
+        assert mirror.order == table.order[5]
+        assert mirror.strength == pytest.approx(table.strength[5])
+        
+        part = table[2:8]
+        assert isinstance(part, MirrorTable)
+        assert list(part.index) == list(range(2, 8))
+        
+        mask = table.order == 2
+        assert (table[mask].order == 2).all()
+        assert len(table.where(order=2)) == mask.sum()
+        assert table.where(effective=True).effective.any(axis=-1).all()
+        assert len(table.where(effective=True)) + len(table.where(effective=False)) == len(table)
+
+    @pytest.mark.parametrize("rank", ['mirror', 'receiver', 'band'])
+    def test_strongest(self, model1, rank):
+        """The columnar selection gives the same mirror sources as the streaming selection.
+        """
+        table = model1.determine(table=True, strongest=5, rank=rank)
+        mirrors = list(model1.determine(strongest=5, rank=rank))
+        assert len(table) == len(mirrors)
+        assert table.strength == pytest.approx(np.array([mirror.strength for mirror in mirrors]))
+        
+        with pytest.raises(ValueError):
+            model1.determine(table=True).strongest(5, rank='unknown')
+
+    def test_precision(self, model1):
+        """Strengths of a subset of the bands in single precision.
+        """
+        bands = [0, 4, 9]
+        expected = model1.determine(table=True).strength[..., bands]
+        table = model1.determine(table=True, bands=bands, dtype='complex64')
+        assert table.strength.dtype == np.complex64
+        assert table.strength == pytest.approx(expected, rel=1e-5)
+        mirrors = list(model1.determine(bands=bands, dtype='complex64'))
+        assert np.array([mirror.strength for mirror in mirrors]) == pytest.approx(expected, rel=1e-5)
+        assert all(mirror.strength.dtype == np.complex64 for mirror in mirrors)
+
+    def test_strength_chunks(self, model1):
+        """Computing the strength per chunk of bands gives the same strength.
+        """
+        table = model1.determine(table=True, strongest=5)
+        index, chunks = model1.strength_chunks(chunk_size=4, index=table.index)
+        chunks = list(chunks)
+        assert [len(bands) for bands, strength in chunks] == [4, 4, 2]
+        assert np.concatenate([strength for bands, strength in chunks], axis=-1) == pytest.approx(table.strength)
@@ -0,0 +1,50 @@
+"""
+Tests for :mod:`ism._topology`.
+"""
+import pytest
+import numpy as np
+from ism import Model, Wall, MirrorTree
+from ism._topology import Topology
+from ism._geometry import WallArrays, mirror_points, reflection_matrices
+from geometry import Point
+
+
+class TestTopology:
+    """Tests for :class:`ism._topology.Topology`.
+    """
+
+    def test_reflection_matrices(self, walls2):
+        """The matrices mirror points like :func:`ism._geometry.mirror_points`.
+        """
+        arrays = WallArrays.from_walls(walls2)
+        matrices = reflection_matrices(arrays.normals, arrays.offsets)
+        point = np.array([0.3, 0.4, 0.5, 1.0])
+        expected = mirror_points(point[:3], arrays.normals, arrays.offsets)
+        assert np.einsum('wij,j->wi', matrices, point)[:, :3] == pytest.approx(expected)
+
+    def test_from_tree(self, walls2):
+        """The sequences of a tree reproduce its positions.
+        """
+        S = Point(0.9, 0.5, 0.5)
+        tree = MirrorTree.generate(walls2, S, max_order=3)
+        topology = Topology.from_tree(tree)
+        assert topology.positions(S) == pytest.approx(tree.positions)
+        assert topology.interior(tree.positions).all()
+
+    def test_from_walls(self, walls2, receivers1):
+        """In a shoebox every image of the lattice up to the maximum order has a valid path.
+        """
+        topology = Topology.from_walls(walls2, max_order=3)
+        assert len(topology) <= 1 + 6 + 6*5 + 6*5*5
+        for S in [Point(0.9, 0.5, 0.5), Point(2.5, 1.5, 1.2)]:
+            tree = MirrorTree.from_topology(topology, S)
+            assert (tree.validate(receivers1).sum(axis=0) == 1 + 6 + 18 + 38).all()
+
+    def test_model(self, walls2):
+        """The topology of a model is cached.
+        """
+        model = Model(walls2, [Point(0.9, 0.5, 0.5)], [Point(0.1, 0.5, 0.5)], max_order=2)
+        topology = model.topology
+        assert model.topology is topology
+        model.max_order = 3
+        assert model.topology.max_order == 3
@@ -0,0 +1,171 @@
+"""
+Tests for :mod:`ism._tree`.
+"""
+import pytest
+import numpy as np
+from ism import Model, Wall, MirrorTree, amount_of_sources
+from ism._tree import Evaluation
+from geometry import Point
+
+
+class TestMirrorTree:
+    """Tests for :class:`ism.MirrorTree`.
+    """
+
+    def test_single_surface(self, walls1):
+        """A single surface gives one mirror source.
+        """
+        tree = MirrorTree.generate(walls1[:1], Point(0.7, 0.5, 0.5), max_order=3)
+        assert len(tree) == 2
+        assert tree.positions[1] == pytest.approx([0.7, 0.5, -0.5])
+
+    def test_first_order(self, walls1):
+        """In a closed room every wall gives a first order mirror source.
+        """
+        tree = MirrorTree.generate(walls1, Point(0.9, 0.5, 0.5), max_order=1)
+        assert len(tree) == amount_of_sources(1, len(walls1))
+        assert (tree.mother[1:] == 0).all()
+        assert (tree.wall[1:] == np.arange(len(walls1))).all()
+
+    def test_chunk_size(self, walls1):
+        """The chunk size should not influence the result.
+        """
+        a = MirrorTree.generate(walls1, Point(0.9, 0.5, 0.5), max_order=3)
+        b = MirrorTree.generate(walls1, Point(0.9, 0.5, 0.5), max_order=3, chunk_size=7)
+        assert (a.positions == b.positions).all()
+        assert (a.mother == b.mother).all()
+        assert (a.wall == b.wall).all()
+
+    @pytest.mark.parametrize("split_order", [1, 2])
+    def test_workers(self, walls1, split_order):
+        """Generating the subtrees in worker processes should give the same tree.
+        """
+        a = MirrorTree.generate(walls1, Point(0.9, 0.5, 0.5), max_order=4)
+        b = MirrorTree.generate(walls1, Point(0.9, 0.5, 0.5), max_order=4, workers=2, split_order=split_order)
+        assert (a.positions == b.positions).all()
+        assert (a.mother == b.mother).all()
+        assert (a.wall == b.wall).all()
+        assert (a.order == b.order).all()
+
+    def test_mirror(self, walls1):
+        """Views link to their mothers.
+        """
+        tree = MirrorTree.generate(walls1, Point(0.9, 0.5, 0.5), max_order=2)
+        index = tree.order_slice(2).start
+        mirror = tree.mirror(index)
+        assert mirror.order == 2
+        assert mirror.mother.order == 1
+        assert mirror.wall == walls1[tree.wall[index]]
+
+    def test_model(self, walls1):
+        """Both engines should find the same amount of mirror sources.
+        """
+        S = [Point(0.9, 0.5, 0.5)]
+        R = [Point(0.1, 0.501, 0.501)]
+        mirrors_ism = list(Model(walls1, S, R, max_order=2).mirrors())
+        mirrors_tree = list(Model(walls1, S, R, max_order=2, engine='tree').mirrors())
+        assert len(mirrors_ism) == len(mirrors_tree)
+        
+        with pytest.raises(ValueError):
+            Model(walls1, S, R, engine='unknown')
+    
+    def test_update_receiver(self, walls1):
+        """Moving the receiver a little should only test the pairs that are close to the boundary of their visible region.
+        """
+        S = [Point(0.9, 0.5, 0.5)]
+        R = np.array([[0.1, 0.501, 0.501], [0.3, 0.2, 0.6]])
+        model = Model(walls1, S, R, max_order=3, engine='tree')
+        tree = model.mirror_tree()
+        assert model.mirror_tree() is tree
+        
+        evaluation = model.update_receiver(R)
+        assert evaluation.tested == len(tree) * len(R) - len(R)
+        
+        R = R + 0.001
+        evaluation = model.update_receiver(R)
+        assert model.mirror_tree() is tree
+        assert evaluation.tested < len(tree) * len(R) - len(R)
+        
+        fresh = Evaluation(tree, S[0]).update(R)
+        assert (evaluation.effective == fresh.effective).all()
+        assert evaluation.strength == pytest.approx(fresh.strength)
+        assert evaluation.distance == pytest.approx(fresh.distance)
+
+    def test_update_receiver_truncated(self, walls1):
+        """With a distance truncation the tree follows the receiver positions, like a fresh model.
+        """
+        S = [Point(0.9, 0.5, 0.5)]
+        R = np.array([[0.1, 0.1, 0.1]])
+        model = Model(walls1, S, R, max_order=4, engine='tree', max_distance=2.5)
+        tree = model.mirror_tree()
+        
+        R = np.array([[0.9, 0.9, 0.9]])
+        evaluation = model.update_receiver(R)
+        assert model.mirror_tree() is not tree
+        
+        fresh = Model(walls1, S, R, max_order=4, engine='tree', max_distance=2.5)
+        expected = fresh.determine(table=True)
+        assert sorted(map(tuple, model.determine(table=True).positions)) == sorted(map(tuple, expected.positions))
+        assert evaluation.effective.sum() == expected.effective.sum()
+    
+    def test_incremental(self, walls1):
+        """An evaluation that is not incremental tests all pairs in chunks and keeps no regions or margins.
+        """
+        S = Point(0.9, 0.5, 0.5)
+        R = np.random.RandomState(0).uniform(0.1, 0.9, (20, 3))
+        tree = MirrorTree.generate(walls1, S, max_order=3)
+        expected = Evaluation(tree, S).update(R)
+        evaluation = Evaluation(tree, S, incremental=False, chunk_size=7).update(R)
+        assert evaluation.regions is None
+        assert evaluation.margin is None
+        assert evaluation.tested == expected.tested
+        assert (evaluation.effective == expected.effective).all()
+        assert (evaluation.distance == expected.distance).all()
+        assert evaluation.strength == pytest.approx(expected.strength)
+        
+        with pytest.raises(ValueError):
+            Evaluation(tree, S, incremental=False, grid=(4, 4, 4))
+    
+    def test_bands(self, walls1):
+        """The strength of a subset of the bands, at once or per chunk.
+        """
+        S = Point(0.9, 0.5, 0.5)
+        R = np.array([[0.1, 0.501, 0.501], [0.3, 0.2, 0.6]])
+        tree = MirrorTree.generate(walls1, S, max_order=3)
+        full = Evaluation(tree, S).update(R)
+        evaluation = Evaluation(tree, S, bands=slice(2, 7), dtype='complex64').update(R)
+        assert list(evaluation.bands) == [2, 3, 4, 5, 6]
+        assert evaluation.strength.dtype == np.complex64
+        assert evaluation.strength == pytest.approx(full.strength[..., 2:7], rel=1e-5)
+        
+        evaluation = Evaluation(tree, S).update(R, strength=False)
+        assert evaluation.strength is None
+        assert (evaluation.effective == full.effective).all()
+        strength = np.concatenate([strength for bands, strength in evaluation.chunks(3)], axis=-1)
+        assert strength == pytest.approx(full.strength)
+
+    def test_remirror(self, walls1):
+        """Mirroring the positions again should give the same tree as generating it for the new source position.
+        """
+        tree = MirrorTree.generate(walls1, Point(0.9, 0.5, 0.5), max_order=3)
+        S = Point(0.92, 0.5, 0.5)
+        moved = tree.remirror(S)
+        fresh = MirrorTree.generate(walls1, S, max_order=3)
+        assert len(moved) == len(fresh)
+        assert moved.positions == pytest.approx(fresh.positions)
+        assert (moved.mother == fresh.mother).all()
+        assert (moved.wall == fresh.wall).all()
+
+    def test_moving_source(self, walls1):
+        """A moving source gives a table per source position.
+        """
+        S = np.array([[0.9, 0.5, 0.5], [0.92, 0.5, 0.5], [0.5, 0.5, 0.5]])
+        R = [Point(0.1, 0.501, 0.501)]
+        model = Model(walls1, S, R, max_order=2, engine='tree')
+        tables = model.determine(table=True, reuse_distance=0.05)
+        assert len(tables) == len(S)
+        assert (tables[1].tree.wall == tables[0].tree.wall).all()
+        for source, table in zip(S, tables):
+            expected = Model(walls1, [Point(*source)], R, max_order=2, engine='tree').determine(table=True)
+            assert (table.effective == expected.effective).all()
+            assert table.strength == pytest.approx(expected.strength)
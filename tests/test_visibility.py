@@ -0,0 +1,88 @@
+"""
+Tests for :mod:`ism._visibility`.
+"""
+import pytest
+import numpy as np
+from ism import Model, Wall, MirrorTree
+from ism._tree import Evaluation
+from ism._visibility import VisibilityRegions, VisibilityGrid
+from ism._geometry import WallArrays, signed_distance, in_field_angle
+from geometry import Point
+
+@pytest.fixture
+def receivers2():
+    state = np.random.RandomState(0)
+    return state.uniform(0.05, 0.95, (50, 3)) * [3.0, 2.0, 1.5]
+
+
+class TestVisibilityRegions:
+    """Tests for :class:`ism._visibility.VisibilityRegions`.
+    """
+
+    def test_contains(self, walls2, receivers2):
+        """A receiver lies in the region of a mirror source when it sees the mirror source through the generating wall.
+        """
+        S = Point(0.9, 0.5, 0.5)
+        tree = MirrorTree.generate(walls2, S, max_order=3)
+        regions = VisibilityRegions.from_tree(tree)
+        assert (tree.wall[regions.index] >= 0).all()
+        assert len(regions) == len(tree) - 1
+
+        inside = regions.contains(receivers2, chunk_size=7)
+        arrays = WallArrays.from_walls(walls2)
+        wall = tree.wall[regions.index]
+        for receiver, position in enumerate(receivers2):
+            expected = (signed_distance(position, arrays.normals[wall], arrays.offsets[wall]) > 0.0) & \
+                       in_field_angle(position, tree.positions[regions.index], arrays.vertices[wall], arrays.normals[wall], arrays.offsets[wall])
+            assert (inside[:, receiver] == expected).all()
+
+
+class TestVisibilityGrid:
+    """Tests for :class:`ism._visibility.VisibilityGrid`.
+    """
+
+    def test_candidates(self, walls2, receivers2):
+        """The candidates of a cell include every region that contains a point of the cell.
+        """
+        tree = MirrorTree.generate(walls2, Point(0.9, 0.5, 0.5), max_order=4)
+        regions = VisibilityRegions.from_tree(tree)
+        grid = VisibilityGrid.from_regions(regions, [0.0, 0.0, 0.0], [3.0, 2.0, 1.5], shape=(6, 4, 3), chunk_size=50)
+        assert len(grid.start) == 6 * 4 * 3 + 1
+        assert len(grid.candidates) < len(regions) * 6 * 4 * 3
+
+        row, point = grid.pairs(receivers2)
+        candidate = np.zeros((len(regions), len(receivers2)), dtype='bool')
+        candidate[row, point] = True
+        assert not (regions.contains(receivers2) & ~candidate).any()
+
+        outside = np.array([[5.0, 1.0, 1.0]])
+        row, point = grid.pairs(outside)
+        assert sorted(row) == list(range(len(regions)))
+        assert grid.margin(outside) == pytest.approx([0.0])
+        assert grid.cells(outside) == pytest.approx([-1])
+
+    def test_invalid(self, walls2):
+        regions = VisibilityRegions.from_tree(MirrorTree.generate(walls2, Point(0.9, 0.5, 0.5), max_order=1))
+        with pytest.raises(ValueError):
+            VisibilityGrid.from_regions(regions, [0.0, 0.0, 0.0], [3.0, 2.0, 1.5], shape=(4, 4))
+        with pytest.raises(ValueError):
+            VisibilityGrid.from_regions(regions, [0.0, 0.0, 0.0], [3.0, 0.0, 1.5])
+
+    def test_evaluation(self, walls2, receivers2):
+        """An evaluation with a grid tests fewer pairs and gives the same effectiveness, also after moving the receivers.
+        """
+        S = Point(0.9, 0.5, 0.5)
+        model = Model(walls2, [S], receivers2, max_order=4, engine='tree')
+        evaluation = model.update_receiver(receivers2, grid=(6, 4, 3))
+        assert evaluation.grid is not None
+        fresh = Evaluation(model.mirror_tree(), S).update(receivers2)
+        assert evaluation.tested < fresh.tested
+        assert (evaluation.effective == fresh.effective).all()
+
+        state = np.random.RandomState(1)
+        for _ in range(5):
+            receivers2 = receivers2 + state.normal(0.0, 0.02, receivers2.shape)
+            evaluation = model.update_receiver(receivers2, grid=(6, 4, 3))
+            fresh = Evaluation(model.mirror_tree(), S).update(receivers2)
+            assert (evaluation.effective == fresh.effective).all()
+            assert evaluation.strength == pytest.approx(fresh.strength)